@@ -1,25 +1,36 @@
 from django.contrib import admin
 from datetime import date
 
+from . import caching
+from . import changes
 from . import models
 
 
 def make_published(modeladmin, request, queryset):
+    course_ids = list(queryset.values_list('pk', flat=True))
     queryset.update(status='p', published=True)
+    caching.courses_updated_in_bulk(course_ids)
+    changes.log_course_trees(course_ids)
 
 
 make_published.short_description = "Mark selected courses as Published"
 
 
 def make_in_review(modeladmin, request, queryset):
+    course_ids = list(queryset.values_list('pk', flat=True))
     queryset.update(status='r', published=False)
+    caching.courses_updated_in_bulk(course_ids)
+    changes.log_course_trees(course_ids)
 
 
 make_in_review.short_description = "Mark selected courses as In Review"
 
 
 def make_in_progress(modeladmin, request, queryset):
+    course_ids = list(queryset.values_list('pk', flat=True))
     queryset.update(status='i', published=False)
+    caching.courses_updated_in_bulk(course_ids)
+    changes.log_course_trees(course_ids)
 
 
 make_in_progress.short_description = "Mark selected courses as In Progress"
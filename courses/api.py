@@ -0,0 +1,371 @@
+import json
+from functools import wraps
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Case, CharField, Value, When
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+
+from . import changes, models, steps
+from .pagination import decode_cursor, encode_cursor, keyset_page
+
+
+# Version 1 of the JSON read API, for the mobile client. Rows are read with
+# values() and never built into model instances, and embedded children are
+# read with one query per level for all their parents.
+#
+#   ?fields=id,title               only these fields of the resource
+#   ?embed=steps                   children inline, dotted for grandchildren
+#   ?fields[steps]=title,kind      only these fields of embedded children
+#   ?cursor=...&per_page=50        keyset pagination of the lists
+#
+# changes/ streams the change log, so clients can sync only what changed.
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+MAX_BATCH_SIZE = 100
+DEFAULT_CHANGES = 1000
+MAX_CHANGES = 10000
+
+
+class ApiError(Exception):
+    '''A bad request, answered with a 400 and the message'''
+
+
+class Resource:
+    '''A kind of object served by the API.
+
+    fields maps the names used in the JSON to ORM lookups, or to
+    expressions for computed fields. Only rows matching public are served
+    on their own; embedded rows are shown with their parent. parent is the
+    lookup of the parent's id when the resource can be embedded.
+    '''
+
+    def __init__(self, name, model, fields, public=None, parent=None,
+                 order=('order', 'pk'), embeds=None):
+        self.name = name
+        self.model = model
+        self.fields = fields
+        self.public = public or {}
+        self.parent = parent
+        self.order = order
+        self.embeds = embeds or {}
+
+    def select(self, requested):
+        '''The names of the fields to serialize, id always included'''
+        if requested is None:
+            return list(self.fields)
+        names = [name for name in requested.split(',') if name]
+        unknown = set(names) - set(self.fields)
+        if unknown:
+            raise ApiError('Unknown {} fields: {}'.format(
+                self.name, ', '.join(sorted(unknown))))
+        return ['id'] + [name for name in names if name != 'id']
+
+    def key(self, name):
+        lookup = self.fields[name]
+        return lookup if isinstance(lookup, str) else name
+
+    def values(self, queryset, names, extra=()):
+        lookups = [self.fields[name] for name in names
+                   if isinstance(self.fields[name], str)]
+        expressions = {name: self.fields[name] for name in names
+                       if not isinstance(self.fields[name], str)}
+        return queryset.values(*dict.fromkeys(lookups + list(extra)),
+                               **expressions)
+
+    def serialize(self, row, names):
+        return {name: row[self.key(name)] for name in names}
+
+    def queryset(self):
+        return self.model.objects.filter(**self.public)
+
+    def children(self, parent_ids, names):
+        '''{parent id: [rows]} for the children of parent_ids, in one query'''
+        grouped = {pk: [] for pk in parent_ids}
+        rows = self.values(
+            self.model.objects.filter(**{self.parent + '__in': parent_ids}),
+            names, [self.parent]
+        ).order_by(self.parent, *self.order)
+        for row in rows:
+            grouped[row[self.parent]].append(self.serialize(row, names))
+        return grouped
+
+
+class StepResource(Resource):
+    '''Texts and quizzes together, read with courses.steps' UNION'''
+
+    def __init__(self, name, fields):
+        super().__init__(name, None, fields, parent='course_id')
+
+    def serialize(self, step, names):
+        # fields name StepRow attributes
+        return {name: getattr(step, self.fields[name]) for name in names}
+
+    def children(self, parent_ids, names):
+        grouped = {pk: [] for pk in parent_ids}
+        for step in steps.steps_of_courses(parent_ids):
+            grouped[step.course_id].append(self.serialize(step, names))
+        return grouped
+
+
+ANSWERS = Resource('answers', models.Answer, {
+    # not whether they're correct, quizzes are graded on the server
+    'id': 'id',
+    'question': 'question_id',
+    'order': 'order',
+    'text': 'text',
+}, public={'question__quiz__course__published': True}, parent='question_id')
+
+QUESTIONS = Resource('questions', models.Question, {
+    'id': 'id',
+    'quiz': 'quiz_id',
+    'order': 'order',
+    'prompt': 'prompt',
+    'kind': Case(When(truefalsequestion__isnull=False, then=Value('tf')),
+                 default=Value('mc'), output_field=CharField()),
+    'shuffle_answers': 'multiplechoicequestion__shuffle_answers',
+}, public={'quiz__course__published': True}, parent='quiz_id',
+    embeds={'answers': ANSWERS})
+
+QUIZZES = Resource('quizzes', models.Quiz, {
+    'id': 'id',
+    'course': 'course_id',
+    'order': 'order',
+    'title': 'title',
+    'description': 'description',
+    'description_html': 'description_html',
+    'total_questions': 'total_questions',
+    'updated_at': 'updated_at',
+}, public={'course__published': True}, parent='course_id',
+    embeds={'questions': QUESTIONS})
+
+TEXTS = Resource('texts', models.Text, {
+    'id': 'id',
+    'course': 'course_id',
+    'order': 'order',
+    'title': 'title',
+    'description': 'description',
+    'description_html': 'description_html',
+    'content': 'content',
+    'content_html': 'content_html',
+    'updated_at': 'updated_at',
+}, public={'course__published': True}, parent='course_id')
+
+STEPS = StepResource('steps', {
+    'id': 'id',
+    'kind': 'kind',
+    'course': 'course_id',
+    'order': 'order',
+    'title': 'title',
+    'description_html': 'description_html',
+    'question_count': 'question_count',
+})
+
+COURSES = Resource('courses', models.Course, {
+    'id': 'id',
+    'title': 'title',
+    'subject': 'subject',
+    'teacher': 'teacher__username',
+    'description': 'description',
+    'description_html': 'description_html',
+    'text_count': 'text_count',
+    'quiz_count': 'quiz_count',
+    'total_steps': 'total_steps',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+}, public={'published': True},
+    embeds={'steps': STEPS, 'texts': TEXTS, 'quizzes': QUIZZES})
+
+# what the change log's kinds are served as, see courses.changes
+SYNCED = {resource.name: resource
+          for resource in (COURSES, TEXTS, QUIZZES, QUESTIONS, ANSWERS)}
+
+
+def embed_tree(resource, embed):
+    '''{'questions': {'answers': {}}} from "questions.answers"'''
+    tree = {}
+    for path in filter(None, (embed or '').split(',')):
+        branch, current = tree, resource
+        for name in path.split('.'):
+            if name not in current.embeds:
+                raise ApiError('{} cannot embed {}'.format(current.name, name))
+            branch = branch.setdefault(name, {})
+            current = current.embeds[name]
+    return tree
+
+
+def embed_children(resource, rows, tree, params):
+    '''Adds the embedded children to rows, one query per resource'''
+    for name, subtree in tree.items():
+        child = resource.embeds[name]
+        names = child.select(params.get('fields[{}]'.format(name)))
+        grouped = child.children([row['id'] for row in rows], names) if rows else {}
+        for row in rows:
+            row[name] = grouped.get(row['id'], [])
+        embed_children(child, [item for row in rows for item in row[name]],
+                       subtree, params)
+
+
+def read(resource, queryset, params):
+    '''Serialized rows of queryset, with the requested fields and embeds'''
+    names = resource.select(params.get('fields'))
+    tree = embed_tree(resource, params.get('embed'))
+    rows = [resource.serialize(row, names)
+            for row in resource.values(queryset, names)]
+    embed_children(resource, rows, tree, params)
+    return rows
+
+
+def page_size(params):
+    try:
+        per_page = int(params.get('per_page', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ApiError('per_page must be a number')
+    if not 1 <= per_page <= MAX_PAGE_SIZE:
+        raise ApiError('per_page must be between 1 and {}'.format(MAX_PAGE_SIZE))
+    return per_page
+
+
+def get_one(resource, pk, params):
+    rows = read(resource, resource.queryset().filter(pk=pk), params)
+    if not rows:
+        raise Http404('No such {}'.format(resource.name))
+    return {'data': rows[0]}
+
+
+def api_view(view):
+    '''Answers GET requests with the view's dict as JSON, errors included'''
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return JsonResponse(view(request, *args, **kwargs))
+        except ApiError as error:
+            return JsonResponse({'error': str(error)}, status=400)
+        except Http404 as error:
+            return JsonResponse({'error': str(error) or 'Not found'}, status=404)
+    return require_GET(wrapper)
+
+
+@api_view
+def course_list(request):
+    '''Published courses, newest first'''
+    params = request.GET
+    names = COURSES.select(params.get('fields'))
+    tree = embed_tree(COURSES, params.get('embed'))
+    page = keyset_page(COURSES.values(COURSES.queryset(), names,
+                                      ['created_at', 'id']),
+                       params.get('cursor'), page_size(params))
+    rows = [COURSES.serialize(row, names) for row in page]
+    embed_children(COURSES, rows, tree, params)
+    return {'data': rows, 'next_cursor': page.next_cursor}
+
+
+@api_view
+def course_batch(request):
+    '''Many courses by id, ?ids=1,2,3, in the order asked for'''
+    try:
+        ids = [int(pk) for pk in request.GET.get('ids', '').split(',') if pk]
+    except ValueError:
+        raise ApiError('ids must be numbers')
+    if not ids:
+        raise ApiError('No ids')
+    if len(ids) > MAX_BATCH_SIZE:
+        raise ApiError('At most {} ids'.format(MAX_BATCH_SIZE))
+    found = {row['id']: row for row in read(
+        COURSES, COURSES.queryset().filter(pk__in=ids), request.GET)}
+    return {
+        'data': [found[pk] for pk in dict.fromkeys(ids) if pk in found],
+        'missing': [pk for pk in dict.fromkeys(ids) if pk not in found],
+    }
+
+
+@api_view
+def course_detail(request, pk):
+    return get_one(COURSES, pk, request.GET)
+
+
+@api_view
+def course_steps(request, pk):
+    '''A course's steps in order, paged like the course page'''
+    if not COURSES.queryset().filter(pk=pk).exists():
+        raise Http404('No such course')
+    names = STEPS.select(request.GET.get('fields'))
+    page = steps.step_page(pk, request.GET.get('cursor'), page_size(request.GET))
+    return {'data': [STEPS.serialize(step, names) for step in page],
+            'next_cursor': page.next_cursor}
+
+
+@api_view
+def quiz_detail(request, pk):
+    return get_one(QUIZZES, pk, request.GET)
+
+
+@api_view
+def question_detail(request, pk):
+    return get_one(QUESTIONS, pk, request.GET)
+
+
+def change_lines(entry_id, limit, fields):
+    '''JSON lines of the changes after entry_id, then the next cursor.
+
+    Entries are read in batches; each batch costs one query for the log
+    and one per kind of row in it, however many entries there are.
+    '''
+    sent = 0
+    while sent < limit:
+        entries = changes.entries_after(entry_id, min(changes.BATCH_SIZE,
+                                                      limit - sent))
+        if not entries:
+            break
+        sent += len(entries)
+        entry_id = entries[-1][0]
+        latest = changes.latest_entries(entries)
+        current = {}
+        for kind, resource in SYNCED.items():
+            ids = [pk for _, entry_kind, pk in latest if entry_kind == kind]
+            if ids:
+                current[kind] = {row['id']: row for row in read(
+                    resource, resource.queryset().filter(pk__in=ids),
+                    {'fields': fields.get(kind)})}
+        for position, kind, pk in latest:
+            line = {'cursor': encode_cursor(position), 'type': kind, 'id': pk}
+            row = current.get(kind, {}).get(pk)
+            if row is None:
+                # deleted, unpublished, or of a kind the client can't see
+                line['op'] = 'delete'
+            else:
+                line['op'] = 'upsert'
+                line['data'] = row
+            yield json.dumps(line, cls=DjangoJSONEncoder) + '\n'
+    more = changes.entries_after(entry_id, 1) != []
+    yield json.dumps({'cursor': encode_cursor(entry_id), 'more': more}) + '\n'
+
+
+@require_GET
+def change_log(request):
+    '''Streams what changed since ?cursor as JSON lines.
+
+    Each line is an upsert with the row as it is now, or a delete, in the
+    order of the change log; several changes of a row are sent once. The
+    last line has the cursor to ask from next time, and whether there is
+    more than ?limit. Without a cursor the log is read from the start,
+    which lists the whole published catalog.
+    '''
+    params = request.GET
+    try:
+        entry_id = int(decode_cursor(params['cursor'])[0]) if params.get('cursor') else 0
+        limit = int(params.get('limit', DEFAULT_CHANGES))
+        if not 1 <= limit <= MAX_CHANGES:
+            raise ApiError('limit must be between 1 and {}'.format(MAX_CHANGES))
+        fields = {}
+        for kind, resource in SYNCED.items():
+            requested = params.get('fields[{}]'.format(kind))
+            resource.select(requested)
+            fields[kind] = requested
+    except ApiError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    except (ValueError, Http404):
+        return JsonResponse({'error': 'Invalid cursor or limit'}, status=400)
+    return StreamingHttpResponse(change_lines(entry_id, limit, fields),
+                                 content_type='application/x-ndjson')
@@ -0,0 +1,14 @@
+from django.urls import path
+
+from . import api
+
+
+urlpatterns = [
+    path('courses/', api.course_list, name='courses'),
+    path('courses/batch/', api.course_batch, name='course_batch'),
+    path('courses/<int:pk>/', api.course_detail, name='course'),
+    path('courses/<int:pk>/steps/', api.course_steps, name='course_steps'),
+    path('quizzes/<int:pk>/', api.quiz_detail, name='quiz'),
+    path('questions/<int:pk>/', api.question_detail, name='question'),
+    path('changes/', api.change_log, name='changes'),
+]
@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class CoursesConfig(AppConfig):
+    name = 'courses'
+
+    def ready(self):
+        # connect the signal handlers
+        from . import signals  # noqa: F401
@@ -0,0 +1,91 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from . import models
+
+
+def pass_percent():
+    return getattr(settings, 'QUIZ_PASS_PERCENT', 70)
+
+
+def has_passed(result):
+    return result.total > 0 and result.percent >= pass_percent()
+
+
+def ensure_stats(model, field, pks):
+    # a missing statistics row would swallow its F() update, so create any
+    # that aren't there yet; INSERT OR IGNORE is safe against other workers
+    model.objects.bulk_create(
+        [model(**{field + '_id': pk}) for pk in pks], ignore_conflicts=True)
+
+
+def record_attempt(result, user=None):
+    '''Saves a graded attempt and folds it into the quiz statistics.
+
+    One transaction with a fixed number of statements whatever the size of
+    the quiz: the attempt, its responses in one bulk_create, and grouped F()
+    updates of the statistics rows.
+    '''
+    passed = has_passed(result)
+    chosen_answers = set()
+    for question in result.results:
+        chosen_answers.update(question.chosen)
+    question_ids = [question.question_id for question in result.results]
+    right = [question.question_id for question in result.results
+             if question.correct]
+    wrong = [question.question_id for question in result.results
+             if not question.correct]
+
+    with transaction.atomic():
+        attempt = models.QuizAttempt.objects.create(
+            quiz_id=result.quiz_id,
+            user=user if user is not None and user.is_authenticated else None,
+            score=result.score, total=result.total, passed=passed)
+        models.QuestionResponse.objects.bulk_create([
+            models.QuestionResponse(
+                attempt=attempt, question_id=question.question_id,
+                answers=','.join(str(pk) for pk in sorted(question.chosen)),
+                correct=question.correct)
+            for question in result.results
+        ])
+
+        ensure_stats(models.QuizStats, 'quiz', [result.quiz_id])
+        models.QuizStats.objects.filter(pk=result.quiz_id).update(
+            attempts=F('attempts') + 1,
+            passes=F('passes') + int(passed),
+            total_score=F('total_score') + result.score,
+            total_possible=F('total_possible') + result.total)
+
+        ensure_stats(models.QuestionStats, 'question', question_ids)
+        if right:
+            models.QuestionStats.objects.filter(pk__in=right).update(
+                responses=F('responses') + 1, correct=F('correct') + 1)
+        if wrong:
+            models.QuestionStats.objects.filter(pk__in=wrong).update(
+                responses=F('responses') + 1)
+
+        if chosen_answers:
+            ensure_stats(models.AnswerStats, 'answer', chosen_answers)
+            models.AnswerStats.objects.filter(pk__in=chosen_answers).update(
+                times_chosen=F('times_chosen') + 1)
+    return attempt
+
+
+def answer_distribution(question_ids):
+    '''{question pk: {answer pk: times chosen}} for several questions'''
+    distribution = defaultdict(dict)
+    for question_id, answer_id, times_chosen in models.Answer.objects.filter(
+            question_id__in=question_ids
+    ).values_list('question_id', 'pk', 'stats__times_chosen'):
+        distribution[question_id][answer_id] = times_chosen or 0
+    return dict(distribution)
+
+
+def teacher_stats(course_ids):
+    '''Statistics of every quiz of the given courses, in one query'''
+    return models.QuizStats.objects.filter(
+        quiz__course_id__in=course_ids
+    ).select_related('quiz__course').order_by('quiz__course_id', 'quiz__order')
@@ -0,0 +1,4 @@
+'''Synthetic catalogs and repeatable benchmarks of the site's URLs.
+
+See the generate_catalog and run_benchmarks management commands.
+'''
@@ -0,0 +1,131 @@
+import random
+
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from courses import bulk, models
+from courses.rendering import render_markdown
+
+
+WORDS = (
+    'python django template query model view form test index cache '
+    'request response string list dictionary function class method '
+    'loop variable import module package database migration field '
+    'regular expression pattern lesson quiz answer question step course'
+).split()
+
+# Paragraphs are drawn from a small pool so that rendering the markdown of
+# a big catalog mostly hits the markdown cache.
+POOL_SIZE = 50
+
+
+class CatalogGenerator:
+    '''Builds a synthetic catalog of courses, steps, questions and answers.
+
+    Rows are written with bulk.TreeWriter in batches of courses, so the
+    rendered HTML and step counts that signals would maintain are filled
+    in here instead.
+    '''
+
+    def __init__(self, courses=100, texts=5, quizzes=5, questions=5,
+                 answers=4, teachers=10, published=0.9, seed=0,
+                 batch_size=200):
+        self.courses = courses
+        self.texts = texts
+        self.quizzes = quizzes
+        self.questions = questions
+        self.answers = answers
+        self.teachers = teachers
+        self.published = published
+        self.batch_size = batch_size
+        self.random = random.Random(seed)
+        self.pool = [self.markdown() for _ in range(POOL_SIZE)]
+        self.writer = bulk.TreeWriter()
+
+    def words(self, count):
+        return ' '.join(self.random.choice(WORDS) for _ in range(count))
+
+    def markdown(self):
+        return '{}\n\n* **{}**\n* *{}*\n\n{}'.format(
+            self.words(40).capitalize() + '.', self.words(3), self.words(3),
+            self.words(60).capitalize() + '.')
+
+    def paragraph(self):
+        text = self.random.choice(self.pool)
+        return text, render_markdown(text)
+
+    def get_teachers(self):
+        teachers = []
+        for number in range(self.teachers):
+            teacher, _ = User.objects.get_or_create(
+                username='bench-teacher-{}'.format(number))
+            teachers.append(teacher)
+        return teachers
+
+    def generate(self):
+        teachers = self.get_teachers()
+        for start in range(0, self.courses, self.batch_size):
+            size = min(self.batch_size, self.courses - start)
+            with transaction.atomic():
+                self.generate_batch(size, teachers)
+        return self.writer.finish()
+
+    def generate_batch(self, size, teachers):
+        writer = self.writer
+        writer.start_batch()
+        for _ in range(size):
+            description, description_html = self.paragraph()
+            course = models.Course(
+                id=writer.new_id(models.Course),
+                title=self.words(3).title(),
+                description=description,
+                description_html=description_html,
+                teacher=self.random.choice(teachers),
+                subject=self.random.choice(WORDS),
+                published=self.random.random() < self.published,
+                text_count=self.texts,
+                quiz_count=self.quizzes,
+                total_steps=self.texts + self.quizzes,
+            )
+            course.status = 'p' if course.published else 'i'
+            writer.courses.append(course)
+            orders = list(range(self.texts + self.quizzes))
+            self.random.shuffle(orders)
+            for order in orders[:self.texts]:
+                description, description_html = self.paragraph()
+                content, content_html = self.paragraph()
+                writer.texts.append(models.Text(
+                    id=writer.new_id(models.Text), course=course,
+                    title=self.words(4).capitalize(), order=order,
+                    description=description, description_html=description_html,
+                    content=content, content_html=content_html,
+                ))
+            for order in orders[self.texts:]:
+                description, description_html = self.paragraph()
+                quiz = models.Quiz(
+                    id=writer.new_id(models.Quiz), course=course,
+                    title=self.words(3).capitalize() + ' quiz', order=order,
+                    description=description, description_html=description_html,
+                    total_questions=self.questions,
+                )
+                writer.quizzes.append(quiz)
+                for number in range(self.questions):
+                    question = models.Question(
+                        id=writer.new_id(models.Question), quiz=quiz,
+                        order=number, prompt=self.words(8).capitalize() + '?')
+                    writer.questions.append(question)
+                    if number % 2:
+                        writer.true_false.append({'question_ptr_id': question.id})
+                        choices = ['True', 'False']
+                    else:
+                        writer.multiple_choice.append({
+                            'question_ptr_id': question.id,
+                            'shuffle_answers': bool(self.random.getrandbits(1)),
+                        })
+                        choices = [self.words(3) for _ in range(self.answers)]
+                    correct = self.random.randrange(len(choices))
+                    for order, text in enumerate(choices):
+                        writer.answers.append(models.Answer(
+                            id=writer.new_id(models.Answer), question=question,
+                            order=order, text=text, correct=order == correct))
+        writer.write_batch()
@@ -0,0 +1,176 @@
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DatabaseError, connection, connections
+
+from courses import attempts, grading, models, steps
+from learning_site.db import apply_pragmas
+
+from .runner import summarize
+
+
+# The settings compared: Django's defaults (a rollback journal, a new
+# connection per request) against the production profile (the write-ahead
+# log, relaxed fsyncs and persistent connections).
+def profiles():
+    return {
+        'default': {
+            'pragmas': {'journal_mode': 'delete', 'synchronous': 'full'},
+            'persistent': False,
+        },
+        'production': {
+            'pragmas': settings.SQLITE_PRODUCTION_PRAGMAS,
+            'persistent': True,
+        },
+    }
+
+
+@contextmanager
+def scratch_copy():
+    '''Points the default connection at a copy of the database.
+
+    The writers record real quiz attempts, so they run on a copy that is
+    thrown away afterwards.
+    '''
+    if connection.vendor != 'sqlite':
+        raise RuntimeError('The concurrency benchmark compares SQLite settings')
+    name = connection.settings_dict['NAME']
+    if not os.path.exists(name):
+        raise RuntimeError('{} is not a database file'.format(name))
+    directory = tempfile.mkdtemp(prefix='concurrency-')
+    copy = os.path.join(directory, 'db.sqlite3')
+    source, target = sqlite3.connect(name), sqlite3.connect(copy)
+    try:
+        source.backup(target)
+    finally:
+        source.close()
+        target.close()
+    connection.close()
+    connection.settings_dict['NAME'] = copy
+    try:
+        yield copy
+    finally:
+        connection.close()
+        connection.settings_dict['NAME'] = name
+        shutil.rmtree(directory)
+
+
+def sample(limit=20):
+    '''Answer keys of some quizzes and ids of some courses to work on'''
+    quiz_ids = models.Quiz.objects.filter(
+        course__published=True, question__isnull=False
+    ).order_by('pk').values_list('pk', flat=True).distinct()[:limit]
+    keys = [grading.compile_answer_key(quiz_id) for quiz_id in quiz_ids]
+    course_ids = list(models.Course.objects.filter(
+        published=True).order_by('pk').values_list('pk', flat=True)[:limit])
+    return keys, course_ids
+
+
+def random_responses(key, rng):
+    responses = {}
+    for question in key.questions:
+        choices = sorted(question.answer_ids)
+        if not choices:
+            continue
+        if question.kind == grading.TRUE_FALSE:
+            responses[question.question_id] = [rng.choice(choices)]
+        else:
+            responses[question.question_id] = rng.sample(
+                choices, rng.randint(1, len(choices)))
+    return responses
+
+
+def write_once(rng, keys, course_ids):
+    # a quiz submission, the busiest write on the site
+    key = rng.choice(keys)
+    attempts.record_attempt(key.grade(random_responses(key, rng)))
+
+
+def read_once(rng, keys, course_ids):
+    # the course list and a course's steps
+    list(models.Course.objects.filter(published=True).order_by(
+        '-created_at', '-id')[:21])
+    steps.step_page(rng.choice(course_ids))
+
+
+def worker(role, profile, seconds, keys, course_ids, seed, results):
+    # forked from the parent, so never reuse its connection
+    connections.close_all()
+    settings.SQLITE_PRAGMAS = profile['pragmas']
+    operation = write_once if role == 'writer' else read_once
+    rng = random.Random(seed)
+    timings = []
+    errors = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        try:
+            operation(rng, keys, course_ids)
+        except DatabaseError:
+            errors += 1   # database is locked
+        else:
+            timings.append((time.perf_counter() - started) * 1000)
+        if not profile['persistent']:
+            connection.close()
+    connection.close()
+    results.put((role, timings, errors))
+
+
+def run_profile(profile, writers, readers, seconds, keys, course_ids):
+    # the journal mode belongs to the file, switch it while nothing else
+    # has it open
+    connection.ensure_connection()
+    apply_pragmas(connection, {'journal_mode': profile['pragmas']['journal_mode']})
+    connection.close()
+
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    roles = ['writer'] * writers + ['reader'] * readers
+    processes = [
+        context.Process(target=worker, args=(
+            role, profile, seconds, keys, course_ids, seed, results))
+        for seed, role in enumerate(roles)
+    ]
+    for process in processes:
+        process.start()
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    report = {}
+    for role in ('writer', 'reader'):
+        timings = [timing for name, role_timings, _ in collected
+                   if name == role for timing in role_timings]
+        report[role + 's'] = {
+            'processes': roles.count(role),
+            'operations': len(timings),
+            'per_second': round(len(timings) / seconds, 1),
+            'errors': sum(errors for name, _, errors in collected if name == role),
+            'latency_ms': summarize(timings) if timings else None,
+        }
+    return report
+
+
+def benchmark_concurrency(writers=4, readers=4, seconds=5, profile_names=None):
+    '''Throughput of writer and reader processes sharing the database.
+
+    Each profile runs for seconds on a scratch copy of the database, with
+    writers submitting quizzes and readers loading public pages' queries.
+    Returns {profile name: {'writers': ..., 'readers': ...}}.
+    '''
+    available = profiles()
+    profile_names = profile_names or list(available)
+    with scratch_copy():
+        keys, course_ids = sample()
+        if not keys or not course_ids:
+            return {}
+        return {name: run_profile(available[name], writers, readers, seconds,
+                                  keys, course_ids)
+                for name in profile_names}
@@ -0,0 +1,103 @@
+import time
+
+from django.db import connection, transaction
+
+from courses import models, steps
+
+from .runner import summarize
+
+
+# The composite indexes added for the hot paths (migrations 0013 and 0014).
+# explain_queries can drop them inside a transaction that is rolled back, to
+# compare against the plans with only the foreign key indexes.
+HOT_PATH_INDEXES = (
+    (models.Course, 'courses_course_published'),
+    (models.Course, 'courses_course_teacher'),
+    (models.Text, 'courses_text_course_order'),
+    (models.Quiz, 'courses_quiz_course_order'),
+    (models.Question, 'courses_question_quiz_order'),
+    (models.Answer, 'courses_answer_question_order'),
+)
+
+
+def hot_queries():
+    '''(name, queryset) of the queries behind the public pages, run on
+    existing sample rows. Returns nothing when the catalog is empty.'''
+    course = models.Course.objects.filter(
+        published=True, total_steps__gt=0).order_by('pk').first()
+    quiz = models.Quiz.objects.filter(
+        course__published=True, question__isnull=False).order_by('pk').first()
+    if course is None or quiz is None:
+        return []
+    published = models.Course.objects.filter(published=True)
+    middle = published.order_by('-created_at', '-id')[
+        published.count() // 2:].values_list('created_at', flat=True).first()
+    return [
+        ('course list', published.order_by('-created_at', '-id')[:21]),
+        ('course list, deep page', published.filter(
+            created_at__lt=middle).order_by('-created_at', '-id')[:21]),
+        ('newest course', published.order_by('-created_at')[:1]),
+        ('courses by teacher', published.filter(
+            teacher__username=course.teacher.username
+        ).order_by('-created_at', '-id')[:21]),
+        ('course steps', steps.steps_query(course.pk)[:51]),
+        ('quiz questions', models.Question.objects.filter(
+            quiz_id=quiz.pk).order_by('order')),
+        ('question answers', models.Answer.objects.filter(
+            question__quiz_id=quiz.pk).order_by('question_id', 'order')),
+    ]
+
+
+def time_query(queryset, iterations):
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        list(queryset.all())
+        timings.append((time.perf_counter() - started) * 1000)
+    return summarize(timings)
+
+
+def measure(queries, iterations):
+    return {name: {'plan': queryset.explain(),
+                   'latency_ms': time_query(queryset, iterations)}
+            for name, queryset in queries}
+
+
+def drop_hot_path_indexes():
+    schema_editor = connection.schema_editor()
+    with connection.cursor() as cursor:
+        for model, name in HOT_PATH_INDEXES:
+            index = next(index for index in model._meta.indexes
+                         if index.name == name)
+            cursor.execute(str(index.remove_sql(model, schema_editor)))
+
+
+def fresh_connection():
+    # not inside a transaction, such as a test case's
+    if not connection.in_atomic_block:
+        connection.close()
+
+
+def explain_hot_queries(iterations=50, compare=False):
+    '''EXPLAIN plans and latencies of the hot queries.
+
+    With compare, they are measured again without the hot path indexes;
+    the indexes are dropped in a transaction that is then rolled back, so
+    this needs a database that can roll back DDL (SQLite, PostgreSQL).
+    '''
+    queries = hot_queries()
+    report = {}
+    if compare:
+        if not connection.features.can_rollback_ddl:
+            raise RuntimeError('{} cannot roll back dropping an index'.format(
+                connection.vendor))
+        # SQLite connections keep prepared statements, and their plans,
+        # across schema changes, so each run gets a fresh connection
+        fresh_connection()
+        with transaction.atomic():
+            drop_hot_path_indexes()
+            report['without_indexes'] = measure(queries, iterations)
+            transaction.set_rollback(True)
+        fresh_connection()
+    report['with_indexes'] = measure(queries, iterations)
+    return report
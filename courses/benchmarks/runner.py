@@ -0,0 +1,164 @@
+import statistics
+import time
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLResolver, get_resolver, reverse
+from django.utils import timezone
+
+from courses import models
+
+
+# Included URLconfs that aren't part of the site itself
+SKIPPED_NAMESPACES = ('admin', 'djdt')
+
+
+def url_names(patterns=None, namespace=''):
+    '''Yields (name, parameter names) for every named URL of the site'''
+    if patterns is None:
+        patterns = get_resolver().url_patterns
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            if pattern.namespace in SKIPPED_NAMESPACES:
+                continue
+            prefix = namespace + pattern.namespace + ':' if pattern.namespace else namespace
+            yield from url_names(pattern.url_patterns, prefix)
+        elif pattern.name:
+            yield namespace + pattern.name, list(pattern.pattern.regex.groupindex)
+
+
+def sample_kwargs(name, parameters):
+    '''Picks existing objects to fill in the parameters of a URL'''
+    quiz = models.Quiz.objects.filter(
+        course__published=True, question__isnull=False
+    ).select_related('course').order_by('pk').first()
+    text = models.Text.objects.filter(
+        course__published=True
+    ).order_by('pk').first()
+    question = quiz.question_set.order_by('pk').first() if quiz else None
+    step = text if name.endswith(':text') else quiz
+    if step is None or question is None:
+        return None
+    values = {
+        'pk': step.course_id,
+        'course_pk': step.course_id,
+        'step_pk': step.pk,
+        'quiz_pk': quiz.pk,
+        'question_pk': question.pk,
+        'question_type': 'mc',
+        'teacher': quiz.course.teacher.username,
+    }
+    if not set(parameters) <= set(values):
+        return None
+    return {parameter: values[parameter] for parameter in parameters}
+
+
+def summarize(timings):
+    timings = sorted(timings)
+    return {
+        'mean': round(statistics.mean(timings), 3),
+        'p50': round(timings[len(timings) // 2], 3),
+        'p95': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+        'max': round(timings[-1], 3),
+    }
+
+
+def benchmark_url(client, path, iterations, clear_cache=False):
+    timings = []
+    queries = []
+    status = None
+    started = time.perf_counter()
+    for _ in range(iterations):
+        if clear_cache:
+            cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            request_started = time.perf_counter()
+            response = client.get(path)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            timings.append((time.perf_counter() - request_started) * 1000)
+        queries.append(len(captured))
+        status = response.status_code
+    elapsed = time.perf_counter() - started
+    return {
+        'path': path,
+        'status': status,
+        'latency_ms': summarize(timings),
+        'throughput_rps': round(iterations / elapsed, 1),
+        'queries': max(queries),
+    }
+
+
+def run_benchmarks(iterations=20, clear_cache=False, names=None):
+    '''Requests every URL of the site and returns the timings as a dict'''
+    # runserver's host unless the test environment is set up, and keep the
+    # debug toolbar out of the pages, it only shows for INTERNAL_IPS
+    host = 'testserver' if 'testserver' in settings.ALLOWED_HOSTS else 'localhost'
+    anonymous = Client(SERVER_NAME=host, REMOTE_ADDR='192.0.2.1')
+    staff = Client(SERVER_NAME=host, REMOTE_ADDR='192.0.2.1')
+    user, _ = User.objects.get_or_create(username='bench-staff',
+                                         defaults={'is_staff': True})
+    staff.force_login(user)
+    results = []
+    for name, parameters in url_names():
+        if names and name not in names:
+            continue
+        kwargs = sample_kwargs(name, parameters)
+        if kwargs is None:
+            results.append({'name': name, 'skipped': 'no sample data'})
+            continue
+        path = reverse(name, kwargs=kwargs)
+        if name == 'courses:search':
+            path += '?q=python'
+        # public pages are measured as anonymous readers see them
+        client = anonymous
+        status = anonymous.get(path).status_code
+        if status == 302:
+            client = staff
+            status = staff.get(path).status_code
+        # timings of error pages would say nothing about the view, and the
+        # POST-only views answer every GET with 405
+        if status == 405:
+            results.append({'name': name, 'skipped': 'POST only'})
+            continue
+        if status >= 400:
+            results.append({'name': name, 'skipped': 'status {}'.format(status)})
+            continue
+        result = benchmark_url(client, path, iterations, clear_cache)
+        result['name'] = name
+        results.append(result)
+    return {
+        'started_at': timezone.now().isoformat(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'iterations': iterations,
+        'clear_cache': clear_cache,
+        'catalog': {
+            'courses': models.Course.objects.count(),
+            'texts': models.Text.objects.count(),
+            'quizzes': models.Quiz.objects.count(),
+            'questions': models.Question.objects.count(),
+            'answers': models.Answer.objects.count(),
+        },
+        'results': results,
+    }
+
+
+def compare(previous, current):
+    '''Lines describing how each URL changed between two runs'''
+    before = {result['name']: result for result in previous['results']
+              if 'skipped' not in result}
+    lines = []
+    for result in current['results']:
+        old = before.get(result['name'])
+        if old is None or 'skipped' in result:
+            continue
+        lines.append('{:<28} p50 {:>9.3f} -> {:>9.3f} ms  queries {:>3} -> {:>3}'.format(
+            result['name'], old['latency_ms']['p50'], result['latency_ms']['p50'],
+            old['queries'], result['queries']))
+    return lines
@@ -0,0 +1,127 @@
+import itertools
+
+from django.core.management.color import no_style
+from django.db import connection
+from django.db.models import Max
+from django.db.transaction import TransactionManagementError
+
+from . import caching, changes, models, search
+
+
+# bulk_create() only sets primary keys on PostgreSQL, so the bulk write
+# paths pick the keys themselves, counting up from next_id(). That is only
+# safe inside a transaction holding lock_tables(), so nothing else can
+# insert between reading the highest key and writing the new rows.
+
+def lock_tables(*locked):
+    '''Keeps other writers out of the tables of the locked models until the
+    current transaction ends'''
+    if not connection.in_atomic_block:
+        raise TransactionManagementError(
+            'lock_tables() only works inside a transaction')
+    quote = connection.ops.quote_name
+    tables = [quote(model._meta.db_table) for model in locked]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('LOCK TABLE {} IN SHARE ROW EXCLUSIVE MODE'.format(
+                ', '.join(tables)))
+        elif connection.vendor == 'sqlite':
+            # SQLite locks the whole database, and any write statement
+            # takes that lock until the transaction ends, even one that
+            # changes nothing
+            cursor.execute('UPDATE {} SET {} = {} WHERE 0 = 1'.format(
+                tables[0], quote(locked[0]._meta.pk.column),
+                quote(locked[0]._meta.pk.column)))
+        else:
+            for model in locked:
+                list(model._base_manager.select_for_update().order_by('-pk')[:1])
+
+
+def next_id(model):
+    '''The first primary key after the highest one in use'''
+    return (model._base_manager.aggregate(highest=Max('pk'))['highest'] or 0) + 1
+
+
+def insert_child_rows(model, rows):
+    '''Inserts the child table rows of a multi-table inherited model.
+
+    bulk_create() refuses these models, so the parent rows are created
+    with bulk_create() on the parent model and rows is a list of
+    {column: value} dicts for the child table only.
+    '''
+    if not rows:
+        return
+    columns = list(rows[0])
+    quote = connection.ops.quote_name
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        quote(model._meta.db_table),
+        ', '.join(quote(column) for column in columns),
+        ', '.join(['%s'] * len(columns)),
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [[row[column] for column in columns] for row in rows])
+
+
+def reset_sequences(*models):
+    '''Moves the database sequences past keys that were picked by hand'''
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+class TreeWriter:
+    '''Writes course trees (courses, steps, questions and answers) with one
+    bulk_create() per table and batch.
+
+    For each batch, call start_batch() inside a transaction, append the new
+    rows to the lists with ids from new_id(), and call write_batch() before
+    the transaction ends. finish() runs once after the last batch. Between
+    them they fill in what the signals would have: the change log, the
+    search index and the cache versions. Rendered HTML and the course step
+    counts are up to the caller.
+    '''
+
+    written_models = (models.Course, models.Text, models.Quiz,
+                      models.Question, models.Answer)
+
+    def __init__(self):
+        self.counts = dict.fromkeys(
+            ('courses', 'texts', 'quizzes', 'questions', 'answers'), 0)
+
+    def start_batch(self):
+        lock_tables(*self.written_models)
+        self.ids = {model: itertools.count(next_id(model))
+                    for model in self.written_models}
+        self.courses, self.texts, self.quizzes = [], [], []
+        self.questions, self.answers = [], []
+        # {column: value} dicts for insert_child_rows()
+        self.multiple_choice, self.true_false = [], []
+
+    def new_id(self, model):
+        return next(self.ids[model])
+
+    def write_batch(self):
+        models.Course.objects.bulk_create(self.courses)
+        models.Text.objects.bulk_create(self.texts)
+        models.Quiz.objects.bulk_create(self.quizzes)
+        models.Question.objects.bulk_create(self.questions)
+        insert_child_rows(models.MultipleChoiceQuestion, self.multiple_choice)
+        insert_child_rows(models.TrueFalseQuestion, self.true_false)
+        models.Answer.objects.bulk_create(self.answers)
+        for name, rows in (('courses', self.courses), ('texts', self.texts),
+                           ('quizzes', self.quizzes),
+                           ('questions', self.questions),
+                           ('answers', self.answers)):
+            self.counts[name] += len(rows)
+            # bulk_create() skips the signals that keep the change log
+            changes.log_changes(name, [row.id for row in rows])
+        # and the search index
+        search.index_instances(
+            itertools.chain(self.courses, self.texts, self.quizzes))
+
+    def finish(self):
+        reset_sequences(*self.written_models)
+        caching.courses_updated_in_bulk()
+        return self.counts
+
@@ -0,0 +1,92 @@
+import time
+import uuid
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from . import changes, models
+
+
+# A version is a random token rather than a counter, so that losing the
+# cache entry can never bring an old version (and old cached data) back.
+# The token ends with the time it was made, see version_time().
+
+def version_key(name):
+    return 'courses:version:{}'.format(name)
+
+
+def new_version():
+    return '{}.{}'.format(uuid.uuid4().hex, int(time.time()))
+
+
+def get_version(name):
+    '''Returns the current version token of a group of cached data'''
+    version = cache.get(version_key(name))
+    if version is None:
+        version = new_version()
+        if not cache.add(version_key(name), version, None):
+            # another process got there first
+            version = cache.get(version_key(name), version)
+    return version
+
+
+def bump_version(name):
+    '''Invalidates everything cached under the named version'''
+    cache.set(version_key(name), new_version(), None)
+
+
+def version_time(name):
+    '''When the named version last changed, None for tokens made before
+    they carried their time'''
+    _, _, seconds = get_version(name).partition('.')
+    if not seconds.isdecimal():
+        return None
+    return datetime.fromtimestamp(int(seconds), dt_timezone.utc)
+
+
+def versioned_key(name, *parts):
+    return ':'.join(['courses', name, get_version(name)] + [str(part) for part in parts])
+
+
+def stamp_name(model_name, pk):
+    return '{}:{}'.format(model_name, pk)
+
+
+def get_stamp(instance):
+    '''Returns the version stamp of a course, step or other object'''
+    return get_version(stamp_name(instance._meta.model_name, instance.pk))
+
+
+def bump_stamp(model_name, pk):
+    bump_version(stamp_name(model_name, pk))
+
+
+def courses_updated_in_bulk(course_ids=()):
+    '''Invalidates what post_save would have, after a queryset.update()'''
+    bump_version('catalog')
+    bump_version('nav')
+    for pk in course_ids:
+        bump_stamp('course', pk)
+
+
+# Changes below a course, like its steps and their questions, make the
+# course itself count as changed: its updated_at moves (for conditional
+# GETs and the static export), its stamp is bumped and it's logged.
+
+def touch(model, pk, now):
+    # update() doesn't send post_save, so this can't trigger itself
+    model.objects.filter(pk=pk).update(updated_at=now)
+    bump_stamp(model._meta.model_name, pk)
+    changes.log_changes(changes.KINDS[model], [pk])
+
+
+def quiz_changed(quiz_id):
+    '''Marks a quiz and its course as changed after its questions changed'''
+    now = timezone.now()
+    touch(models.Quiz, quiz_id, now)
+    course_id = models.Quiz.objects.filter(
+        pk=quiz_id
+    ).values_list('course_id', flat=True).first()
+    if course_id is not None:
+        touch(models.Course, course_id, now)
@@ -0,0 +1,76 @@
+from . import models
+
+
+# The change log: one ChangeLogEntry each time a catalog row is saved,
+# deleted, or updated in bulk. An entry only says which row changed; what
+# a client gets is the row as it is when it reads the log, or a tombstone
+# once it's deleted or no longer published (see courses.api.changes).
+#
+# Entry ids are the sync cursor. SQLite commits one writer at a time, so
+# they grow in commit order; a database with concurrent writers would need
+# readers to stay behind the oldest open transaction.
+
+COURSES = 'courses'
+TEXTS = 'texts'
+QUIZZES = 'quizzes'
+QUESTIONS = 'questions'
+ANSWERS = 'answers'
+
+KINDS = {
+    models.Course: COURSES,
+    models.Text: TEXTS,
+    models.Quiz: QUIZZES,
+    models.Question: QUESTIONS,
+    models.MultipleChoiceQuestion: QUESTIONS,
+    models.TrueFalseQuestion: QUESTIONS,
+    models.Answer: ANSWERS,
+}
+
+BATCH_SIZE = 500
+
+
+def log_changes(kind, object_ids):
+    models.ChangeLogEntry.objects.bulk_create([
+        models.ChangeLogEntry(kind=kind, object_id=pk) for pk in object_ids
+    ], batch_size=BATCH_SIZE)
+
+
+def log_instance(instance):
+    log_changes(KINDS[type(instance)], [instance.pk])
+
+
+def log_course_trees(course_ids):
+    '''Logs courses with all their steps, questions and answers.
+
+    For changes that show or hide everything in a course at once, like
+    publishing it.
+    '''
+    course_ids = list(course_ids)
+    # chunks stay under SQLite's limit of 999 parameters
+    for start in range(0, len(course_ids), BATCH_SIZE):
+        chunk = course_ids[start:start + BATCH_SIZE]
+        log_changes(COURSES, chunk)
+        for kind, queryset in (
+                (TEXTS, models.Text.objects.filter(course_id__in=chunk)),
+                (QUIZZES, models.Quiz.objects.filter(course_id__in=chunk)),
+                (QUESTIONS, models.Question.objects.filter(
+                    quiz__course_id__in=chunk)),
+                (ANSWERS, models.Answer.objects.filter(
+                    question__quiz__course_id__in=chunk))):
+            log_changes(kind, queryset.order_by('pk').values_list('pk', flat=True))
+
+
+def entries_after(entry_id, limit):
+    '''(id, kind, object id) of up to limit entries after entry_id'''
+    return list(models.ChangeLogEntry.objects.filter(
+        pk__gt=entry_id
+    ).order_by('pk').values_list('pk', 'kind', 'object_id')[:limit])
+
+
+def latest_entries(entries):
+    '''The entries, keeping only the last one of each row, in log order'''
+    latest = {}
+    for entry_id, kind, object_id in entries:
+        latest[kind, object_id] = entry_id
+    return sorted((entry_id, kind, object_id)
+                  for (kind, object_id), entry_id in latest.items())
@@ -0,0 +1,134 @@
+import atexit
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+from django.db.models import F
+
+from . import models
+
+
+logger = logging.getLogger('courses.counters')
+
+
+class AttemptCounter:
+    '''Buffers quiz attempts in memory and adds them to Quiz.times_taken in bulk.
+
+    Every process keeps its own buffer and flushes it with F() updates, so
+    counts from several workers add up in the database without lost
+    updates, and a busy quiz costs one UPDATE per flush instead of one per
+    attempt.
+
+    After start(), a background thread flushes every
+    QUIZ_ATTEMPTS_FLUSH_INTERVAL seconds, so a quiet worker doesn't sit on
+    its attempts, and stop() writes the rest when the process exits. Only
+    a worker that gets killed loses its buffer, the interval bounds how
+    much. With autostart, the first record() starts the thread, so only
+    processes that serve quiz submissions run one (not management
+    commands, and not a server's master process before it forks).
+    '''
+
+    def __init__(self, flush_interval=None, autostart=False):
+        self.flush_interval = flush_interval
+        self.autostart = autostart
+        self.pending = Counter()
+        self.lock = threading.Lock()
+        self.last_flush = time.monotonic()
+        self.thread = None
+        self.stopped = threading.Event()
+
+    def get_flush_interval(self):
+        if self.flush_interval is not None:
+            return self.flush_interval
+        return getattr(settings, 'QUIZ_ATTEMPTS_FLUSH_INTERVAL', 10)
+
+    def record(self, quiz_id, count=1):
+        if self.autostart and self.thread is None:
+            self.start()
+        with self.lock:
+            self.pending[quiz_id] += count
+            due = time.monotonic() - self.last_flush >= self.get_flush_interval()
+        if due:
+            self.flush()
+
+    def flush(self):
+        '''Writes the buffered attempts, returns how many were written'''
+        with self.lock:
+            pending, self.pending = self.pending, Counter()
+            self.last_flush = time.monotonic()
+        if not pending:
+            return 0
+        # quizzes with the same number of new attempts share an UPDATE
+        quizzes_by_count = defaultdict(list)
+        for quiz_id, count in pending.items():
+            quizzes_by_count[count].append(quiz_id)
+        try:
+            with transaction.atomic():
+                for count, quiz_ids in quizzes_by_count.items():
+                    models.Quiz.objects.filter(pk__in=quiz_ids).update(
+                        times_taken=F('times_taken') + count)
+        except DatabaseError:
+            with self.lock:
+                self.pending.update(pending)
+            raise
+        return sum(pending.values())
+
+    def start(self):
+        '''Starts flushing from a background thread, and at exit'''
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.stopped.clear()
+            self.thread = threading.Thread(
+                target=self.run, name='quiz-attempts-flush', daemon=True)
+            self.thread.start()
+        atexit.register(self.stop)
+
+    def run(self):
+        while not self.stopped.wait(self.get_flush_interval()):
+            try:
+                self.flush()
+            except DatabaseError:
+                # the attempts are back in the buffer for the next try
+                logger.exception('Could not flush quiz attempts')
+            finally:
+                # Django only closes the connections of request threads
+                close_old_connections()
+
+    def stop(self):
+        '''Stops the thread and flushes what's left.
+
+        Runs at exit, and can be called from a server's own shutdown hook
+        (e.g. gunicorn's worker_exit) for workers that exit without running
+        the atexit handlers.
+        '''
+        with self.lock:
+            thread, self.thread = self.thread, None
+        if thread is not None:
+            atexit.unregister(self.stop)
+            self.stopped.set()
+            thread.join()
+        try:
+            self.flush()
+        except DatabaseError:
+            logger.exception('Could not flush quiz attempts')
+
+    def times_taken(self, quiz):
+        '''The count of a loaded quiz, including this process' buffer'''
+        with self.lock:
+            return quiz.times_taken + self.pending[quiz.pk]
+
+    def counts(self, quiz_ids):
+        '''Current counts of several quizzes, in one query'''
+        counts = dict(models.Quiz.objects.filter(
+            pk__in=quiz_ids
+        ).values_list('pk', 'times_taken'))
+        with self.lock:
+            return {quiz_id: count + self.pending[quiz_id]
+                    for quiz_id, count in counts.items()}
+
+
+quiz_attempts = AttemptCounter(autostart=True)
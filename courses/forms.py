@@ -46,9 +46,48 @@ class AnswerForm(forms.ModelForm):
             'correct'
         ]
 
+class LoadedObjectField(forms.ModelChoiceField):
+    '''Primary key field of a model formset that finds objects among the
+    ones the formset already loaded, instead of with a query per form'''
+
+    def __init__(self, formset, *args, **kwargs):
+        self.formset = formset
+        super().__init__(*args, **kwargs)
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            key = self.formset.model._meta.pk.to_python(value)
+        except forms.ValidationError:
+            key = None
+        instance = self.formset.loaded_object(key) if key is not None else None
+        if instance is None:
+            raise forms.ValidationError(self.error_messages['invalid_choice'],
+                                        code='invalid_choice')
+        return instance
+
+
+class BaseAnswerFormSet(forms.BaseModelFormSet):
+    def loaded_object(self, pk):
+        '''The object of get_queryset() with this primary key, if any'''
+        if not hasattr(self, '_loaded_objects'):
+            self._loaded_objects = {obj.pk: obj for obj in self.get_queryset()}
+        return self._loaded_objects.get(pk)
+
+    def add_fields(self, form, index):
+        super().add_fields(form, index)
+        name = self.model._meta.pk.name
+        field = form.fields[name]
+        form.fields[name] = LoadedObjectField(
+            self, field.queryset, initial=field.initial,
+            required=field.required, widget=field.widget)
+
+
 AnswerFormSet = forms.modelformset_factory(
     models.Answer,                       # specify which model this is for
     form = AnswerForm,                   # specify which form this is for
+    formset = BaseAnswerFormSet,
 )
 
 AnswerInlineFormSet = forms.inlineformset_factory(
@@ -0,0 +1,146 @@
+from collections import namedtuple
+
+from django.core.cache import cache
+
+from . import caching, models
+
+
+MULTIPLE_CHOICE = 'mc'
+TRUE_FALSE = 'tf'
+
+# answer_ids and correct_ids are frozensets of Answer pks
+QuestionKey = namedtuple(
+    'QuestionKey', 'question_id kind shuffle answer_ids correct_ids')
+
+QuestionResult = namedtuple('QuestionResult', 'question_id chosen correct')
+
+
+class GradeResult:
+    def __init__(self, quiz_id, results):
+        self.quiz_id = quiz_id
+        self.results = results
+        self.score = sum(1 for result in results if result.correct)
+        self.total = len(results)
+
+    @property
+    def percent(self):
+        if not self.total:
+            return 0
+        return round(100 * self.score / self.total)
+
+
+class AnswerKey:
+    '''The correct answers of a quiz, compiled once and kept in the cache.
+
+    Answers are identified by pk, never by position, so shuffled answers
+    grade the same as ordered ones. A question is right when exactly its
+    correct answers were chosen.
+    '''
+
+    def __init__(self, quiz_id, title, course_id, course_title, published,
+                 questions):
+        self.quiz_id = quiz_id
+        self.title = title
+        self.course_id = course_id
+        self.course_title = course_title
+        self.published = published
+        self.questions = tuple(questions)
+
+    def grade(self, responses):
+        '''Grades {question pk: iterable of answer pks}, unknown pks are ignored'''
+        results = []
+        for question in self.questions:
+            chosen = question.answer_ids.intersection(
+                responses.get(question.question_id, ()))
+            correct = bool(chosen) and chosen == question.correct_ids
+            if question.kind == TRUE_FALSE and len(chosen) > 1:
+                correct = False
+            results.append(QuestionResult(question.question_id, chosen, correct))
+        return GradeResult(self.quiz_id, results)
+
+
+def compile_answer_key(quiz_id):
+    '''Builds the AnswerKey of a quiz with three queries, None if it's gone'''
+    quiz = models.Quiz.objects.filter(pk=quiz_id).values(
+        'title', 'course_id', 'course__title', 'course__published').first()
+    if quiz is None:
+        return None
+    answers = {}
+    correct = {}
+    for question_id, answer_id, is_correct in models.Answer.objects.filter(
+            question__quiz_id=quiz_id
+    ).values_list('question_id', 'pk', 'correct'):
+        answers.setdefault(question_id, set()).add(answer_id)
+        if is_correct:
+            correct.setdefault(question_id, set()).add(answer_id)
+    questions = []
+    for question_id, shuffle, true_false in models.Question.objects.filter(
+            quiz_id=quiz_id
+    ).order_by('order', 'pk').values_list(
+        'pk', 'multiplechoicequestion__shuffle_answers', 'truefalsequestion'
+    ):
+        questions.append(QuestionKey(
+            question_id=question_id,
+            kind=TRUE_FALSE if true_false is not None else MULTIPLE_CHOICE,
+            shuffle=bool(shuffle),
+            answer_ids=frozenset(answers.get(question_id, ())),
+            correct_ids=frozenset(correct.get(question_id, ())),
+        ))
+    return AnswerKey(quiz_id, quiz['title'], quiz['course_id'],
+                     quiz['course__title'], quiz['course__published'],
+                     questions)
+
+
+def answer_key_cache_key(quiz_id):
+    # any Question or Answer change bumps the quiz stamp (see signals)
+    return 'courses:answer-key:{}:{}'.format(
+        quiz_id, caching.get_version(caching.stamp_name('quiz', quiz_id)))
+
+
+def get_answer_key(quiz_id):
+    '''The AnswerKey of a quiz, from the cache when it's still current.
+
+    A key is stored with the course stamp it was compiled under, so
+    publishing, unpublishing or renaming the course also recompiles it.
+    Returns None for quizzes that don't exist.
+    '''
+    key = answer_key_cache_key(quiz_id)
+    cached = cache.get(key)
+    if cached is not None:
+        course_stamp, answer_key = cached
+        if course_stamp == caching.get_version(
+                caching.stamp_name('course', answer_key.course_id)):
+            return answer_key
+    answer_key = compile_answer_key(quiz_id)
+    if answer_key is not None:
+        course_stamp = caching.get_version(
+            caching.stamp_name('course', answer_key.course_id))
+        cache.set(key, (course_stamp, answer_key), None)
+    return answer_key
+
+
+# Longer keys can't be primary keys, and int() refuses digit strings
+# over 4300 characters long
+MAX_ID_DIGITS = 18
+
+
+def parse_id(value):
+    '''The primary key spelled by value, None when it isn't one'''
+    # isdigit() is also True for characters like '²' that int() rejects
+    if not value.isdecimal() or len(value) > MAX_ID_DIGITS:
+        return None
+    return int(value)
+
+
+def parse_responses(data):
+    '''Reads question-<pk> fields of a submitted quiz form'''
+    responses = {}
+    for field in data:
+        prefix, _, question_id = field.partition('-')
+        question_id = parse_id(question_id)
+        if prefix != 'question' or question_id is None:
+            continue
+        answer_ids = {parse_id(value) for value in data.getlist(field)}
+        answer_ids.discard(None)
+        responses[question_id] = answer_ids
+    return responses
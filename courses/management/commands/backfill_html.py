@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from courses import models
+
+
+class Command(BaseCommand):
+    help = 'Renders the stored HTML of courses and steps from their markdown'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--all', action='store_true',
+                            help='Re-render rows that already have HTML')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        for model in (models.Course, models.Text, models.Quiz):
+            queryset = model.objects.order_by('pk')
+            if not options['all']:
+                queryset = queryset.filter(missing_html(model))
+            total = 0
+            last_pk = 0
+            while True:
+                batch = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+                if not batch:
+                    break
+                with transaction.atomic():
+                    for instance in batch:
+                        instance.render_html()
+                        fields = {field: getattr(instance, field)
+                                  for field in html_fields(model)}
+                        model.objects.filter(pk=instance.pk).update(**fields)
+                last_pk = batch[-1].pk
+                total += len(batch)
+            self.stdout.write('{}: rendered {} rows'.format(
+                model._meta.verbose_name_plural, total))
+
+
+def html_fields(model):
+    return [field.name for field in model._meta.get_fields()
+            if field.name.endswith('_html')]
+
+
+def missing_html(model):
+    '''Rows with markdown in any field whose HTML hasn't been rendered'''
+    missing = Q()
+    for field in html_fields(model):
+        source = field[:-len('_html')]
+        missing |= Q(**{field: ''}) & ~Q(**{source: ''})
+    return missing
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.benchmarks.concurrency import benchmark_concurrency, profiles
+
+
+class Command(BaseCommand):
+    help = ('Runs writer and reader processes against a copy of the SQLite '
+            'database, with the default and the production settings')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--profile', action='append',
+                            choices=sorted(profiles()),
+                            help='Only run this profile, can be repeated')
+
+    def handle(self, *args, **options):
+        try:
+            report = benchmark_concurrency(
+                options['writers'], options['readers'], options['seconds'],
+                options['profile'])
+        except RuntimeError as error:
+            raise CommandError(error)
+        if not report:
+            raise CommandError('No sample data, run generate_catalog first')
+        for name, result in report.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            for role, numbers in result.items():
+                line = '  {} {}: {} ops, {}/s, {} errors'.format(
+                    numbers['processes'], role, numbers['operations'],
+                    numbers['per_second'], numbers['errors'])
+                if numbers['latency_ms']:
+                    line += ', p50 {p50:.2f} ms, p95 {p95:.2f} ms'.format(
+                        **numbers['latency_ms'])
+                self.stdout.write(line)
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.benchmarks.explain import explain_hot_queries
+
+
+class Command(BaseCommand):
+    help = ('Shows the EXPLAIN plans and latencies of the queries behind the '
+            'public pages, optionally compared to running without the hot '
+            'path indexes')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--compare', action='store_true',
+                            help='Also measure with the hot path indexes '
+                                 'dropped (rolled back afterwards)')
+
+    def handle(self, *args, **options):
+        try:
+            report = explain_hot_queries(options['iterations'], options['compare'])
+        except RuntimeError as error:
+            raise CommandError(error)
+        if not report['with_indexes']:
+            raise CommandError('No sample data, run generate_catalog first')
+        without = report.get('without_indexes', {})
+        for name, result in report['with_indexes'].items():
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(result['plan'])
+            line = '  p50 {:.3f} ms'.format(result['latency_ms']['p50'])
+            if name in without:
+                self.stdout.write('  without the indexes:')
+                self.stdout.write('  ' + without[name]['plan'].replace('\n', '\n  '))
+                line += ', {:.3f} ms without the indexes'.format(
+                    without[name]['latency_ms']['p50'])
+            self.stdout.write(line + '\n')
@@ -0,0 +1,34 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from courses.transfer import export_courses
+
+
+class Command(BaseCommand):
+    help = 'Writes course trees as JSON Lines, one course per line'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', '-o', default='-',
+                            help='File to write, - for standard output')
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Courses read per batch of queries')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Processes serializing batches in parallel')
+        parser.add_argument('--published', action='store_true',
+                            help='Only export published courses')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        out = sys.stdout if options['output'] == '-' else open(
+            options['output'], 'w', encoding='utf-8')
+        try:
+            count = export_courses(out, batch_size=options['batch_size'],
+                                   workers=options['workers'],
+                                   published_only=options['published'])
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        self.stderr.write('Exported {} courses in {:.1f}s'.format(
+            count, time.perf_counter() - started))
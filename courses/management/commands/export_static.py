@@ -0,0 +1,32 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from courses.static_export import export_site
+
+
+class Command(BaseCommand):
+    help = ('Renders the pages of published courses into a directory of '
+            'static HTML, only the courses that changed since the last run')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', '-o',
+                            default=os.path.join(settings.BASE_DIR, 'static_site'),
+                            help='Directory to write the pages to')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Processes rendering courses in parallel')
+        parser.add_argument('--full', action='store_true',
+                            help='Render every course, changed or not')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        counts = export_site(options['output'], workers=options['workers'],
+                             full=options['full'])
+        self.stdout.write(
+            'Rendered {rendered} courses, removed {removed}, {unchanged} '
+            'unchanged; wrote {pages} pages in {seconds:.1f}s'.format(
+                seconds=time.perf_counter() - started, **counts))
+        self.stdout.write('Static files (css, js) are collected separately '
+                          'with collectstatic')
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from courses.benchmarks.catalog import CatalogGenerator
+
+
+class Command(BaseCommand):
+    help = 'Adds a synthetic catalog of courses to the database for benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--courses', type=int, default=100)
+        parser.add_argument('--texts', type=int, default=5,
+                            help='Text steps per course')
+        parser.add_argument('--quizzes', type=int, default=5,
+                            help='Quiz steps per course')
+        parser.add_argument('--questions', type=int, default=5,
+                            help='Questions per quiz')
+        parser.add_argument('--answers', type=int, default=4,
+                            help='Answers per multiple choice question')
+        parser.add_argument('--teachers', type=int, default=10)
+        parser.add_argument('--published', type=float, default=0.9,
+                            help='Share of the courses that are published')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=200,
+                            help='Courses written per transaction')
+
+    def handle(self, *args, **options):
+        generator = CatalogGenerator(
+            courses=options['courses'],
+            texts=options['texts'],
+            quizzes=options['quizzes'],
+            questions=options['questions'],
+            answers=options['answers'],
+            teachers=options['teachers'],
+            published=options['published'],
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+        )
+        started = time.perf_counter()
+        counts = generator.generate()
+        self.stdout.write('Created {} in {:.1f}s'.format(
+            ', '.join('{} {}'.format(count, name) for name, count in counts.items()),
+            time.perf_counter() - started))
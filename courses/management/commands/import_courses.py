@@ -0,0 +1,28 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from courses.transfer import CourseImporter
+
+
+class Command(BaseCommand):
+    help = 'Adds the course trees of a JSON Lines export to the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='File to read, - for standard input')
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Courses written per transaction')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        lines = sys.stdin if options['input'] == '-' else open(
+            options['input'], encoding='utf-8')
+        try:
+            counts = CourseImporter(options['batch_size']).import_lines(lines)
+        finally:
+            if lines is not sys.stdin:
+                lines.close()
+        self.stdout.write('Imported {} in {:.1f}s'.format(
+            ', '.join('{} {}'.format(count, name) for name, count in counts.items()),
+            time.perf_counter() - started))
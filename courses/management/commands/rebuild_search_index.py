@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from courses import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the course search index from scratch'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        total = search.rebuild(batch_size=options['batch_size'])
+        backend = 'FTS5' if search.fts_available() else 'search term table'
+        self.stdout.write('Indexed {} documents ({})'.format(total, backend))
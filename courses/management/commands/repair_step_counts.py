@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db import models as db_models, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from courses import models
+
+
+def step_count(step_model):
+    '''Subquery counting the steps of the outer course'''
+    steps = step_model.objects.filter(
+        course=OuterRef('pk')
+    ).order_by().values('course').annotate(count=Count('pk')).values('count')
+    return Coalesce(Subquery(steps, output_field=db_models.IntegerField()), 0)
+
+
+def recount_steps(queryset):
+    '''Recomputes the step counters of every course in queryset in bulk'''
+    with transaction.atomic():
+        updated = queryset.update(
+            text_count=step_count(models.Text),
+            quiz_count=step_count(models.Quiz),
+        )
+        queryset.update(total_steps=F('text_count') + F('quiz_count'))
+    return updated
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the denormalized step counters on courses'
+
+    def add_arguments(self, parser):
+        parser.add_argument('course_ids', nargs='*', type=int)
+
+    def handle(self, *args, **options):
+        courses = models.Course.objects.all()
+        if options['course_ids']:
+            courses = courses.filter(pk__in=options['course_ids'])
+        updated = recount_steps(courses)
+        self.stdout.write('Recounted steps for {} courses'.format(updated))
@@ -0,0 +1,32 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from courses.benchmarks.runner import compare, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = 'Measures latency, throughput and queries of every URL of the site'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--clear-cache', action='store_true',
+                            help='Empty the cache before every request')
+        parser.add_argument('--url', action='append', dest='names',
+                            help='Only benchmark this URL name, e.g. courses:detail')
+        parser.add_argument('--output', help='Write the results to this JSON file')
+        parser.add_argument('--compare', help='Results of an earlier run to compare with')
+
+    def handle(self, *args, **options):
+        results = run_benchmarks(iterations=options['iterations'],
+                                 clear_cache=options['clear_cache'],
+                                 names=options['names'])
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+        else:
+            self.stdout.write(json.dumps(results, indent=2))
+        if options['compare']:
+            with open(options['compare']) as previous:
+                for line in compare(json.load(previous), results):
+                    self.stdout.write(line)
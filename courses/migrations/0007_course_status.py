@@ -0,0 +1,22 @@
+# Generated by Django 2.2.28 on 2026-10-17 16:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0006_quiz_times_taken'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='quiz',
+            options={'verbose_name_plural': 'quizzes'},
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='status',
+            field=models.CharField(choices=[('i', 'In Progress'), ('r', 'In Review'), ('p', 'Published')], default='i', max_length=1),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 2.2.28 on 2026-10-17 23:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0007_course_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='description_html',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='quiz',
+            name='description_html',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='text',
+            name='content_html',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='text',
+            name='description_html',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+    ]
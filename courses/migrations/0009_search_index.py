@@ -0,0 +1,47 @@
+# Generated by Django 2.2.28 on 2026-10-17 23:12
+
+from django.db import OperationalError, migrations, models
+import django.db.models.deletion
+
+
+def create_fts_table(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "CREATE VIRTUAL TABLE courses_search_fts USING fts5("
+                "course_id UNINDEXED, title, body, "
+                "tokenize = 'porter unicode61')"
+            )
+    except OperationalError:
+        # SQLite was built without FTS5, courses.search falls back to the
+        # SearchTerm table
+        pass
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS courses_search_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0008_rendered_html'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(db_index=True, max_length=100)),
+                ('document', models.IntegerField(db_index=True)),
+                ('weight', models.IntegerField(default=1)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='courses.Course')),
+            ],
+        ),
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 2.2.28 on 2026-10-17 23:13
+
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_steps(apps, schema_editor):
+    Course = apps.get_model('courses', 'Course')
+    counts = {}
+    for field, step_model in (('text_count', 'Text'), ('quiz_count', 'Quiz')):
+        steps = apps.get_model('courses', step_model).objects.filter(
+            course=OuterRef('pk')
+        ).order_by().values('course').annotate(count=Count('pk')).values('count')
+        counts[field] = Coalesce(Subquery(steps, output_field=models.IntegerField()), 0)
+    Course.objects.update(**counts)
+    Course.objects.update(total_steps=F('text_count') + F('quiz_count'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0009_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='quiz_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='text_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='total_steps',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_steps, migrations.RunPython.noop),
+    ]
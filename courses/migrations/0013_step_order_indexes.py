@@ -0,0 +1,21 @@
+# Generated by Django 2.2.28 on 2026-10-17 23:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0012_quiz_attempts'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='quiz',
+            index=models.Index(fields=['course', 'order'], name='courses_quiz_course_order'),
+        ),
+        migrations.AddIndex(
+            model_name='text',
+            index=models.Index(fields=['course', 'order'], name='courses_text_course_order'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 2.2.28 on 2026-10-17 23:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0013_step_order_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='answer',
+            index=models.Index(fields=['question', 'order'], name='courses_answer_question_order'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['published', 'created_at'], name='courses_course_published'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['teacher', 'published', 'created_at'], name='courses_course_teacher'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['quiz', 'order'], name='courses_question_quiz_order'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 2.2.28 on 2026-10-17 23:43
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def log_existing_rows(apps, schema_editor):
+    # everything already there counts as changed, so syncing from the start
+    # of the log downloads the whole catalog; parents before their children
+    entry_table = apps.get_model('courses', 'ChangeLogEntry')._meta.db_table
+    now = schema_editor.connection.ops.adapt_datetimefield_value(timezone.now())
+    with schema_editor.connection.cursor() as cursor:
+        for kind, model_name in (('courses', 'Course'), ('texts', 'Text'),
+                                 ('quizzes', 'Quiz'), ('questions', 'Question'),
+                                 ('answers', 'Answer')):
+            table = apps.get_model('courses', model_name)._meta.db_table
+            cursor.execute(
+                'INSERT INTO {} (kind, object_id, changed_at) '
+                'SELECT %s, id, %s FROM {} ORDER BY id'.format(
+                    schema_editor.quote_name(entry_table),
+                    schema_editor.quote_name(table)),
+                [kind, now])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0014_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLogEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=20)),
+                ('object_id', models.IntegerField()),
+                ('changed_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name_plural': 'change log entries',
+            },
+        ),
+        migrations.RunPython(log_existing_rows, migrations.RunPython.noop),
+    ]
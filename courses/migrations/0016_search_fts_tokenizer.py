@@ -0,0 +1,46 @@
+# Generated by Django 2.2.28 on 2026-10-17 23:58
+
+from django.db import migrations
+
+
+def recreate_fts_table(tokenize):
+    # the FTS5 table gets the same words as the SearchTerm fallback: no
+    # stemming, and accents are kept
+    def recreate(apps, schema_editor):
+        connection = schema_editor.connection
+        if (connection.vendor != 'sqlite' or 'courses_search_fts'
+                not in connection.introspection.table_names()):
+            return
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TABLE courses_search_fts')
+            cursor.execute(
+                "CREATE VIRTUAL TABLE courses_search_fts USING fts5("
+                "course_id UNINDEXED, title, body, "
+                "tokenize = '{}')".format(tokenize)
+            )
+            # the same documents as courses.search.document_for
+            cursor.execute(
+                "INSERT INTO courses_search_fts (rowid, course_id, title, body) "
+                "SELECT id * 4, id, title, description FROM courses_course")
+            cursor.execute(
+                "INSERT INTO courses_search_fts (rowid, course_id, title, body) "
+                "SELECT id * 4 + 1, course_id, title, "
+                "description || char(10) || content FROM courses_text")
+            cursor.execute(
+                "INSERT INTO courses_search_fts (rowid, course_id, title, body) "
+                "SELECT id * 4 + 2, course_id, title, description "
+                "FROM courses_quiz")
+    return recreate
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0015_changelog'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            recreate_fts_table('unicode61 remove_diacritics 0'),
+            recreate_fts_table('porter unicode61')),
+    ]
@@ -1,3 +1,9 @@
+from django.http import StreamingHttpResponse
+from django.template.loader import get_template, render_to_string
+
+from . import pagination
+
+
 class PageTitleMixin:
     page_title = ""  # attribute
 
@@ -8,3 +14,72 @@ class PageTitleMixin:
         context = super().get_context_data(**kwargs)
         context["page_title"] = self.get_page_title()
         return context
+
+
+class KeysetPaginationMixin:
+    '''Paginates a ListView with cursors instead of page numbers'''
+    paginate_by = 20
+    cursor_kwarg = 'cursor'
+
+    def paginate_queryset(self, queryset, page_size):
+        cursor = self.request.GET.get(self.cursor_kwarg)
+        page = pagination.keyset_page(queryset, cursor, page_size)
+        return None, page, page.object_list, page.has_next()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        page = context.get('page_obj')
+        if page is not None and page.has_next():
+            params = self.request.GET.copy()
+            params[self.cursor_kwarg] = page.next_cursor
+            context['next_page_url'] = '?' + params.urlencode()
+        return context
+
+
+class StreamingListMixin:
+    '''Streams every row of a ListView when asked for with ?stream=1.
+
+    The page is rendered once around a marker, and the rows are rendered
+    one by one with row_template_name while the queryset is iterated, so
+    the first bytes go out before the results are all loaded. Querysets
+    are streamed in the order of the keyset pages.
+    '''
+    stream_kwarg = 'stream'
+    stream_ordering = pagination.ORDERING
+    stream_marker = '<!-- stream rows -->'
+    row_template_name = None
+    row_context_object_name = 'object'
+
+    def is_streaming(self):
+        return bool(self.request.GET.get(self.stream_kwarg))
+
+    def get_paginate_by(self, queryset):
+        if self.is_streaming():
+            return None
+        return super().get_paginate_by(queryset)
+
+    def render_to_response(self, context, **response_kwargs):
+        if not self.is_streaming():
+            return super().render_to_response(context, **response_kwargs)
+        rows = context['object_list']
+        if hasattr(rows, 'order_by'):
+            rows = rows.order_by(*self.stream_ordering)
+        context.update({
+            'object_list': [],
+            self.get_context_object_name(rows): [],
+            'stream_marker': self.stream_marker,
+        })
+        page = render_to_string(self.get_template_names(), context, self.request)
+        head, tail = page.split(self.stream_marker)
+        return StreamingHttpResponse(self.stream_rows(head, rows, tail),
+                                     **response_kwargs)
+
+    def stream_rows(self, head, rows, tail):
+        yield head
+        template = get_template(self.row_template_name)
+        if hasattr(rows, 'iterator'):
+            rows = rows.iterator()
+        for counter, row in enumerate(rows, 1):
+            yield template.render({self.row_context_object_name: row,
+                                   'counter': counter})
+        yield tail
@@ -3,6 +3,8 @@ from django.db import models
 
 from django.contrib.auth.models import User
 
+from courses.rendering import MARKDOWN_FIELDS, render_markdown
+
 
 STATUS_CHOICES = (
     ('i', 'In Progress'),
@@ -10,18 +12,66 @@ STATUS_CHOICES = (
     ('p', 'Published'),
 )
 
+# Maintained by courses.signals with F() updates, never saved from a Course
+# instance since the in-memory values may be stale
+STEP_COUNT_FIELDS = ('text_count', 'quiz_count', 'total_steps')
+
+
+def with_html_fields(instance, update_fields):
+    '''update_fields plus the *_html field of each markdown field in it, as
+    save() renders them all'''
+    update_fields = list(update_fields)
+    for name in MARKDOWN_FIELDS[instance._meta.label]:
+        html_name = name + '_html'
+        if name in update_fields and html_name not in update_fields:
+            update_fields.append(html_name)
+    return update_fields
+
+
 class Course(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     title = models.CharField(max_length=255)
     description = models.TextField()
+    description_html = models.TextField(blank=True, default='', editable=False)
     teacher = models.ForeignKey(User, on_delete=models.CASCADE)
     subject = models.CharField(default='', max_length=100)
     published = models.BooleanField(default=False)
     status = models.CharField(max_length=1, choices=STATUS_CHOICES, default='i')
+    text_count = models.IntegerField(default=0, editable=False)
+    quiz_count = models.IntegerField(default=0, editable=False)
+    total_steps = models.IntegerField(default=0, editable=False)
+
+    class Meta:
+        # the public listings filter on published and page by created_at,
+        # see courses.pagination.keyset_page
+        indexes = [
+            models.Index(fields=['published', 'created_at'],
+                         name='courses_course_published'),
+            models.Index(fields=['teacher', 'published', 'created_at'],
+                         name='courses_course_teacher'),
+        ]
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        self.render_html()
+        adding = self._state.adding or kwargs.get('force_insert')
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = with_html_fields(
+                self, kwargs['update_fields'])
+        elif not adding:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in STEP_COUNT_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+    def render_html(self):
+        '''Stores the HTML version of the markdown fields'''
+        self.description_html = render_markdown(self.description)
+
     def get_absolute_url(self):
         return reverse('courses:list')
 
@@ -34,8 +84,10 @@ class Course(models.Model):
 class Step(models.Model):
     title = models.CharField(max_length=255)
     description = models.TextField()
+    description_html = models.TextField(blank=True, default='', editable=False)
     order = models.IntegerField(default=0)
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         abstract = True
@@ -44,10 +96,31 @@ class Step(models.Model):
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        self.render_html()
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = with_html_fields(
+                self, kwargs['update_fields'])
+        super().save(*args, **kwargs)
+
+    def render_html(self):
+        '''Stores the HTML version of the markdown fields'''
+        self.description_html = render_markdown(self.description)
+
 
 class Text(Step):
     content = models.TextField(blank=True, default='')
-    
+    content_html = models.TextField(blank=True, default='', editable=False)
+
+    class Meta(Step.Meta):
+        # a course's steps are listed in order, see courses.steps
+        indexes = [models.Index(fields=['course', 'order'],
+                                name='courses_text_course_order')]
+
+    def render_html(self):
+        super().render_html()
+        self.content_html = render_markdown(self.content)
+
     def get_absolute_url(self):
         return reverse('courses:text', kwargs={
                 'course_pk': self.course_id,
@@ -61,6 +134,8 @@ class Quiz(Step):
     
     class Meta:
         verbose_name_plural = "quizzes"
+        indexes = [models.Index(fields=['course', 'order'],
+                                name='courses_quiz_course_order')]
 
     def get_absolute_url(self):
         return reverse('courses:quiz', kwargs={
@@ -76,6 +151,8 @@ class Question(models.Model):
     
     class Meta:
         ordering = ['order',]
+        indexes = [models.Index(fields=['quiz', 'order'],
+                                name='courses_question_quiz_order')]
         
     def get_absolute_url(self):
         return self.quiz.get_absolute_url()
@@ -99,6 +176,108 @@ class Answer(models.Model):
     
     class Meta:
         ordering = ['order',]
+        indexes = [models.Index(fields=['question', 'order'],
+                                name='courses_answer_question_order')]
         
     def __str__(self):
-        return self.text
\ No newline at end of file
+        return self.text
+
+
+class SearchTerm(models.Model):
+    '''One row of the search index used when SQLite FTS5 isn't available'''
+    term = models.CharField(max_length=100, db_index=True)
+    document = models.IntegerField(db_index=True)
+    course = models.ForeignKey(Course, on_delete=models.CASCADE)
+    weight = models.IntegerField(default=1)
+
+    def __str__(self):
+        return self.term
+
+
+class QuizAttempt(models.Model):
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL,
+                             null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    score = models.IntegerField()
+    total = models.IntegerField()
+    passed = models.BooleanField(default=False)
+
+    def __str__(self):
+        return '{} ({}/{})'.format(self.quiz, self.score, self.total)
+
+
+class QuestionResponse(models.Model):
+    attempt = models.ForeignKey(QuizAttempt, on_delete=models.CASCADE)
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+    # pks of the chosen answers, comma separated, so a submission is one
+    # bulk INSERT without a join table
+    answers = models.CharField(max_length=255, blank=True)
+    correct = models.BooleanField(default=False)
+
+    def answer_ids(self):
+        return [int(pk) for pk in self.answers.split(',') if pk]
+
+
+# The statistics below are kept up to date by courses.attempts with F()
+# updates as attempts come in, so reading them never scans the attempts.
+
+class QuizStats(models.Model):
+    quiz = models.OneToOneField(Quiz, on_delete=models.CASCADE,
+                                primary_key=True, related_name='stats')
+    attempts = models.IntegerField(default=0)
+    passes = models.IntegerField(default=0)
+    total_score = models.IntegerField(default=0)
+    total_possible = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "quiz stats"
+
+    @property
+    def pass_rate(self):
+        return self.passes / self.attempts if self.attempts else None
+
+    @property
+    def average_score(self):
+        return self.total_score / self.total_possible if self.total_possible else None
+
+
+class QuestionStats(models.Model):
+    question = models.OneToOneField(Question, on_delete=models.CASCADE,
+                                    primary_key=True, related_name='stats')
+    responses = models.IntegerField(default=0)
+    correct = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "question stats"
+
+    @property
+    def difficulty(self):
+        '''Share of wrong responses, 0 is easy and 1 is hard'''
+        return 1 - self.correct / self.responses if self.responses else None
+
+
+class AnswerStats(models.Model):
+    answer = models.OneToOneField(Answer, on_delete=models.CASCADE,
+                                  primary_key=True, related_name='stats')
+    times_chosen = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "answer stats"
+
+
+class ChangeLogEntry(models.Model):
+    '''A course, text, quiz, question or answer that was saved or deleted.
+
+    Written by courses.changes; clients read the log in id order to sync
+    what changed since their last visit, see courses.api.changes.
+    '''
+    kind = models.CharField(max_length=20)
+    object_id = models.IntegerField()
+    changed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name_plural = "change log entries"
+
+    def __str__(self):
+        return '{} {}'.format(self.kind, self.object_id)
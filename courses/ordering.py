@@ -0,0 +1,85 @@
+from bisect import bisect_left
+
+
+# Space left between the order values of neighbours, so that moving an item
+# usually means giving it a value in a gap and leaving the others alone
+ORDER_GAP = 1024
+
+
+def longest_increasing_run(values):
+    '''Indexes of a longest strictly increasing subsequence of values'''
+    tails = []      # tails[length - 1] = value ending the best run so far
+    tail_indexes = []
+    previous = [None] * len(values)
+    for index, value in enumerate(values):
+        position = bisect_left(tails, value)
+        if position:
+            previous[index] = tail_indexes[position - 1]
+        if position == len(tails):
+            tails.append(value)
+            tail_indexes.append(index)
+        else:
+            tails[position] = value
+            tail_indexes[position] = index
+    run = []
+    index = tail_indexes[-1] if tail_indexes else None
+    while index is not None:
+        run.append(index)
+        index = previous[index]
+    return run[::-1]
+
+
+def spaced(count):
+    return [(position + 1) * ORDER_GAP for position in range(count)]
+
+
+def new_orders(current):
+    '''Order values for items listed in their new order.
+
+    current is the list of the items' current order values, in the new
+    order. The items of a longest run that is already in order keep their
+    values and the others get values in the gaps around them; only when
+    a gap is too narrow is everything spaced out again.
+    '''
+    orders = list(current)
+    kept = set(longest_increasing_run(orders))
+    position = 0
+    while position < len(orders):
+        if position in kept:
+            position += 1
+            continue
+        end = position
+        while end < len(orders) and end not in kept:
+            end += 1
+        low = orders[position - 1] if position else None
+        high = orders[end] if end < len(orders) else None
+        count = end - position
+        if low is None and high is None:
+            return spaced(len(orders))
+        if low is None:
+            values = [high - ORDER_GAP * (count - offset)
+                      for offset in range(count)]
+        elif high is None:
+            values = [low + ORDER_GAP * (offset + 1) for offset in range(count)]
+        else:
+            step = (high - low) // (count + 1)
+            if step < 1:
+                return spaced(len(orders))
+            values = [low + step * (offset + 1) for offset in range(count)]
+        orders[position:end] = values
+        position = end
+    return orders
+
+
+def reorder(objects, attname='order'):
+    '''Sets new order values on objects, given in their new order.
+
+    Returns the objects whose value changed, for a bulk_update().
+    '''
+    orders = new_orders([getattr(obj, attname) for obj in objects])
+    changed = []
+    for obj, order in zip(objects, orders):
+        if getattr(obj, attname) != order:
+            setattr(obj, attname, order)
+            changed.append(obj)
+    return changed
@@ -0,0 +1,81 @@
+import base64
+import binascii
+
+from django.db.models import Q
+from django.http import Http404
+from django.utils.dateparse import parse_datetime
+
+
+class CursorPage:
+    '''A page of results and the cursor pointing at the next one'''
+
+    def __init__(self, object_list, next_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def encode_cursor(*values):
+    raw = '|'.join(str(value) for value in values)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    try:
+        return base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|')
+    except (binascii.Error, UnicodeError, ValueError):
+        raise Http404('Invalid cursor')
+
+
+# The order of the keyset pages, newest first
+ORDERING = ('-created_at', '-id')
+
+
+def keyset_page(queryset, cursor, per_page):
+    '''Returns the page of queryset after cursor, newest first.
+
+    Pages are ordered on (created_at, id) and each one starts where the
+    previous one ended, so deep pages cost the same as the first one.
+    queryset may also be a values() queryset including created_at and id.
+    '''
+    queryset = queryset.order_by(*ORDERING)
+    if cursor:
+        try:
+            created_at, pk = decode_cursor(cursor)
+            created_at, pk = parse_datetime(created_at), int(pk)
+        except ValueError:
+            raise Http404('Invalid cursor')
+        if created_at is None:
+            raise Http404('Invalid cursor')
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+        )
+    object_list = list(queryset[:per_page + 1])
+    if len(object_list) <= per_page:
+        return CursorPage(object_list)
+    object_list = object_list[:per_page]
+    last = object_list[-1]
+    if isinstance(last, dict):
+        created_at, pk = last['created_at'], last['id']
+    else:
+        created_at, pk = last.created_at, last.pk
+    return CursorPage(object_list, encode_cursor(created_at.isoformat(), pk))
+
+
+def list_page(items, cursor, per_page):
+    '''Pages through an already ranked, bounded list of results'''
+    try:
+        start = int(decode_cursor(cursor)[0]) if cursor else 0
+    except ValueError:
+        raise Http404('Invalid cursor')
+    end = start + per_page
+    next_cursor = encode_cursor(end) if end < len(items) else None
+    return CursorPage(items[start:end], next_cursor)
@@ -0,0 +1,114 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+import markdown2
+
+
+# Fields holding markdown, per model. The signal handlers in courses.signals
+# use this to find out which cached renders belong to a row.
+MARKDOWN_FIELDS = {
+    'courses.Course': ('description',),
+    'courses.Text': ('description', 'content'),
+    'courses.Quiz': ('description',),
+}
+
+
+def content_key(markdown_text):
+    '''Returns the cache key for a piece of markdown, based on its content'''
+    digest = hashlib.sha1(markdown_text.encode('utf-8')).hexdigest()
+    return 'courses:markdown:{}'.format(digest)
+
+
+class MarkdownCache:
+    '''Caches rendered markdown by content hash.
+
+    The first tier is a bounded LRU dictionary local to the process. The
+    second, optional tier is a Django cache (set MARKDOWN_CACHE_ALIAS) so
+    that worker processes can share each other's renders.
+    '''
+
+    def __init__(self, max_size=None, cache_alias=None):
+        self.max_size = max_size
+        self.cache_alias = cache_alias
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def get_max_size(self):
+        if self.max_size is not None:
+            return self.max_size
+        return getattr(settings, 'MARKDOWN_CACHE_SIZE', 512)
+
+    def get_shared_cache(self):
+        alias = self.cache_alias or getattr(settings, 'MARKDOWN_CACHE_ALIAS', None)
+        if alias:
+            return caches[alias]
+        return None
+
+    def render(self, markdown_text):
+        key = content_key(markdown_text)
+        with self._lock:
+            html = self._entries.get(key)
+            if html is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return html
+
+        shared = self.get_shared_cache()
+        html = shared.get(key) if shared is not None else None
+        if html is not None:
+            self._remember(key, html, 'shared_hits')
+        else:
+            html = markdown2.markdown(markdown_text)
+            if shared is not None:
+                shared.set(key, html, None)
+            self._remember(key, html, 'misses')
+        return html
+
+    def _remember(self, key, html, counter):
+        # counters are only updated under the lock, += isn't atomic
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+            self._entries[key] = html
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.get_max_size():
+                self._entries.popitem(last=False)
+
+    def invalidate(self, markdown_text):
+        '''Drops the render of one piece of markdown from both tiers'''
+        key = content_key(markdown_text)
+        with self._lock:
+            self._entries.pop(key, None)
+        shared = self.get_shared_cache()
+        if shared is not None:
+            shared.delete(key)
+
+    def clear(self):
+        '''Empties the local tier and resets the counters'''
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.shared_hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'size': len(self._entries),
+                'max_size': self.get_max_size(),
+            }
+
+
+markdown_cache = MarkdownCache()
+
+
+def render_markdown(markdown_text):
+    '''Converts markdown text to HTML, reusing earlier renders'''
+    return markdown_cache.render(markdown_text or '')
@@ -0,0 +1,210 @@
+import re
+from collections import Counter
+
+from django.db import connections, router, transaction
+from django.db.models import Q, Sum
+
+from . import models
+
+
+FTS_TABLE = 'courses_search_fts'
+TITLE_WEIGHT = 10
+RESULTS_LIMIT = 200
+# letters and digits, the same words as the FTS5 unicode61 tokenizer
+WORD_RE = re.compile(r'[^\W_]+')
+
+_fts_available = None
+
+
+def tokenize(text):
+    '''Splits text into lowercase words'''
+    return [word.lower()[:100] for word in WORD_RE.findall(text or '')]
+
+
+def document_for(instance):
+    '''Returns (key, course id, title, body) for an indexed model instance.
+
+    The key packs the model and the primary key into one integer, so that
+    it can double as the rowid of the FTS5 table.
+    '''
+    if isinstance(instance, models.Course):
+        return (instance.pk * 4, instance.pk,
+                instance.title, instance.description)
+    if isinstance(instance, models.Text):
+        body = '{}\n{}'.format(instance.description, instance.content)
+        return (instance.pk * 4 + 1, instance.course_id, instance.title, body)
+    return (instance.pk * 4 + 2, instance.course_id,
+            instance.title, instance.description)
+
+
+# The FTS5 table isn't a model, so its queries go to the databases the
+# router picks for SearchTerm: writes to the primary, searches from the
+# replicas inside read_from_replicas().
+
+def write_connection():
+    return connections[router.db_for_write(models.SearchTerm)]
+
+
+def read_connection():
+    return connections[router.db_for_read(models.SearchTerm)]
+
+
+def fts_available():
+    '''True when the database has the FTS5 table created by the migrations'''
+    global _fts_available
+    if _fts_available is None:
+        connection = write_connection()
+        _fts_available = (
+            connection.vendor == 'sqlite' and
+            FTS_TABLE in connection.introspection.table_names()
+        )
+    return _fts_available
+
+
+# Both indexes find the courses having every word of the search, each
+# word as the start of a word anywhere in the course or its steps.
+
+class FTS5Index:
+    '''Search index kept in an SQLite FTS5 virtual table, ranked with bm25'''
+
+    def add(self, key, course_id, title, body):
+        self.add_many([(key, course_id, title, body)])
+
+    def add_many(self, documents):
+        with write_connection().cursor() as cursor:
+            cursor.executemany(
+                'DELETE FROM {} WHERE rowid = %s'.format(FTS_TABLE),
+                [[document[0]] for document in documents])
+            cursor.executemany(
+                'INSERT INTO {} (rowid, course_id, title, body) '
+                'VALUES (%s, %s, %s, %s)'.format(FTS_TABLE), documents)
+
+    def remove(self, key):
+        with write_connection().cursor() as cursor:
+            cursor.execute(
+                'DELETE FROM {} WHERE rowid = %s'.format(FTS_TABLE), [key])
+
+    def clear(self):
+        with write_connection().cursor() as cursor:
+            cursor.execute('DELETE FROM {}'.format(FTS_TABLE))
+
+    def search(self, words, limit, published_only=False):
+        # quote every word so user input can't use the FTS query syntax,
+        # and allow prefix matches on each of them
+        words = ['"{}"*'.format(word) for word in sorted(set(words))]
+        # a course matches when each word is in one of its rows
+        every_word = ' '.join(
+            'AND course_id IN (SELECT course_id FROM {table} '
+            'WHERE {table} MATCH %s)' for _ in words)
+        params = [' OR '.join(words)] + words
+        if published_only:
+            # before the limit, so drafts don't push published courses out
+            every_word += (' AND course_id IN (SELECT id FROM {courses} '
+                           'WHERE published = %s)')
+            params.append(True)
+        course_ids = []
+        with read_connection().cursor() as cursor:
+            # bm25() can't be used inside an aggregate, so keep the first,
+            # best ranked, match of every course
+            cursor.execute(
+                ('SELECT course_id FROM {table} WHERE {table} MATCH %s ' +
+                 every_word + ' ORDER BY bm25({table}, 0, %s, 1)'
+                 ).format(table=FTS_TABLE,
+                          courses=models.Course._meta.db_table),
+                params + [TITLE_WEIGHT])
+            for (course_id,) in cursor:
+                if course_id not in course_ids:
+                    course_ids.append(course_id)
+                    if len(course_ids) == limit:
+                        break
+        return course_ids
+
+
+class TermIndex:
+    '''Inverted index stored in the SearchTerm table, for any database'''
+
+    def add(self, key, course_id, title, body):
+        self.add_many([(key, course_id, title, body)])
+
+    def add_many(self, documents, batch_size=500):
+        terms = []
+        for key, course_id, title, body in documents:
+            weights = Counter()
+            for word in tokenize(title):
+                weights[word] += TITLE_WEIGHT
+            for word in tokenize(body):
+                weights[word] += 1
+            terms.extend(
+                models.SearchTerm(term=word, document=key,
+                                  course_id=course_id, weight=weight)
+                for word, weight in weights.items())
+        keys = [document[0] for document in documents]
+        # chunks stay under SQLite's limit of 999 parameters
+        for start in range(0, len(keys), batch_size):
+            models.SearchTerm.objects.filter(
+                document__in=keys[start:start + batch_size]).delete()
+        models.SearchTerm.objects.bulk_create(terms, batch_size=batch_size)
+
+    def remove(self, key):
+        models.SearchTerm.objects.filter(document=key).delete()
+
+    def clear(self):
+        models.SearchTerm.objects.all().delete()
+
+    def search(self, words, limit, published_only=False):
+        matches = Q()
+        for word in set(words):
+            matches |= Q(term__startswith=word)
+        rows = models.SearchTerm.objects.filter(matches)
+        if published_only:
+            rows = rows.filter(course__published=True)
+        for word in set(words):
+            rows = rows.filter(course__in=models.SearchTerm.objects.filter(
+                term__startswith=word).values('course'))
+        rows = rows.values('course').annotate(
+            score=Sum('weight')
+        ).order_by('-score')[:limit]
+        return [row['course'] for row in rows]
+
+
+def get_index():
+    if fts_available():
+        return FTS5Index()
+    return TermIndex()
+
+
+def index_instance(instance):
+    '''Adds or refreshes a Course, Text or Quiz in the search index'''
+    get_index().add(*document_for(instance))
+
+
+def index_instances(instances):
+    '''Adds or refreshes many courses and steps, for rows written in bulk'''
+    documents = [document_for(instance) for instance in instances]
+    if documents:
+        get_index().add_many(documents)
+
+
+def remove_instance(instance):
+    get_index().remove(document_for(instance)[0])
+
+
+def rebuild(batch_size=500):
+    '''Re-indexes every course and step, returning the number of documents'''
+    index = get_index()
+    total = 0
+    with transaction.atomic():
+        index.clear()
+        for model in (models.Course, models.Text, models.Quiz):
+            for instance in model.objects.order_by().iterator(chunk_size=batch_size):
+                index.add(*document_for(instance))
+                total += 1
+    return total
+
+
+def search(term, limit=RESULTS_LIMIT, published_only=False):
+    '''Returns the ids of courses matching every word of term, best first'''
+    words = tokenize(term)
+    if not words:
+        return []
+    return get_index().search(words, limit, published_only)
@@ -0,0 +1,190 @@
+from django.db.models import F
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import caching, changes, models, search
+from .rendering import MARKDOWN_FIELDS, markdown_cache
+
+
+def markdown_fields(instance):
+    return MARKDOWN_FIELDS[instance._meta.label]
+
+
+@receiver(post_init, sender=models.Course)
+@receiver(post_init, sender=models.Text)
+@receiver(post_init, sender=models.Quiz)
+def remember_markdown(sender, instance, **kwargs):
+    '''Keeps the markdown a row was loaded with, so we know what to evict'''
+    instance._markdown_sources = {
+        field: instance.__dict__.get(field) for field in markdown_fields(instance)
+    }
+
+
+@receiver(post_save, sender=models.Course)
+@receiver(post_save, sender=models.Text)
+@receiver(post_save, sender=models.Quiz)
+def invalidate_markdown(sender, instance, **kwargs):
+    for field, old_text in instance._markdown_sources.items():
+        if old_text and old_text != instance.__dict__.get(field):
+            markdown_cache.invalidate(old_text)
+    remember_markdown(sender, instance)
+
+
+@receiver(post_delete, sender=models.Course)
+@receiver(post_delete, sender=models.Text)
+@receiver(post_delete, sender=models.Quiz)
+def forget_markdown(sender, instance, **kwargs):
+    for text in instance._markdown_sources.values():
+        if text:
+            markdown_cache.invalidate(text)
+
+
+@receiver(post_save, sender=models.Course)
+@receiver(post_save, sender=models.Text)
+@receiver(post_save, sender=models.Quiz)
+def update_search_index(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_instance(instance)
+
+
+@receiver(post_delete, sender=models.Course)
+@receiver(post_delete, sender=models.Text)
+@receiver(post_delete, sender=models.Quiz)
+def remove_from_search_index(sender, instance, **kwargs):
+    search.remove_instance(instance)
+
+
+# Version stamps of the cached template fragments, and the updated_at used
+# for conditional GETs. A course page lists its steps and their question
+# counts, so changes below a course count as changes to the course too.
+
+@receiver(post_save, sender=models.Course)
+@receiver(post_delete, sender=models.Course)
+def stamp_course(sender, instance, **kwargs):
+    caching.bump_stamp('course', instance.pk)
+
+
+@receiver(post_save, sender=models.Text)
+@receiver(post_delete, sender=models.Text)
+@receiver(post_save, sender=models.Quiz)
+@receiver(post_delete, sender=models.Quiz)
+def stamp_step(sender, instance, **kwargs):
+    caching.bump_stamp(instance._meta.model_name, instance.pk)
+    now = timezone.now()
+    for course_id in {instance._original_course_id, instance.course_id}:
+        if course_id is not None:
+            caching.touch(models.Course, course_id, now)
+
+
+@receiver(post_save, sender=models.Question)
+@receiver(post_delete, sender=models.Question)
+@receiver(post_save, sender=models.MultipleChoiceQuestion)
+@receiver(post_save, sender=models.TrueFalseQuestion)
+def stamp_question(sender, instance, **kwargs):
+    caching.quiz_changed(instance.quiz_id)
+
+
+@receiver(post_save, sender=models.Answer)
+@receiver(post_delete, sender=models.Answer)
+def stamp_answer(sender, instance, **kwargs):
+    quiz_id = models.Question.objects.filter(
+        pk=instance.question_id
+    ).values_list('quiz_id', flat=True).first()
+    if quiz_id is not None:
+        caching.quiz_changed(quiz_id)
+
+
+def adjust_step_counts(step, course_id, delta):
+    counter = 'text_count' if isinstance(step, models.Text) else 'quiz_count'
+    models.Course.objects.filter(pk=course_id).update(**{
+        counter: F(counter) + delta,
+        'total_steps': F('total_steps') + delta,
+    })
+    caching.bump_version('catalog')
+
+
+@receiver(post_init, sender=models.Text)
+@receiver(post_init, sender=models.Quiz)
+def remember_course(sender, instance, **kwargs):
+    instance._original_course_id = instance.__dict__.get('course_id')
+
+
+@receiver(post_save, sender=models.Text)
+@receiver(post_save, sender=models.Quiz)
+def count_saved_step(sender, instance, created, **kwargs):
+    if created:
+        adjust_step_counts(instance, instance.course_id, 1)
+    elif instance._original_course_id != instance.course_id:
+        adjust_step_counts(instance, instance._original_course_id, -1)
+        adjust_step_counts(instance, instance.course_id, 1)
+    remember_course(sender, instance)
+
+
+@receiver(post_delete, sender=models.Text)
+@receiver(post_delete, sender=models.Quiz)
+def count_deleted_step(sender, instance, **kwargs):
+    adjust_step_counts(instance, instance.course_id, -1)
+
+
+@receiver(post_save, sender=models.Course)
+@receiver(post_delete, sender=models.Course)
+def invalidate_catalog(sender, instance, **kwargs):
+    caching.bump_version('catalog')
+
+
+@receiver(post_init, sender=models.Course)
+def remember_nav_state(sender, instance, **kwargs):
+    instance._nav_state = nav_state(instance)
+
+
+def nav_state(course):
+    '''The fields of a course that the navigation menu depends on'''
+    return tuple(course.__dict__.get(field)
+                 for field in ('published', 'title', 'created_at'))
+
+
+@receiver(post_save, sender=models.Course)
+def invalidate_nav(sender, instance, created, **kwargs):
+    if created or instance._nav_state != nav_state(instance):
+        caching.bump_version('nav')
+    remember_nav_state(sender, instance)
+
+
+@receiver(post_delete, sender=models.Course)
+def invalidate_nav_on_delete(sender, instance, **kwargs):
+    if instance.published:
+        caching.bump_version('nav')
+
+
+# The change log, see courses.changes. update() and the bulk methods skip
+# these, so the code using them logs its changes itself.
+
+@receiver(post_init, sender=models.Course)
+def remember_published(sender, instance, **kwargs):
+    instance._logged_published = instance.__dict__.get('published')
+
+
+@receiver(post_save, sender=models.Course)
+def log_saved_course(sender, instance, created, **kwargs):
+    if not created and instance._logged_published != instance.published:
+        # its steps, questions and answers appear or disappear with it
+        changes.log_course_trees([instance.pk])
+    else:
+        changes.log_instance(instance)
+    remember_published(sender, instance)
+
+
+@receiver(post_save, sender=models.Text)
+@receiver(post_save, sender=models.Quiz)
+@receiver(post_save, sender=models.Question)
+@receiver(post_save, sender=models.MultipleChoiceQuestion)
+@receiver(post_save, sender=models.TrueFalseQuestion)
+@receiver(post_save, sender=models.Answer)
+@receiver(post_delete, sender=models.Course)
+@receiver(post_delete, sender=models.Text)
+@receiver(post_delete, sender=models.Quiz)
+@receiver(post_delete, sender=models.Question)
+@receiver(post_delete, sender=models.Answer)
+def log_change(sender, instance, **kwargs):
+    changes.log_instance(instance)
@@ -0,0 +1,188 @@
+import json
+import multiprocessing
+import os
+import re
+import shutil
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.http import Http404
+from django.test import RequestFactory
+from django.urls import reverse
+
+from . import models, steps, views
+from .templatetags.course_extras import nav_courses_list
+from .transfer import close_connections
+
+
+# Renders the public pages of published courses to files, through the same
+# views and templates as the site, so a CDN or any web server can serve
+# them without Django. Each page goes to <its URL>/index.html:
+#
+#   courses/index.html              every published course, newest first
+#   courses/<pk>/index.html         a course and all its steps
+#   courses/<pk>/t<pk>/index.html   a text
+#   courses/<pk>/q<pk>/index.html   a quiz
+#
+# Quizzes are still graded by the site: their forms post to
+# STATIC_EXPORT_SITE_URL, or to the host serving the pages when it's
+# empty (so the export has to be served from the site's own host). The
+# pages carry no CSRF token, so the host serving them has to be the
+# site's or one of STATIC_EXPORT_ORIGINS, see views.from_exported_page.
+#
+# manifest.json keeps the updated_at each course was rendered at. Changes
+# to a course's steps, questions and answers touch the course (see
+# caching.touch), so an export only renders courses whose updated_at
+# moved, and removes courses that are gone or unpublished. Every page
+# shows the navigation menu, so when it changes everything is rendered.
+
+MANIFEST = 'manifest.json'
+
+# The exported pages have nowhere to go for the next page of a list
+ALL_ROWS = 1000000
+
+STEP_DIRECTORY = re.compile(r'^[tq]\d+$')
+
+course_list_view = views.CourseListView.as_view(
+    queryset=models.Course.objects.filter(published=True).order_by(
+        '-created_at', '-id'),
+    paginate_by=None)
+course_view = views.CourseDetail.as_view(steps_per_page=ALL_ROWS)
+text_view = views.TextDetail.as_view()
+quiz_view = views.QuizDetail.as_view()
+
+
+def render_page(view, path, **kwargs):
+    '''The HTML of path as an anonymous reader gets it, or Http404'''
+    request = RequestFactory().get(path)
+    request.user = AnonymousUser()
+    # quiz forms leave out their CSRF token and post to the live site
+    request.static_export = True
+    request.site_url = getattr(settings, 'STATIC_EXPORT_SITE_URL', '').rstrip('/')
+    response = view(request, **kwargs)
+    if hasattr(response, 'render'):
+        response.render()
+    return response.content
+
+
+def page_path(directory, path):
+    return os.path.join(directory, path.strip('/'), 'index.html')
+
+
+def write_page(directory, path, content):
+    filename = page_path(directory, path)
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    # readers of the directory never see half a page
+    temporary = filename + '.tmp'
+    with open(temporary, 'wb') as page_file:
+        page_file.write(content)
+    os.replace(temporary, filename)
+
+
+def remove_course(directory, course_id):
+    shutil.rmtree(os.path.dirname(page_path(
+        directory, reverse('courses:detail', kwargs={'pk': course_id}))),
+        ignore_errors=True)
+
+
+def export_course(directory, course_id):
+    '''Renders a course's page and the pages of its steps.
+
+    Returns how many pages were written, None when the course isn't
+    published any more.
+    '''
+    course_path = reverse('courses:detail', kwargs={'pk': course_id})
+    try:
+        write_page(directory, course_path,
+                   render_page(course_view, course_path, pk=course_id))
+    except Http404:
+        return None
+    written = set()
+    for step in steps.step_page(course_id, per_page=ALL_ROWS):
+        path = step.get_absolute_url()
+        view = text_view if step.kind == steps.TEXT else quiz_view
+        try:
+            content = render_page(view, path, course_pk=course_id,
+                                  step_pk=step.pk)
+        except Http404:
+            continue  # deleted meanwhile
+        write_page(directory, path, content)
+        written.add(step.key)
+    # steps deleted since the last export
+    course_directory = os.path.dirname(page_path(directory, course_path))
+    for name in os.listdir(course_directory):
+        if STEP_DIRECTORY.match(name) and name not in written:
+            shutil.rmtree(os.path.join(course_directory, name))
+    return len(written) + 1
+
+
+def export_task(arguments):
+    return arguments[1], export_course(*arguments)
+
+
+def read_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST), encoding='utf-8') as manifest:
+            return json.load(manifest)
+    except FileNotFoundError:
+        return {'nav': None, 'courses': {}}
+
+
+def write_manifest(directory, manifest):
+    temporary = os.path.join(directory, MANIFEST + '.tmp')
+    with open(temporary, 'w', encoding='utf-8') as manifest_file:
+        json.dump(manifest, manifest_file, sort_keys=True)
+    os.replace(temporary, os.path.join(directory, MANIFEST))
+
+
+def export_site(directory, workers=1, full=False):
+    '''Renders the published courses that changed since the last export.
+
+    With several workers the courses are rendered in a process pool.
+    Returns counts of the courses rendered, removed and left unchanged,
+    and of the pages written.
+    '''
+    os.makedirs(directory, exist_ok=True)
+    previous = read_manifest(directory)
+    nav = json.dumps(nav_courses_list()['courses'], sort_keys=True)
+    rendered = {} if full or previous['nav'] != nav else previous['courses']
+    # read before rendering, so a course edited meanwhile is rendered again
+    # by the next export
+    stamps = {str(pk): updated_at.isoformat() for pk, updated_at in
+              models.Course.objects.filter(published=True).values_list(
+                  'pk', 'updated_at')}
+    changed = [int(pk) for pk, stamp in stamps.items()
+               if rendered.get(pk) != stamp]
+    removed = [int(pk) for pk in previous['courses'] if pk not in stamps]
+
+    for course_id in removed:
+        remove_course(directory, course_id)
+    tasks = [(directory, course_id) for course_id in changed]
+    if workers > 1 and len(tasks) > 1:
+        close_connections()
+        with multiprocessing.Pool(workers, initializer=close_connections) as pool:
+            results = list(pool.imap_unordered(export_task, tasks))
+    else:
+        results = [export_task(task) for task in tasks]
+
+    unchanged = len(stamps) - len(changed)
+    pages = 0
+    for course_id, written in results:
+        if written is None:
+            # unpublished while exporting
+            del stamps[str(course_id)]
+            remove_course(directory, course_id)
+        else:
+            pages += written
+    list_path = reverse('courses:list')
+    if changed or removed or not os.path.exists(page_path(directory, list_path)):
+        write_page(directory, list_path,
+                   render_page(course_list_view, list_path))
+        pages += 1
+    write_manifest(directory, {'nav': nav, 'courses': stamps})
+    return {
+        'rendered': len(changed),
+        'removed': len(removed),
+        'unchanged': unchanged,
+        'pages': pages,
+    }
@@ -0,0 +1,114 @@
+from django.db.models import (CharField, Count, IntegerField, OuterRef, Q,
+                              Subquery, Value)
+from django.db.models.functions import Coalesce
+from django.http import Http404
+from django.urls import reverse
+
+from . import models
+from .pagination import CursorPage, decode_cursor, encode_cursor
+
+
+# Texts and quizzes live in two tables. A course's steps are read with one
+# UNION ALL of both, each half walking its (course_id, order) index, and
+# ordered on (order, kind, id) by the database so they can be paged.
+
+TEXT = 't'
+QUIZ = 'q'
+
+STEP_FIELDS = ('id', 'title', 'description_html', 'order')
+
+
+class StepRow:
+    '''A text or quiz as listed on its course's page'''
+
+    def __init__(self, course_id, id, title, description_html, order, kind,
+                 question_count):
+        self.course_id = course_id
+        self.id = self.pk = id
+        self.title = title
+        self.description_html = description_html
+        self.order = order
+        self.kind = kind
+        self.question_count = question_count
+
+    @property
+    def key(self):
+        return '{}{}'.format(self.kind, self.pk)
+
+    def get_absolute_url(self):
+        return reverse('courses:text' if self.kind == TEXT else 'courses:quiz',
+                       kwargs={'course_pk': self.course_id, 'step_pk': self.pk})
+
+
+def after(kind, position):
+    '''Filter for the rows of one half that come after position'''
+    if position is None:
+        return Q()
+    order, cursor_kind, pk = position
+    later = Q(order__gt=order)
+    if kind > cursor_kind:
+        return later | Q(order=order)
+    if kind == cursor_kind:
+        return later | Q(order=order, pk__gt=pk)
+    return later
+
+
+def question_count():
+    # a correlated count rather than a join, so no GROUP BY gets in the way
+    # of reading the index in order
+    return Coalesce(Subquery(
+        models.Question.objects.filter(
+            quiz=OuterRef('pk')
+        ).order_by().values('quiz').annotate(
+            count=Count('pk')
+        ).values('count'),
+        output_field=IntegerField()
+    ), 0)
+
+
+def steps_union(fields, position=None, **filters):
+    '''The UNION ALL of the texts and quizzes matching filters'''
+    texts = models.Text.objects.filter(
+        after(TEXT, position), **filters
+    ).annotate(
+        kind=Value(TEXT, output_field=CharField()),
+        question_count=Value(0, output_field=IntegerField()),
+    ).values_list(*fields, 'kind', 'question_count')
+    quizzes = models.Quiz.objects.filter(
+        after(QUIZ, position), **filters
+    ).annotate(
+        kind=Value(QUIZ, output_field=CharField()),
+        question_count=question_count(),
+    ).values_list(*fields, 'kind', 'question_count')
+    return texts.order_by().union(quizzes.order_by(), all=True)
+
+
+def steps_query(course_id, position=None):
+    '''The UNION ALL of a course's texts and quizzes, after position'''
+    return steps_union(STEP_FIELDS, position, course_id=course_id).order_by(
+        'order', 'kind', 'id')
+
+
+def steps_of_courses(course_ids):
+    '''StepRows of all the steps of several courses, in one query'''
+    return [StepRow(*row) for row in steps_union(
+        ('course_id',) + STEP_FIELDS, course_id__in=course_ids
+    ).order_by('course_id', 'order', 'kind', 'id')]
+
+
+def step_page(course_id, cursor=None, per_page=50):
+    '''A page of a course's steps in order, in one query'''
+    position = None
+    if cursor:
+        try:
+            order, kind, pk = decode_cursor(cursor)
+            position = (int(order), kind, int(pk))
+        except ValueError:
+            raise Http404('Invalid cursor')
+    rows = [StepRow(course_id, *row)
+            for row in steps_query(course_id, position)[:per_page + 1]]
+    if len(rows) <= per_page:
+        return CursorPage(rows)
+    rows = rows[:per_page]
+    last = rows[-1]
+    return CursorPage(rows, encode_cursor(last.order, last.kind, last.pk))
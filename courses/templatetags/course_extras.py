@@ -1,31 +1,81 @@
+import random
+
 from django import template
+from django.core.cache import cache
 from django.utils.safestring import mark_safe
 
-import markdown2
-
+from courses import caching
 from courses.models import Course
+from courses.rendering import render_markdown
+from learning_site.routers import read_from_primary
 
 
 register = template.Library() 
 
 @register.simple_tag
 def newest_course():
-    '''Gets the most recent course that was added to the library'''
-    return Course.objects.filter(published=True).latest('created_at')
+    '''Gets the most recent course that was added to the library.
+
+    Cached under the nav version like the menu. Only its pk and title are
+    kept, so the Course returned is unsaved and has just those fields;
+    None when nothing is published.
+    '''
+    key = caching.versioned_key('nav', 'newest_course')
+    newest = cache.get(key)
+    if newest is None:
+        with read_from_primary():
+            newest = Course.objects.filter(published=True).order_by(
+                '-created_at', '-id').values('id', 'title').first()
+        # an empty dict, not None, when there's no course to cache
+        cache.set(key, newest or {}, None)
+    return Course(**newest) if newest else None
 
 
 @register.inclusion_tag('courses/course_nav.html')
 def nav_courses_list(): 
     '''Returns dictionary of courses to display as navigation pane'''
-    courses = Course.objects.filter(
-        published=True
-    ).order_by(
-        '-created_at'
-    ).values('id', 'title'
-             )[:5]
+    key = caching.versioned_key('nav', 'courses')
+    courses = cache.get(key)
+    if courses is None:
+        # a lagging replica would cache the menu from before the change
+        # that bumped its version
+        with read_from_primary():
+            courses = list(Course.objects.filter(
+                published=True
+            ).order_by(
+                '-created_at'
+            ).values('id', 'title'
+                     )[:5])
+        cache.set(key, courses, None)
     return {'courses': courses}
 
 
+@register.filter('version_stamp')
+def version_stamp(instance):
+    '''Returns the version stamp to key the cached fragments of instance on.
+
+    The stamp changes as soon as the instance is saved, but a replica may
+    still return the old row. The row's updated_at is part of the key too,
+    so a fragment rendered from the old row is cached under the old row's
+    key and not the new one.
+    '''
+    return '{}:{}'.format(caching.get_stamp(instance),
+                          instance.updated_at.isoformat())
+
+
+@register.filter('shuffled')
+def shuffled(items, shuffle=True):
+    '''Returns items in random order when shuffle is set.
+
+    Answers are graded by pk, so their order on the page doesn't matter.
+    Inside a cached fragment the order only changes with the cache.
+    '''
+    items = list(items)
+    if shuffle:
+        random.shuffle(items)
+    return items
+
+
 @register.filter('time_estimate')
 def time_estimate(word_count):
     '''Estimates the number of minutes it will take to complete a step
@@ -38,5 +88,5 @@ def time_estimate(word_count):
 @register.filter('markdown_to_html')
 def markdown_to_html(markdown_text):
     '''Converts markdown text to HTML'''
-    html_body = markdown2.markdown(markdown_text)
+    html_body = render_markdown(markdown_text)
     return mark_safe(html_body)
\ No newline at end of file
@@ -1,47 +1,103 @@
-from django.core.urlresolvers import reverse
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.urls import reverse
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
+from django.utils.http import parse_http_date
+
+from learning_site.profiling import QueryBudgetExceeded, view_stats
 
-from .models import Course, Step
+from . import (attempts, caching, changes, grading, ordering, search,
+               static_export, steps, transfer)
+from .counters import AttemptCounter, quiz_attempts
+from .benchmarks.catalog import CatalogGenerator
+from .benchmarks.explain import explain_hot_queries
+from .benchmarks.runner import run_benchmarks
+from .admin import make_in_review, make_published
+from .models import (Answer, AnswerStats, Course, MultipleChoiceQuestion,
+                     QuestionResponse, QuestionStats, Quiz, QuizAttempt,
+                     QuizStats, Text, TrueFalseQuestion)
+from .rendering import MarkdownCache, markdown_cache
+from .templatetags.course_extras import nav_courses_list, newest_course
+from .views import CourseDetail
 
 
 class CourseModelTests(TestCase):
+    def setUp(self):
+        self.teacher = User.objects.create_user('teacher')
+
     def test_course_creation(self):
         course = Course.objects.create(
             title="Python Regular Expressions",
-            description="Learn to write regular expressions in Python"
+            description="Learn to write regular expressions in Python",
+            teacher=self.teacher
         )
         now = timezone.now()
         self.assertLess(course.created_at, now)
 
 
+    def test_saving_description_alone_renders_it(self):
+        course = Course.objects.create(title="Markdown", description="*old*",
+                                       teacher=self.teacher)
+        course.description = "*new*"
+        course.save(update_fields=['description'])
+        course.refresh_from_db()
+        self.assertIn('<em>new</em>', course.description_html)
+
+
 class StepModelTests(TestCase):
     def setUp(self):
         self.course = Course.objects.create(
             title="Python Testing",
-            description="Learn to write tests in Python"
+            description="Learn to write tests in Python",
+            teacher=User.objects.create_user('teacher')
         )
-        
+
     def test_step_creation(self):
-        step = Step.objects.create(
+        step = Text.objects.create(
             title="Introduction to Doctests",
             description="Learn to write tests in your docstrings.",
             course=self.course
         )
-        self.assertIn(step, self.course.step_set.all())
+        self.assertIn(step, self.course.text_set.all())
+
+    def test_saving_content_alone_renders_it(self):
+        step = Text.objects.create(title="Markdown", description="",
+                                   content="*old*", course=self.course)
+        step.content = "*new*"
+        step.save(update_fields=['content'])
+        step.refresh_from_db()
+        self.assertIn('<em>new</em>', step.content_html)
 
 
 class CourseViewsTests(TestCase):
     def setUp(self):
+        teacher = User.objects.create_user('teacher')
         self.course = Course.objects.create(
             title="Python Testing",
-            description="Learn to write tests in Python"
+            description="Learn to write tests in Python",
+            teacher=teacher,
+            published=True
         )
         self.course2 = Course.objects.create(
             title="New Course",
-            description="A new course"
+            description="A new course",
+            teacher=teacher,
+            published=True
         )
-        self.step = Step.objects.create(
+        self.step = Text.objects.create(
             title="Introduction to Doctests",
             description="Learn to write tests in your docstrings.",
             course=self.course
@@ -62,8 +118,1306 @@ class CourseViewsTests(TestCase):
         self.assertEqual(self.course, resp.context['course'])
 
     def test_step_detail_view(self):
-        resp = self.client.get(reverse('courses:step', kwargs={
+        resp = self.client.get(reverse('courses:text', kwargs={
                     'course_pk': self.course.pk,
                     'step_pk': self.step.pk}))
         self.assertEqual(resp.status_code, 200)
-        self.assertEqual(self.step, resp.context['step'])
\ No newline at end of file
+        self.assertEqual(self.step, resp.context['step'])
+
+    def test_detail_views_serve_stored_html(self):
+        self.course.description = "Learn *tests*"
+        self.course.save()
+        resp = self.client.get(reverse('courses:detail',
+                                       kwargs={'pk': self.course.pk}))
+        self.assertContains(resp, '<em>tests</em>')
+
+    def test_backfill_html_renders_existing_rows(self):
+        Text.objects.update(description_html='', content_html='')
+        Text.objects.filter(pk=self.step.pk).update(content='**bold**')
+        call_command('backfill_html', batch_size=1, stdout=StringIO())
+        step = Text.objects.get(pk=self.step.pk)
+        self.assertIn('<strong>bold</strong>', step.content_html)
+        self.assertIn('docstrings', step.description_html)
+
+    def test_backfill_html_renders_missing_content(self):
+        # the description was rendered, the content wasn't
+        Text.objects.filter(pk=self.step.pk).update(content='**bold**',
+                                                    content_html='')
+        call_command('backfill_html', stdout=StringIO())
+        self.assertIn('<strong>bold</strong>',
+                      Text.objects.get(pk=self.step.pk).content_html)
+
+
+class MarkdownCacheTests(TestCase):
+    def setUp(self):
+        markdown_cache.clear()
+
+    def test_repeated_render_is_a_hit(self):
+        cache = MarkdownCache(max_size=10)
+        first = cache.render("*hello*")
+        second = cache.render("*hello*")
+        self.assertEqual(first, second)
+        self.assertIn('<em>hello</em>', first)
+        self.assertEqual(cache.stats()['misses'], 1)
+        self.assertEqual(cache.stats()['hits'], 1)
+
+    def test_lru_is_bounded(self):
+        cache = MarkdownCache(max_size=2)
+        for text in ('one', 'two', 'three'):
+            cache.render(text)
+        self.assertEqual(cache.stats()['size'], 2)
+        cache.render('one')
+        self.assertEqual(cache.stats()['misses'], 4)
+
+    def test_counters_add_up_across_threads(self):
+        cache = MarkdownCache(max_size=5)
+
+        def render():
+            for number in range(200):
+                cache.render(str(number % 10))
+        threads = [threading.Thread(target=render) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats = cache.stats()
+        self.assertEqual(
+            stats['hits'] + stats['shared_hits'] + stats['misses'], 800)
+
+    def test_saving_a_row_evicts_its_old_render(self):
+        course = Course.objects.create(
+            title="Markdown",
+            description="# Old",
+            teacher=User.objects.create_user('teacher')
+        )
+        course.description = "# New"
+        course.save()
+        misses = markdown_cache.stats()['misses']
+        markdown_cache.render("# Old")
+        self.assertEqual(markdown_cache.stats()['misses'], misses + 1)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        teacher = User.objects.create_user('teacher')
+        self.regex = Course.objects.create(
+            title="Regular Expressions",
+            description="Match patterns in text",
+            teacher=teacher,
+            published=True
+        )
+        self.testing = Course.objects.create(
+            title="Python Testing",
+            description="Write tests",
+            teacher=teacher,
+            published=True
+        )
+        Text.objects.create(
+            title="Doctests",
+            description="Tests in docstrings",
+            content="Patterns for writing doctests",
+            course=self.testing
+        )
+
+    def check_search(self):
+        self.assertEqual(search.search("regular"), [self.regex.pk])
+        self.assertEqual(search.search("doctests"), [self.testing.pk])
+        self.assertCountEqual(search.search("patterns"),
+                              [self.regex.pk, self.testing.pk])
+        self.assertEqual(search.search("regular doctests"), [])
+        # prefixes, and words from different steps of a course
+        self.assertEqual(search.search("regul"), [self.regex.pk])
+        self.assertEqual(search.search("python doctests"), [self.testing.pk])
+        self.assertEqual(search.search("pattern_matching"), [])
+
+        Quiz.objects.create(title="Lookahead quiz", description="",
+                            course=self.regex)
+        self.assertEqual(search.search("lookahead"), [self.regex.pk])
+        self.regex.delete()
+        self.assertEqual(search.search("lookahead"), [])
+
+    def test_fts5_index(self):
+        if not search.fts_available():
+            self.skipTest("SQLite was built without FTS5")
+        self.check_search()
+
+    def test_term_index(self):
+        with mock.patch.object(search, 'fts_available', return_value=False):
+            search.rebuild()
+            self.check_search()
+
+    def test_backends_agree(self):
+        if not search.fts_available():
+            self.skipTest("SQLite was built without FTS5")
+        with mock.patch.object(search, 'fts_available', return_value=False):
+            search.rebuild()
+        for term in ("patterns", "pat", "tests", "write doc", "python match",
+                     "text", "docstring", "expressions regular"):
+            words = search.tokenize(term)
+            self.assertCountEqual(search.FTS5Index().search(words, 10),
+                                  search.TermIndex().search(words, 10), term)
+
+    def check_drafts_dont_crowd_out_published_courses(self):
+        Course.objects.bulk_create([
+            Course(title="Patterns draft {}".format(number), description="",
+                   teacher=self.regex.teacher)
+            for number in range(search.RESULTS_LIMIT + 5)])
+        search.index_instances(Course.objects.filter(published=False))
+        self.assertCountEqual(search.search("patterns", published_only=True),
+                              [self.regex.pk, self.testing.pk])
+        resp = self.client.get(reverse('courses:search'), {'q': 'patterns'})
+        self.assertEqual(set(resp.context['courses']),
+                         {self.regex, self.testing})
+        self.assertIsNone(resp.context['results_limit'])
+        self.assertEqual(len(search.search("patterns")), search.RESULTS_LIMIT)
+
+    def test_drafts_dont_crowd_out_published_courses(self):
+        if not search.fts_available():
+            self.skipTest("SQLite was built without FTS5")
+        self.check_drafts_dont_crowd_out_published_courses()
+
+    def test_drafts_dont_crowd_out_published_courses_in_terms(self):
+        with mock.patch.object(search, 'fts_available', return_value=False):
+            search.rebuild()
+            self.check_drafts_dont_crowd_out_published_courses()
+
+    def test_search_view_only_lists_published_courses(self):
+        self.regex.published = False
+        self.regex.save()
+        resp = self.client.get(reverse('courses:search'), {'q': 'patterns'})
+        self.assertEqual(list(resp.context['courses']), [self.testing])
+        self.assertEqual(resp.context['total']['total'], 1)
+
+
+class StepCountTests(TestCase):
+    def setUp(self):
+        teacher = User.objects.create_user('teacher')
+        self.course = Course.objects.create(title="One", description="",
+                                            teacher=teacher, published=True)
+        self.other = Course.objects.create(title="Two", description="",
+                                           teacher=teacher, published=True)
+
+    def counts(self, course):
+        course.refresh_from_db()
+        return course.text_count, course.quiz_count, course.total_steps
+
+    def test_counts_follow_steps(self):
+        text = Text.objects.create(title="Text", description="",
+                                   course=self.course)
+        quiz = Quiz.objects.create(title="Quiz", description="",
+                                   course=self.course)
+        self.assertEqual(self.counts(self.course), (1, 1, 2))
+
+        quiz.course = self.other
+        quiz.save()
+        self.assertEqual(self.counts(self.course), (1, 0, 1))
+        self.assertEqual(self.counts(self.other), (0, 1, 1))
+
+        text.delete()
+        self.assertEqual(self.counts(self.course), (0, 0, 0))
+
+    def test_saving_a_course_keeps_its_counts(self):
+        course = Course.objects.get(pk=self.course.pk)
+        Text.objects.create(title="Text", description="", course=self.course)
+        course.title = "Renamed"
+        course.save()
+        self.assertEqual(self.counts(course), (1, 0, 1))
+
+    def test_repair_step_counts(self):
+        Text.objects.create(title="Text", description="", course=self.course)
+        Course.objects.update(text_count=5, total_steps=9)
+        call_command('repair_step_counts', stdout=StringIO())
+        self.assertEqual(self.counts(self.course), (1, 0, 1))
+        self.assertEqual(self.counts(self.other), (0, 0, 0))
+
+
+class CourseListPaginationTests(TestCase):
+    def setUp(self):
+        teacher = User.objects.create_user('teacher')
+        self.courses = []
+        for number in range(25):
+            course = Course.objects.create(title="Course {}".format(number),
+                                           description="", teacher=teacher,
+                                           published=True)
+            Text.objects.create(title="Text", description="", course=course)
+            self.courses.append(course)
+
+    def test_pages_follow_the_cursor(self):
+        resp = self.client.get(reverse('courses:list'))
+        first_page = list(resp.context['page_obj'])
+        self.assertEqual(first_page, self.courses[:-21:-1])
+        self.assertEqual(resp.context['total']['total'], 25)
+
+        resp = self.client.get(reverse('courses:list') +
+                               resp.context['next_page_url'])
+        self.assertEqual(list(resp.context['page_obj']), self.courses[4::-1])
+        self.assertNotIn('next_page_url', resp.context)
+
+    def test_total_is_cached_until_the_catalog_changes(self):
+        self.client.get(reverse('courses:list'))
+        with self.assertNumQueries(1):
+            resp = self.client.get(reverse('courses:list'))
+        self.assertEqual(resp.context['total']['total'], 25)
+
+        Text.objects.create(title="Another", description="",
+                            course=self.courses[0])
+        resp = self.client.get(reverse('courses:list'))
+        self.assertEqual(resp.context['total']['total'], 26)
+
+    def test_invalid_cursor(self):
+        resp = self.client.get(reverse('courses:list'), {'cursor': 'nonsense'})
+        self.assertEqual(resp.status_code, 404)
+
+    def test_streaming_lists_every_course(self):
+        resp = self.client.get(reverse('courses:list'), {'stream': '1'})
+        self.assertTrue(resp.streaming)
+        content = b''.join(resp.streaming_content).decode('utf-8')
+        positions = [content.index(course.title + '<')
+                     for course in self.courses]
+        # newest first, like the pages
+        self.assertEqual(positions, sorted(positions, reverse=True))
+        self.assertIn('</html>', content)
+
+
+class NavigationCacheTests(TestCase):
+    def setUp(self):
+        self.teacher = User.objects.create_user('teacher')
+        self.course = Course.objects.create(title="Listed", description="",
+                                            teacher=self.teacher, published=True)
+
+    def test_nav_costs_no_queries_once_cached(self):
+        self.client.get(reverse('home'))
+        # only the count of new courses on the home page
+        with self.assertNumQueries(1):
+            resp = self.client.get(reverse('home'))
+        self.assertContains(resp, 'Listed</a>')
+
+    def test_nav_follows_publishing(self):
+        self.client.get(reverse('home'))
+        hidden = Course.objects.create(title="Hidden", description="",
+                                       teacher=self.teacher)
+        self.assertNotContains(self.client.get(reverse('home')), 'Hidden</a>')
+        hidden.published = True
+        hidden.save()
+        self.assertContains(self.client.get(reverse('home')), 'Hidden</a>')
+
+    def test_newest_course_is_cached_until_the_nav_changes(self):
+        newest_course()
+        with self.assertNumQueries(0):
+            course = newest_course()
+        self.assertEqual((course.pk, str(course)), (self.course.pk, "Listed"))
+        self.assertEqual(course.get_absolute_url(),
+                         self.course.get_absolute_url())
+        newer = Course.objects.create(title="Newer", description="",
+                                      teacher=self.teacher, published=True)
+        self.assertEqual(newest_course().pk, newer.pk)
+        make_in_review(None, None, Course.objects.all())
+        self.assertIsNone(newest_course())
+
+    def test_nav_follows_admin_bulk_actions(self):
+        self.client.get(reverse('home'))
+        make_in_review(None, None, Course.objects.all())
+        self.assertNotContains(self.client.get(reverse('home')), 'Listed</a>')
+
+
+class FragmentCacheTests(TestCase):
+    def setUp(self):
+        self.course = Course.objects.create(
+            title="Cached", description="About caching",
+            teacher=User.objects.create_user('teacher'), published=True)
+        self.quiz = Quiz.objects.create(title="Quiz", description="",
+                                        course=self.course)
+        self.question = TrueFalseQuestion.objects.create(
+            quiz=self.quiz, prompt="Caching is hard")
+        self.answer = Answer.objects.create(question=self.question,
+                                            text="True", correct=True)
+        self.quiz_url = reverse('courses:quiz', kwargs={
+            'course_pk': self.course.pk, 'step_pk': self.quiz.pk})
+
+    def test_cached_pages_skip_the_step_queries(self):
+        detail_url = reverse('courses:detail', kwargs={'pk': self.course.pk})
+        self.client.get(detail_url)
+        self.client.get(self.quiz_url)
+        # the modification time and the course
+        with self.assertNumQueries(2):
+            self.assertContains(self.client.get(detail_url), 'Quiz</a>')
+        with self.assertNumQueries(2):
+            self.assertContains(self.client.get(self.quiz_url), 'Caching is hard')
+
+    def test_answer_changes_refresh_the_quiz(self):
+        self.client.get(self.quiz_url)
+        self.answer.text = "Definitely"
+        self.answer.save()
+        self.assertContains(self.client.get(self.quiz_url), 'Definitely')
+
+    def test_edit_buttons_are_not_cached(self):
+        edit_url = reverse('courses:edit_question', kwargs={
+            'quiz_pk': self.quiz.pk, 'question_pk': self.question.pk})
+        self.assertNotContains(self.client.get(self.quiz_url), edit_url)
+        self.client.force_login(self.course.teacher)
+        self.assertContains(self.client.get(self.quiz_url), edit_url)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.course = Course.objects.create(
+            title="Conditional", description="",
+            teacher=User.objects.create_user('teacher'), published=True)
+        self.quiz = Quiz.objects.create(title="Quiz", description="",
+                                        course=self.course)
+        self.url = reverse('courses:quiz', kwargs={
+            'course_pk': self.course.pk, 'step_pk': self.quiz.pk})
+
+    def test_unchanged_page_is_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(1):
+            resp = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+
+    def test_new_question_changes_the_etag(self):
+        resp = self.client.get(self.url)
+        TrueFalseQuestion.objects.create(quiz=self.quiz, prompt="Fresh?")
+        resp = self.client.get(self.url, HTTP_IF_NONE_MATCH=resp['ETag'],
+                               HTTP_IF_MODIFIED_SINCE=resp['Last-Modified'])
+        self.assertEqual(resp.status_code, 200)
+        self.assertContains(resp, 'Fresh?')
+
+    def test_navigation_changes_modify_the_page(self):
+        resp = self.client.get(self.url)
+        # another course shows up in the menu of every page
+        Course.objects.create(title="Elsewhere", description="",
+                              teacher=self.course.teacher, published=True)
+        resp = self.client.get(self.url, HTTP_IF_NONE_MATCH=resp['ETag'])
+        self.assertEqual(resp.status_code, 200)
+        self.assertContains(resp, 'Elsewhere')
+        self.assertEqual(parse_http_date(resp['Last-Modified']),
+                         int(caching.version_time('nav').timestamp()))
+
+    def test_signed_in_users_get_their_own_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        self.client.force_login(self.course.teacher)
+        resp = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+
+    def test_unpublished_course_is_not_found(self):
+        self.course.published = False
+        self.course.save()
+        resp = self.client.get(reverse('courses:detail',
+                                       kwargs={'pk': self.course.pk}))
+        self.assertEqual(resp.status_code, 404)
+
+
+class CourseDetailQueryBudgetTests(TestCase):
+    '''CourseDetail has to cost the same number of queries for any course'''
+    budget = 3
+
+    def setUp(self):
+        self.teacher = User.objects.create_user('teacher')
+
+    def make_course(self, steps):
+        course = Course.objects.create(title="Budget", description="",
+                                       teacher=self.teacher, published=True)
+        for order in range(steps):
+            Text.objects.create(title="Text", description="", order=order,
+                                course=course)
+            quiz = Quiz.objects.create(title="Quiz", description="",
+                                       order=order, course=course)
+            for number in range(3):
+                TrueFalseQuestion.objects.create(quiz=quiz, prompt="Question")
+        return course
+
+    def assertWithinBudget(self, course):
+        url = reverse('courses:detail', kwargs={'pk': course.pk})
+        self.client.get(url)
+        # render the course again, but not the navigation menu
+        caching.bump_stamp('course', course.pk)
+        with self.assertNumQueries(self.budget):
+            resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        return resp
+
+    def test_budget_does_not_grow_with_steps(self):
+        self.assertWithinBudget(self.make_course(steps=1))
+        resp = self.assertWithinBudget(self.make_course(steps=20))
+        self.assertEqual(len(resp.context['steps']), 40)
+        self.assertContains(resp, '<dd>3</dd>', count=20)
+
+    def test_steps_are_paged_in_order(self):
+        course = self.make_course(steps=3)
+        page = steps.step_page(course.pk, per_page=4)
+        self.assertEqual([(step.order, step.kind) for step in page],
+                         [(0, 'q'), (0, 't'), (1, 'q'), (1, 't')])
+        with self.assertNumQueries(1):
+            rest = steps.step_page(course.pk, page.next_cursor, per_page=4)
+        self.assertEqual([(step.order, step.kind) for step in rest],
+                         [(2, 'q'), (2, 't')])
+        self.assertFalse(rest.has_next())
+
+        url = reverse('courses:detail', kwargs={'pk': course.pk})
+        with mock.patch.object(CourseDetail, 'steps_per_page', 4):
+            resp = self.client.get(url)
+            self.assertContains(resp, '?steps=' + page.next_cursor)
+            resp = self.client.get(url, {'steps': page.next_cursor})
+        self.assertEqual(len(resp.context['steps']), 2)
+
+
+@override_settings(QUERY_BUDGETS_STRICT=True)
+class QueryBudgetTests(TestCase):
+    def setUp(self):
+        teacher = User.objects.create_user('teacher', is_staff=True)
+        self.course = Course.objects.create(title="Budgets", description="",
+                                            teacher=teacher, published=True)
+        self.text = Text.objects.create(title="Text", description="",
+                                        content="Read *this*",
+                                        course=self.course)
+        self.quiz = Quiz.objects.create(title="Quiz", description="",
+                                        course=self.course)
+        question = TrueFalseQuestion.objects.create(quiz=self.quiz,
+                                                    prompt="True?")
+        Answer.objects.create(question=question, text="Yes", correct=True)
+        # budgets assume the navigation menu is cached
+        nav_courses_list()
+        view_stats.clear()
+
+    def test_views_stay_within_their_budgets(self):
+        for url in self.urls():
+            self.assertEqual(self.client.get(url).status_code, 200, url)
+
+    def urls(self):
+        return [
+            reverse('home'),
+            reverse('courses:list'),
+            reverse('courses:by_teacher', kwargs={'teacher': 'teacher'}),
+            reverse('courses:search') + '?q=budgets',
+            reverse('courses:detail', kwargs={'pk': self.course.pk}),
+            reverse('courses:text', kwargs={'course_pk': self.course.pk,
+                                            'step_pk': self.text.pk}),
+            reverse('courses:quiz', kwargs={'course_pk': self.course.pk,
+                                            'step_pk': self.quiz.pk}),
+            reverse('api_v1:courses') + '?embed=steps,quizzes.questions.answers',
+            reverse('api_v1:quiz', kwargs={'pk': self.quiz.pk}) + '?embed=questions',
+        ]
+
+    def test_budgets_hold_with_nothing_cached(self):
+        submit_url = reverse('courses:quiz_submit', kwargs={
+            'course_pk': self.course.pk, 'step_pk': self.quiz.pk})
+        for signed_in in (False, True):
+            if signed_in:
+                self.client.force_login(self.course.teacher)
+            for url in self.urls():
+                cache.clear()
+                self.assertEqual(self.client.get(url).status_code, 200, url)
+            cache.clear()
+            self.assertEqual(self.client.post(submit_url).status_code, 200)
+
+    @override_settings(QUERY_BUDGETS={'courses:list': 0})
+    def test_going_over_budget_fails(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get(reverse('courses:list'))
+
+    def test_report_is_for_staff(self):
+        self.client.get(reverse('courses:list'))
+        self.assertEqual(self.client.get(reverse('profiling')).status_code, 302)
+        self.client.force_login(self.course.teacher)
+        report = self.client.get(reverse('profiling')).json()
+        self.assertEqual(report['courses:list']['requests'], 1)
+        self.assertIn('p95', report['courses:list']['queries'])
+
+
+class BenchmarkTests(TestCase):
+    def test_generated_catalog_is_consistent(self):
+        generator = CatalogGenerator(courses=3, texts=2, quizzes=2, questions=3,
+                                     answers=4, teachers=2, published=1)
+        # only the generated rows are indexed
+        with mock.patch.object(search, 'rebuild', side_effect=AssertionError):
+            counts = generator.generate()
+        self.assertEqual(counts['courses'], 3)
+        self.assertEqual(Quiz.objects.count(), 6)
+        self.assertEqual(TrueFalseQuestion.objects.count(), 6)
+        self.assertEqual(Answer.objects.count(), 6 * 2 + 12 * 4)
+        course = Course.objects.first()
+        self.assertEqual((course.text_count, course.total_steps), (2, 4))
+        self.assertIn('<strong>', course.description_html)
+        self.assertIn(course.pk, search.search(course.title))
+        quiz = course.quiz_set.first()
+        self.assertIn(course.pk, search.search(quiz.title))
+
+    def test_every_url_is_benchmarked(self):
+        CatalogGenerator(courses=2, texts=1, quizzes=1, published=1).generate()
+        report = run_benchmarks(iterations=1)
+        results = {result['name']: result for result in report['results']}
+        self.assertEqual(results['courses:detail']['status'], 200)
+        self.assertEqual(results['courses:edit_question']['status'], 200)
+        self.assertNotIn('skipped', results['courses:quiz'])
+        self.assertEqual(results['courses:quiz_submit']['skipped'], 'POST only')
+        self.assertEqual(results['courses:reorder_steps']['skipped'], 'POST only')
+        for result in report['results']:
+            if 'skipped' not in result:
+                self.assertLess(result['status'], 400, result['name'])
+        self.assertEqual(report['catalog']['courses'], 2)
+
+    def test_hot_queries_are_explained(self):
+        CatalogGenerator(courses=4, texts=1, quizzes=1, published=1).generate()
+        report = explain_hot_queries(iterations=1, compare=True)
+        plans = report['with_indexes']
+        self.assertIn('courses_course_published', plans['course list']['plan'])
+        self.assertIn('courses_course_teacher',
+                      plans['courses by teacher']['plan'])
+        self.assertEqual(set(report['without_indexes']), set(plans))
+        # the indexes are back
+        self.assertIn('courses_course_published',
+                      Course.objects.filter(published=True).order_by(
+                          '-created_at').explain())
+
+
+class AttemptCounterTests(TestCase):
+    def setUp(self):
+        course = Course.objects.create(
+            title="Counted", description="",
+            teacher=User.objects.create_user('teacher'), published=True)
+        self.quiz = Quiz.objects.create(title="Quiz", description="",
+                                        course=course)
+        self.other = Quiz.objects.create(title="Other", description="",
+                                         course=course)
+
+    def test_attempts_are_buffered_until_flushed(self):
+        counter = AttemptCounter(flush_interval=3600)
+        for _ in range(3):
+            counter.record(self.quiz.pk)
+        counter.record(self.other.pk)
+        self.quiz.refresh_from_db()
+        self.assertEqual(self.quiz.times_taken, 0)
+        self.assertEqual(counter.times_taken(self.quiz), 3)
+
+        # one UPDATE per distinct count, inside a savepoint
+        with self.assertNumQueries(4):
+            self.assertEqual(counter.flush(), 4)
+        self.assertEqual(counter.counts([self.quiz.pk, self.other.pk]),
+                         {self.quiz.pk: 3, self.other.pk: 1})
+
+    def test_counters_add_up(self):
+        first, second = AttemptCounter(3600), AttemptCounter(3600)
+        first.record(self.quiz.pk)
+        second.record(self.quiz.pk, count=2)
+        first.flush()
+        second.flush()
+        self.quiz.refresh_from_db()
+        self.assertEqual(self.quiz.times_taken, 3)
+
+    def test_flushes_when_the_interval_has_passed(self):
+        AttemptCounter(flush_interval=0).record(self.quiz.pk)
+        self.quiz.refresh_from_db()
+        self.assertEqual(self.quiz.times_taken, 1)
+
+    def test_background_thread_flushes(self):
+        counter = AttemptCounter(flush_interval=0.01)
+        with mock.patch.object(counter, 'flush') as flush:
+            counter.start()
+            self.addCleanup(counter.stop)
+            deadline = time.monotonic() + 5
+            while flush.call_count < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertGreaterEqual(flush.call_count, 2)
+            counter.stop()
+        self.assertIsNone(counter.thread)
+
+    def test_autostart_starts_the_thread_on_the_first_attempt(self):
+        counter = AttemptCounter(flush_interval=3600, autostart=True)
+        self.addCleanup(counter.stop)
+        self.assertIsNone(counter.thread)
+        counter.record(self.quiz.pk)
+        self.assertTrue(counter.thread.is_alive())
+        manual = AttemptCounter(flush_interval=3600)
+        manual.record(self.quiz.pk)
+        self.assertIsNone(manual.thread)
+
+    def test_stop_flushes_the_rest(self):
+        counter = AttemptCounter(flush_interval=3600)
+        counter.record(self.quiz.pk)
+        counter.stop()
+        self.quiz.refresh_from_db()
+        self.assertEqual(self.quiz.times_taken, 1)
+
+
+class GradingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.course = Course.objects.create(
+            title="Graded", description="",
+            teacher=User.objects.create_user('teacher'), published=True)
+        self.quiz = Quiz.objects.create(title="Quiz", description="",
+                                        course=self.course)
+        self.mc = MultipleChoiceQuestion.objects.create(
+            quiz=self.quiz, prompt="Which are lists?", shuffle_answers=True)
+        self.right = Answer.objects.create(question=self.mc, text="[]",
+                                           correct=True)
+        self.also_right = Answer.objects.create(question=self.mc,
+                                                text="list()", correct=True)
+        self.wrong = Answer.objects.create(question=self.mc, text="{}")
+        self.tf = TrueFalseQuestion.objects.create(
+            quiz=self.quiz, prompt="Strings are immutable", order=1)
+        self.true = Answer.objects.create(question=self.tf, text="True",
+                                          correct=True)
+        self.false = Answer.objects.create(question=self.tf, text="False")
+
+    def submit(self, data):
+        return self.client.post(reverse('courses:quiz_submit', kwargs={
+            'course_pk': self.course.pk, 'step_pk': self.quiz.pk}), data)
+
+    def test_answer_key(self):
+        key = grading.get_answer_key(self.quiz.pk)
+        mc, tf = key.questions
+        self.assertEqual((mc.kind, mc.shuffle), (grading.MULTIPLE_CHOICE, True))
+        self.assertEqual(mc.correct_ids,
+                         frozenset([self.right.pk, self.also_right.pk]))
+        self.assertEqual(tf.kind, grading.TRUE_FALSE)
+        self.assertEqual(tf.answer_ids, frozenset([self.true.pk, self.false.pk]))
+
+    def test_grading(self):
+        key = grading.get_answer_key(self.quiz.pk)
+        result = key.grade({self.mc.pk: [self.also_right.pk, self.right.pk],
+                            self.tf.pk: [self.false.pk]})
+        self.assertEqual((result.score, result.total), (1, 2))
+        # half of the correct answers, or an extra wrong one, isn't right
+        self.assertEqual(key.grade({self.mc.pk: [self.right.pk]}).score, 0)
+        self.assertEqual(key.grade({self.mc.pk: [
+            self.right.pk, self.also_right.pk, self.wrong.pk]}).score, 0)
+        # answers of other questions don't count
+        self.assertEqual(key.grade({self.tf.pk: [self.right.pk]}).score, 0)
+
+    def test_cached_key_runs_no_queries(self):
+        grading.get_answer_key(self.quiz.pk)
+        with self.assertNumQueries(0):
+            grading.get_answer_key(self.quiz.pk)
+
+    def test_answer_changes_recompile_the_key(self):
+        grading.get_answer_key(self.quiz.pk)
+        self.false.correct = True
+        self.false.save()
+        key = grading.get_answer_key(self.quiz.pk)
+        self.assertIn(self.false.pk, key.questions[1].correct_ids)
+
+    def test_unpublishing_recompiles_the_key(self):
+        self.assertTrue(grading.get_answer_key(self.quiz.pk).published)
+        make_in_review(None, None, Course.objects.filter(pk=self.course.pk))
+        self.assertFalse(grading.get_answer_key(self.quiz.pk).published)
+        self.assertEqual(self.submit({}).status_code, 404)
+
+    def test_submit(self):
+        with mock.patch.object(quiz_attempts, 'record') as record:
+            resp = self.submit({
+                'question-{}'.format(self.mc.pk): [
+                    self.right.pk, self.also_right.pk],
+                'question-{}'.format(self.tf.pk): self.true.pk,
+            })
+        record.assert_called_once_with(self.quiz.pk)
+        self.assertTemplateUsed(resp, 'courses/quiz_result.html')
+        self.assertContains(resp, 'You got 2 out of 2')
+        self.assertContains(resp, 'You passed!')
+
+    def test_submit_ignores_values_that_are_not_ids(self):
+        resp = self.submit({
+            'question-{}'.format(self.mc.pk): [
+                self.right.pk, self.also_right.pk, '\u00b2', '9' * 5000],
+            'question-{}'.format(self.tf.pk): [self.true.pk, '1' * 5000],
+            'question-\u00b2': '1',
+            'question-' + '9' * 5000: '1',
+        })
+        self.assertEqual(resp.status_code, 200)
+        self.assertContains(resp, 'You got 2 out of 2')
+
+    def test_submit_needs_post(self):
+        resp = self.client.get(reverse('courses:quiz_submit', kwargs={
+            'course_pk': self.course.pk, 'step_pk': self.quiz.pk}))
+        self.assertEqual(resp.status_code, 405)
+
+    def test_quiz_page_has_a_form(self):
+        resp = self.client.get(self.quiz.get_absolute_url())
+        self.assertContains(resp, 'name="question-{}"'.format(self.mc.pk), 3)
+        self.assertContains(resp, 'type="radio"', 2)
+
+
+class QuizAttemptTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user('teacher', password='secret')
+        self.course = Course.objects.create(
+            title="Attempted", description="", teacher=self.teacher,
+            published=True)
+        self.quiz = Quiz.objects.create(title="Quiz", description="",
+                                        course=self.course)
+        self.questions = []
+        self.correct = []
+        for number in range(3):
+            question = TrueFalseQuestion.objects.create(
+                quiz=self.quiz, prompt="Question {}".format(number),
+                order=number)
+            self.correct.append(Answer.objects.create(
+                question=question, text="True", correct=True))
+            Answer.objects.create(question=question, text="False")
+            self.questions.append(question)
+        self.key = grading.get_answer_key(self.quiz.pk)
+
+    def take(self, right):
+        responses = {question.pk: [answer.pk]
+                     for question, answer in zip(self.questions[:right],
+                                                 self.correct)}
+        return attempts.record_attempt(self.key.grade(responses))
+
+    def test_attempt_is_saved_with_its_responses(self):
+        attempt = self.take(right=3)
+        self.assertEqual((attempt.score, attempt.total, attempt.passed),
+                         (3, 3, True))
+        responses = QuestionResponse.objects.filter(attempt=attempt)
+        self.assertEqual(responses.count(), 3)
+        self.assertEqual(responses.get(question=self.questions[0]).answer_ids(),
+                         [self.correct[0].pk])
+
+    def test_write_path_is_independent_of_quiz_size(self):
+        self.take(right=1)  # creates the statistics rows
+        # savepoint, attempt, responses, quiz stats x2, question stats x3,
+        # answer stats x2, release
+        with self.assertNumQueries(11):
+            self.take(right=2)
+
+    def test_statistics_are_kept_incrementally(self):
+        self.take(right=3)
+        self.take(right=1)
+        stats = QuizStats.objects.get(quiz=self.quiz)
+        self.assertEqual((stats.attempts, stats.passes), (2, 1))
+        self.assertEqual(stats.pass_rate, 0.5)
+        self.assertEqual(stats.average_score, 4 / 6)
+        first = QuestionStats.objects.get(question=self.questions[0])
+        last = QuestionStats.objects.get(question=self.questions[2])
+        self.assertEqual(first.difficulty, 0)
+        self.assertEqual(last.difficulty, 0.5)
+        distribution = attempts.answer_distribution([self.questions[0].pk])
+        self.assertEqual(sorted(distribution[self.questions[0].pk].values()),
+                         [0, 2])
+        self.assertEqual(QuizAttempt.objects.count(), 2)
+
+    def test_teacher_sees_quiz_statistics(self):
+        self.take(right=3)
+        url = reverse('courses:by_teacher', kwargs={'teacher': 'teacher'})
+        self.assertNotContains(self.client.get(url), 'Quiz statistics')
+        self.client.login(username='teacher', password='secret')
+        resp = self.client.get(url)
+        self.assertContains(resp, 'Quiz statistics')
+        self.assertEqual(list(resp.context['quiz_stats']),
+                         [QuizStats.objects.get(quiz=self.quiz)])
+
+
+class TransferTests(TestCase):
+    def setUp(self):
+        CatalogGenerator(courses=5, texts=2, quizzes=2, questions=3,
+                         answers=3, teachers=2, published=0.5).generate()
+
+    def export(self, **kwargs):
+        out = StringIO()
+        transfer.export_courses(out, **kwargs)
+        return out.getvalue().splitlines()
+
+    def test_export_is_one_course_tree_per_line(self):
+        with self.assertNumQueries(1 + 5 * 3):
+            lines = self.export(batch_size=2)
+        self.assertEqual(len(lines), 5)
+        tree = json.loads(lines[0])
+        self.assertEqual(len(tree['texts']), 2)
+        self.assertEqual(len(tree['quizzes'][0]['questions']), 3)
+        kinds = [question['kind'] for question in tree['quizzes'][0]['questions']]
+        self.assertEqual(kinds, ['mc', 'tf', 'mc'])
+        published = Course.objects.filter(published=True).count()
+        self.assertEqual(len(self.export(published_only=True)), published)
+
+    def test_round_trip(self):
+        lines = self.export()
+        before = {name: model.objects.count() for name, model in (
+            ('courses', Course), ('quizzes', Quiz), ('answers', Answer))}
+        # only the imported rows are indexed
+        with mock.patch.object(search, 'rebuild', side_effect=AssertionError):
+            counts = transfer.CourseImporter(batch_size=2).import_lines(lines)
+        self.assertEqual(counts['courses'], 5)
+        self.assertEqual(Course.objects.count(), 2 * before['courses'])
+        self.assertEqual(Answer.objects.count(), 2 * before['answers'])
+
+        original = Course.objects.order_by('pk').first()
+        copy = Course.objects.exclude(pk=original.pk).filter(
+            title=original.title, created_at=original.created_at).get()
+        self.assertEqual(copy.total_steps, original.total_steps)
+        self.assertEqual(copy.description_html, original.description_html)
+        self.assertEqual(copy.teacher, original.teacher)
+        self.assertIn(copy.pk, search.search(copy.title))
+        text = copy.text_set.first()
+        self.assertIn(copy.pk, search.search(text.title))
+
+        # the copy exports the same tree, under its new ids
+        def strip_ids(value):
+            if isinstance(value, dict):
+                return {key: strip_ids(item) for key, item in value.items()
+                        if key != 'id'}
+            if isinstance(value, list):
+                return [strip_ids(item) for item in value]
+            return value
+        exported = self.export(queryset=Course.objects.filter(
+            pk__in=[original.pk, copy.pk]))
+        first, second = (strip_ids(json.loads(line)) for line in exported)
+        self.assertEqual(first, second)
+
+    def test_rows_saved_between_batches_keep_their_ids(self):
+        lines = self.export()
+        importer = transfer.CourseImporter(batch_size=2)
+        import_batch = importer.import_batch
+        teacher = User.objects.first()
+
+        def save_course_then_import(batch):
+            # a course saved by the site while the import runs
+            Course.objects.create(title="Live", description="",
+                                  teacher=teacher)
+            import_batch(batch)
+        importer.import_batch = save_course_then_import
+        counts = importer.import_lines(lines)
+        self.assertEqual(counts['courses'], 5)
+        self.assertEqual(Course.objects.filter(title="Live").count(), 3)
+        self.assertEqual(Course.objects.count(), 5 + 5 + 3)
+
+    def test_commands(self):
+        out = StringIO()
+        with mock.patch('sys.stdout', out):
+            call_command('export_courses', stderr=StringIO())
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl') as export:
+            export.write(out.getvalue())
+            export.flush()
+            output = StringIO()
+            call_command('import_courses', export.name, stdout=output)
+        self.assertIn('5 courses', output.getvalue())
+        self.assertEqual(Course.objects.count(), 10)
+
+
+class QuestionFormTests(TestCase):
+    def setUp(self):
+        self.teacher = User.objects.create_user('teacher')
+        self.client.force_login(self.teacher)
+        course = Course.objects.create(title="Edited", description="",
+                                       teacher=self.teacher, published=True)
+        self.quiz = Quiz.objects.create(title="Quiz", description="",
+                                        course=course)
+
+    def answer_data(self, answers, extra=()):
+        data = {
+            'form-TOTAL_FORMS': len(answers) + len(extra),
+            'form-INITIAL_FORMS': len(answers),
+            'form-MIN_NUM_FORMS': 0,
+            'form-MAX_NUM_FORMS': 1000,
+        }
+        for number, answer in enumerate(list(answers) + list(extra)):
+            prefix = 'form-{}-'.format(number)
+            data[prefix + 'id'] = answer.get('id', '')
+            data[prefix + 'order'] = answer['order']
+            data[prefix + 'text'] = answer['text']
+            if answer.get('correct'):
+                data[prefix + 'correct'] = 'on'
+            if answer.get('delete'):
+                data[prefix + 'DELETE'] = 'on'
+        return data
+
+    def test_create_question_saves_its_answers(self):
+        data = self.answer_data([], [{'order': 0, 'text': 'True', 'correct': True},
+                                     {'order': 1, 'text': 'False'}])
+        data.update({'order': 0, 'prompt': 'Is this saved?'})
+        resp = self.client.post(reverse('courses:create_question', kwargs={
+            'quiz_pk': self.quiz.pk, 'question_type': 'tf'}), data)
+        self.assertRedirects(resp, self.quiz.get_absolute_url())
+        question = TrueFalseQuestion.objects.get(prompt='Is this saved?')
+        self.assertEqual(
+            list(question.answer_set.values_list('text', 'correct')),
+            [('True', True), ('False', False)])
+
+    def edit(self, size):
+        question = MultipleChoiceQuestion.objects.create(
+            quiz=self.quiz, prompt="Pick {}".format(size))
+        answers = [Answer.objects.create(question=question, order=number,
+                                         text=str(number))
+                   for number in range(size)]
+        rows = [{'id': answer.pk, 'order': answer.order, 'text': answer.text}
+                for answer in answers]
+        # reversed order, one renamed, one deleted and one new answer
+        for row in rows:
+            row['order'] = size - row['order']
+        rows[0]['text'] = 'Renamed'
+        rows[1]['delete'] = True
+        data = self.answer_data(rows, [{'order': 0, 'text': 'New'}])
+        data.update({'order': 0, 'prompt': question.prompt})
+        url = reverse('courses:edit_question', kwargs={
+            'quiz_pk': self.quiz.pk, 'question_pk': question.pk})
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.post(url, data)
+        self.assertRedirects(resp, self.quiz.get_absolute_url(),
+                             fetch_redirect_response=False)
+        return question, len(queries)
+
+    def test_edit_question_costs_constant_queries(self):
+        question, small = self.edit(3)
+        _, large = self.edit(10)
+        self.assertEqual(small, large)
+        self.assertEqual(
+            list(question.answer_set.values_list('text', flat=True)),
+            ['New', '2', 'Renamed'])
+
+    def test_deleted_answers_take_their_statistics(self):
+        question = MultipleChoiceQuestion.objects.create(
+            quiz=self.quiz, prompt="Pick one")
+        kept, deleted = [Answer.objects.create(question=question, order=number,
+                                               text=str(number))
+                         for number in range(2)]
+        for answer in (kept, deleted):
+            AnswerStats.objects.create(answer=answer, times_chosen=1)
+        data = self.answer_data([
+            {'id': kept.pk, 'order': 0, 'text': '0'},
+            {'id': deleted.pk, 'order': 1, 'text': '1', 'delete': True}])
+        data.update({'order': 0, 'prompt': question.prompt})
+        self.client.post(reverse('courses:edit_question', kwargs={
+            'quiz_pk': self.quiz.pk, 'question_pk': question.pk}), data)
+        self.assertEqual(list(question.answer_set.all()), [kept])
+        self.assertEqual(list(AnswerStats.objects.values_list(
+            'answer_id', flat=True)), [kept.pk])
+
+    def test_edited_answers_refresh_the_answer_key(self):
+        question, _ = self.edit(3)
+        key = grading.get_answer_key(self.quiz.pk)
+        self.assertEqual(key.questions[0].answer_ids, frozenset(
+            question.answer_set.values_list('pk', flat=True)))
+
+
+class OrderingTests(TestCase):
+    def test_moving_one_item_changes_one_value(self):
+        current = ordering.spaced(5)
+        moved = [current[0], current[3], current[1], current[2], current[4]]
+        orders = ordering.new_orders(moved)
+        self.assertEqual(orders, sorted(orders))
+        self.assertEqual(sum(1 for old, new in zip(moved, orders) if old != new), 1)
+
+    def test_items_without_gaps_are_spaced_out(self):
+        self.assertEqual(ordering.new_orders([0, 0, 0]), [-2048, -1024, 0])
+        self.assertEqual(ordering.new_orders([0, 2, 1, 3]),
+                         ordering.spaced(4))
+
+    def test_moving_to_the_ends(self):
+        self.assertEqual(ordering.new_orders([3072, 1024, 2048]),
+                         [0, 1024, 2048])
+        self.assertEqual(ordering.new_orders([2048, 3072, 1024]),
+                         [2048, 3072, 4096])
+
+
+class ReorderViewTests(TestCase):
+    def setUp(self):
+        self.teacher = User.objects.create_user('teacher')
+        self.client.force_login(self.teacher)
+        self.course = Course.objects.create(title="Ordered", description="",
+                                            teacher=self.teacher, published=True)
+        self.texts = [Text.objects.create(course=self.course, title=str(number),
+                                          description="", order=number * 1024)
+                      for number in range(3)]
+        self.quiz = Quiz.objects.create(course=self.course, title="Quiz",
+                                        description="", order=3 * 1024)
+        self.questions = [TrueFalseQuestion.objects.create(
+            quiz=self.quiz, prompt=str(number), order=number)
+            for number in range(4)]
+
+    def post(self, name, pk, data):
+        url = reverse('courses:' + name, kwargs={
+            'course_pk' if name == 'reorder_steps' else 'quiz_pk': pk})
+        return self.client.post(url, json.dumps(data),
+                                content_type='application/json')
+
+    def test_reorder_steps(self):
+        first, second, third = ('t{}'.format(text.pk) for text in self.texts)
+        quiz = 'q{}'.format(self.quiz.pk)
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.post('reorder_steps', self.course.pk,
+                             {'steps': [quiz, first, second, third]})
+        self.assertEqual(resp.json()['updated'], 1)
+        updates = [query['sql'] for query in queries
+                   if query['sql'].startswith('UPDATE "courses_quiz"')]
+        self.assertEqual(len(updates), 1)
+        steps = self.client.get(reverse('courses:detail', kwargs={
+            'pk': self.course.pk})).context['steps']
+        self.assertEqual([step.title for step in steps], ['Quiz', '0', '1', '2'])
+
+    def test_reorder_questions(self):
+        pks = [question.pk for question in self.questions]
+        resp = self.post('reorder_questions', self.quiz.pk,
+                         {'questions': pks[::-1]})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(
+            list(self.quiz.question_set.values_list('pk', flat=True)),
+            pks[::-1])
+        self.assertEqual(
+            [question.question_id
+             for question in grading.get_answer_key(self.quiz.pk).questions],
+            pks[::-1])
+
+    def test_ordering_must_list_every_item_once(self):
+        pks = [question.pk for question in self.questions]
+        for data in ({'questions': pks[1:]}, {'questions': pks + pks[:1]},
+                     {'questions': 'nope'}, {}):
+            resp = self.post('reorder_questions', self.quiz.pk, data)
+            self.assertEqual(resp.status_code, 400)
+
+
+class ApiTests(TestCase):
+    def setUp(self):
+        self.teacher = User.objects.create_user('teacher')
+        self.courses = [Course.objects.create(
+            title="Course {}".format(number), description="About *it*",
+            teacher=self.teacher, published=True) for number in range(3)]
+        self.hidden = Course.objects.create(title="Draft", description="",
+                                            teacher=self.teacher)
+        course = self.courses[0]
+        self.text = Text.objects.create(course=course, title="Read",
+                                        description="", order=1)
+        self.quiz = Quiz.objects.create(course=course, title="Quiz",
+                                        description="", order=2)
+        self.question = MultipleChoiceQuestion.objects.create(
+            quiz=self.quiz, prompt="Which?", shuffle_answers=True)
+        TrueFalseQuestion.objects.create(quiz=self.quiz, prompt="True?", order=1)
+        for number in range(3):
+            Answer.objects.create(question=self.question, text=str(number),
+                                  order=number, correct=number == 0)
+
+    def get(self, name, params=None, **kwargs):
+        return self.client.get(reverse('api_v1:' + name, kwargs=kwargs), params)
+
+    def test_course_list_pages_and_hides_drafts(self):
+        resp = self.get('courses', {'per_page': 2, 'fields': 'title'})
+        body = resp.json()
+        self.assertEqual(body['data'], [
+            {'id': course.pk, 'title': course.title}
+            for course in self.courses[:0:-1]])
+        resp = self.get('courses', {'per_page': 2, 'fields': 'title',
+                                    'cursor': body['next_cursor']})
+        self.assertEqual([row['id'] for row in resp.json()['data']],
+                         [self.courses[0].pk])
+        self.assertIsNone(resp.json()['next_cursor'])
+        self.assertEqual(self.get('course', pk=self.hidden.pk).status_code, 404)
+
+    def test_embedding_reads_one_query_per_level(self):
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.get('courses', {'embed': 'steps,quizzes.questions.answers',
+                                        'fields[answers]': 'text'})
+        self.assertEqual(len(queries), 5)
+        course = resp.json()['data'][-1]
+        self.assertEqual([(step['kind'], step['title']) for step in course['steps']],
+                         [('t', 'Read'), ('q', 'Quiz')])
+        self.assertEqual(course['steps'][1]['question_count'], 2)
+        question = course['quizzes'][0]['questions'][0]
+        self.assertEqual((question['kind'], question['shuffle_answers']), ('mc', True))
+        self.assertEqual(course['quizzes'][0]['questions'][1]['kind'], 'tf')
+        # never whether an answer is correct
+        self.assertEqual(question['answers'][0], {
+            'id': self.question.answer_set.get(order=0).pk, 'text': '0'})
+
+    def test_batch(self):
+        ids = [self.courses[2].pk, self.hidden.pk, self.courses[0].pk, 999]
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.get('course_batch', {
+                'ids': ','.join(map(str, ids)), 'fields': 'title',
+                'embed': 'steps'})
+        self.assertEqual(len(queries), 2)
+        body = resp.json()
+        self.assertEqual([row['id'] for row in body['data']], ids[::2])
+        self.assertEqual(body['missing'], [self.hidden.pk, 999])
+        self.assertEqual(len(body['data'][1]['steps']), 2)
+
+    def test_details_and_steps(self):
+        resp = self.get('quiz', {'embed': 'questions'}, pk=self.quiz.pk)
+        self.assertEqual(len(resp.json()['data']['questions']), 2)
+        resp = self.get('question', {'embed': 'answers'}, pk=self.question.pk)
+        self.assertEqual(len(resp.json()['data']['answers']), 3)
+        resp = self.get('course_steps', {'per_page': 1, 'fields': 'kind'},
+                        pk=self.courses[0].pk)
+        self.assertEqual(resp.json()['data'], [{'id': self.text.pk, 'kind': 't'}])
+        resp = self.get('course_steps', {'cursor': resp.json()['next_cursor']},
+                        pk=self.courses[0].pk)
+        self.assertEqual(resp.json()['data'][0]['title'], 'Quiz')
+
+    def test_bad_requests(self):
+        for name, params in (('courses', {'fields': 'password'}),
+                             ('courses', {'embed': 'answers'}),
+                             ('courses', {'per_page': 1000}),
+                             ('course_batch', {'ids': 'a,b'}),
+                             ('course_batch', {})):
+            resp = self.get(name, params)
+            self.assertEqual(resp.status_code, 400, params)
+            self.assertIn('error', resp.json())
+        self.assertEqual(self.get('courses', {'cursor': '!'}).status_code, 404)
+        self.assertEqual(self.client.post(reverse('api_v1:courses')).status_code, 405)
+
+
+class ChangeLogTests(TestCase):
+    def setUp(self):
+        self.teacher = User.objects.create_user('teacher')
+        self.course = Course.objects.create(title="Synced", description="",
+                                            teacher=self.teacher, published=True)
+        self.quiz = Quiz.objects.create(course=self.course, title="Quiz",
+                                        description="")
+        self.question = TrueFalseQuestion.objects.create(quiz=self.quiz,
+                                                         prompt="True?")
+        self.answer = Answer.objects.create(question=self.question, text="Yes",
+                                            correct=True)
+        self.cursor = self.sync()[-1]['cursor']
+
+    def sync(self, cursor=None, **params):
+        if cursor:
+            params['cursor'] = cursor
+        resp = self.client.get(reverse('api_v1:changes'), params)
+        self.assertEqual(resp['Content-Type'], 'application/x-ndjson')
+        return [json.loads(line) for line
+                in b''.join(resp.streaming_content).decode().splitlines()]
+
+    def changed(self, lines):
+        return [(line['op'], line['type'], line['id']) for line in lines[:-1]]
+
+    def test_signals_log_saves_and_deletes(self):
+        self.answer.text = "Yep"
+        self.answer.save()
+        self.answer.save()
+        lines = self.sync(self.cursor)
+        # each row once, with the answer's quiz and course touched too
+        self.assertEqual(sorted(self.changed(lines)), sorted([
+            ('upsert', 'answers', self.answer.pk),
+            ('upsert', 'quizzes', self.quiz.pk),
+            ('upsert', 'courses', self.course.pk)]))
+        answer = next(line for line in lines if line['type'] == 'answers')
+        self.assertEqual(answer['data']['text'], "Yep")
+        self.assertEqual(lines[-1]['more'], False)
+
+        question_pk, answer_pk = self.question.pk, self.answer.pk
+        self.question.delete()
+        lines = self.sync(lines[-1]['cursor'])
+        self.assertIn(('delete', 'questions', question_pk), self.changed(lines))
+        self.assertIn(('delete', 'answers', answer_pk), self.changed(lines))
+
+    def test_bulk_actions_log_whole_courses(self):
+        make_in_review(None, None, Course.objects.filter(pk=self.course.pk))
+        lines = self.sync(self.cursor)
+        self.assertEqual(self.changed(lines), [
+            ('delete', 'courses', self.course.pk),
+            ('delete', 'quizzes', self.quiz.pk),
+            ('delete', 'questions', self.question.pk),
+            ('delete', 'answers', self.answer.pk)])
+        make_published(None, None, Course.objects.filter(pk=self.course.pk))
+        lines = self.sync(lines[-1]['cursor'], **{'fields[courses]': 'title'})
+        self.assertEqual([line['op'] for line in lines[:-1]], ['upsert'] * 4)
+        self.assertEqual(lines[0]['data'], {'id': self.course.pk, 'title': "Synced"})
+
+    def test_reordering_logs_the_moved_rows(self):
+        other = TrueFalseQuestion.objects.create(quiz=self.quiz, prompt="No?",
+                                                 order=1)
+        cursor = self.sync(self.cursor)[-1]['cursor']
+        self.client.force_login(self.teacher)
+        self.client.post(reverse('courses:reorder_questions',
+                                 kwargs={'quiz_pk': self.quiz.pk}),
+                         json.dumps({'questions': [other.pk, self.question.pk]}),
+                         content_type='application/json')
+        self.assertIn(('upsert', 'questions', other.pk),
+                      self.changed(self.sync(cursor)))
+
+    def test_limit_and_cursor(self):
+        changes.log_changes(changes.ANSWERS, [self.answer.pk] * 3)
+        lines = self.sync(self.cursor, limit=2)
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[-1]['more'])
+        lines = self.sync(lines[-1]['cursor'], limit=2)
+        self.assertFalse(lines[-1]['more'])
+        self.assertEqual(self.sync(lines[-1]['cursor']), [
+            {'cursor': lines[-1]['cursor'], 'more': False}])
+
+    def test_bad_requests(self):
+        for params in ({'limit': 0}, {'cursor': 'nope'},
+                       {'fields[answers]': 'correct'}):
+            resp = self.client.get(reverse('api_v1:changes'), params)
+            self.assertEqual(resp.status_code, 400, params)
+
+
+class StaticExportTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        teacher = User.objects.create_user('teacher')
+        self.course = Course.objects.create(title="Static", description="",
+                                            teacher=teacher, published=True)
+        self.text = Text.objects.create(course=self.course, title="Read me",
+                                        description="", content="Some *text*")
+        self.quiz = Quiz.objects.create(course=self.course, title="Quiz",
+                                        description="", order=1)
+        question = TrueFalseQuestion.objects.create(quiz=self.quiz, prompt="True?")
+        self.answer = Answer.objects.create(question=question, text="Yes",
+                                            correct=True)
+        Course.objects.create(title="Draft", description="", teacher=teacher)
+
+    def page(self, url):
+        path = static_export.page_path(self.directory, url)
+        with open(path, encoding='utf-8') as page:
+            return page.read()
+
+    def test_export_and_rebuild_incrementally(self):
+        counts = static_export.export_site(self.directory)
+        self.assertEqual((counts['rendered'], counts['pages']), (1, 4))
+        self.assertIn('Static', self.page(reverse('courses:list')))
+        self.assertNotIn('Draft', self.page(reverse('courses:list')))
+        self.assertIn('<em>text</em>', self.page(self.text.get_absolute_url()))
+
+        counts = static_export.export_site(self.directory)
+        self.assertEqual((counts['rendered'], counts['unchanged']), (0, 1))
+
+        self.text.content = "Other *words*"
+        self.text.save()
+        quiz_page = static_export.page_path(self.directory,
+                                            self.quiz.get_absolute_url())
+        self.quiz.delete()
+        counts = static_export.export_site(self.directory)
+        self.assertEqual(counts['rendered'], 1)
+        self.assertIn('<em>words</em>', self.page(self.text.get_absolute_url()))
+        self.assertFalse(os.path.exists(os.path.dirname(quiz_page)))
+
+        make_in_review(None, None, Course.objects.filter(pk=self.course.pk))
+        counts = static_export.export_site(self.directory)
+        self.assertEqual(counts['removed'], 1)
+        self.assertFalse(os.path.exists(static_export.page_path(
+            self.directory, reverse('courses:detail', kwargs={'pk': self.course.pk}))))
+        self.assertNotIn('Static', self.page(reverse('courses:list')))
+
+    @override_settings(STATIC_EXPORT_SITE_URL='https://courses.example.com/')
+    def test_static_quiz_pages_post_to_the_site(self):
+        static_export.export_site(self.directory)
+        page = self.page(self.quiz.get_absolute_url())
+        self.assertNotIn('csrfmiddlewaretoken', page)
+        self.assertIn('action="https://courses.example.com{}"'.format(
+            reverse('courses:quiz_submit', kwargs={
+                'course_pk': self.course.pk, 'step_pk': self.quiz.pk})), page)
+        # the site's own pages keep posting to their own host
+        resp = self.client.get(self.quiz.get_absolute_url())
+        self.assertNotContains(resp, 'https://courses.example.com')
+
+    @override_settings(STATIC_EXPORT_ORIGINS=['https://static.example.com'])
+    def test_static_quiz_pages_submit_without_csrf_token(self):
+        client = Client(enforce_csrf_checks=True)
+        url = reverse('courses:quiz_submit', kwargs={
+            'course_pk': self.course.pk, 'step_pk': self.quiz.pk})
+        data = {'question-{}'.format(self.answer.question_id): self.answer.pk}
+
+        def post(**headers):
+            return client.post(url, data, **headers).status_code
+
+        self.assertEqual(post(HTTP_ORIGIN='https://static.example.com'), 200)
+        self.assertEqual(
+            post(HTTP_REFERER='https://static.example.com/courses/'), 200)
+        # an export served from the site itself
+        self.assertEqual(post(HTTP_ORIGIN='http://testserver'), 200)
+        # any other site, or none at all, needs a token
+        self.assertEqual(post(HTTP_ORIGIN='https://evil.example.com'), 403)
+        self.assertEqual(post(HTTP_ORIGIN='null'), 403)
+        self.assertEqual(post(), 403)
+        # and so do signed in users
+        client.force_login(self.course.teacher)
+        self.assertEqual(post(HTTP_ORIGIN='https://static.example.com'), 403)
@@ -0,0 +1,233 @@
+import itertools
+import json
+import multiprocessing
+
+from django.contrib.auth.models import User
+from django.db import connections, transaction
+from django.db.models import Case, DateTimeField, F, Value, When
+from django.utils.dateparse import parse_datetime
+
+from . import bulk, models
+
+
+# Course trees are moved as JSON Lines, one course with all of its steps,
+# questions and answers per line, so both sides only ever hold a batch of
+# courses in memory. The ids in a file are the exporting database's; the
+# importer gives every row a new one.
+
+COURSE_FIELDS = ('id', 'title', 'description', 'subject', 'published',
+                 'status', 'created_at')
+STEP_FIELDS = ('id', 'course_id', 'title', 'description', 'order')
+TEXT_FIELDS = STEP_FIELDS + ('content',)
+QUIZ_FIELDS = STEP_FIELDS + ('total_questions',)
+QUESTION_FIELDS = ('id', 'quiz_id', 'prompt', 'order')
+ANSWER_FIELDS = ('id', 'question_id', 'text', 'order', 'correct')
+
+
+def course_ranges(queryset, batch_size):
+    '''Splits queryset into (first pk, last pk) ranges of batch_size courses'''
+    pks = queryset.order_by('pk').values_list('pk', flat=True).iterator()
+    while True:
+        batch = list(itertools.islice(pks, batch_size))
+        if not batch:
+            return
+        yield batch[0], batch[-1]
+
+
+def group(rows, key):
+    grouped = {}
+    for row in rows:
+        grouped.setdefault(row.pop(key), []).append(row)
+    return grouped
+
+
+def export_range(queryset, first_pk, last_pk):
+    '''Serializes the courses of queryset with pks in [first_pk, last_pk].
+
+    Returns one line per course, read with five queries whatever the number
+    of courses in the range.
+    '''
+    courses = list(queryset.filter(
+        pk__gte=first_pk, pk__lte=last_pk
+    ).order_by('pk').values(
+        *COURSE_FIELDS, teacher_username=F('teacher__username')))
+    if not courses:
+        return ''
+    course_ids = [course['id'] for course in courses]
+
+    texts = group(models.Text.objects.filter(
+        course_id__in=course_ids
+    ).order_by('order', 'pk').values(*TEXT_FIELDS), 'course_id')
+    quizzes = list(models.Quiz.objects.filter(
+        course_id__in=course_ids
+    ).order_by('order', 'pk').values(*QUIZ_FIELDS))
+    quiz_ids = [quiz['id'] for quiz in quizzes]
+    questions = list(models.Question.objects.filter(
+        quiz_id__in=quiz_ids
+    ).order_by('order', 'pk').values(
+        *QUESTION_FIELDS,
+        shuffle_answers=F('multiplechoicequestion__shuffle_answers'),
+        true_false=F('truefalsequestion')))
+    answers = group(models.Answer.objects.filter(
+        question__quiz_id__in=quiz_ids
+    ).order_by('order', 'pk').values(*ANSWER_FIELDS), 'question_id')
+
+    for question in questions:
+        question['kind'] = 'tf' if question.pop('true_false') else 'mc'
+        if question['kind'] == 'tf':
+            del question['shuffle_answers']
+        question['answers'] = answers.get(question['id'], [])
+    questions = group(questions, 'quiz_id')
+    for quiz in quizzes:
+        quiz['questions'] = questions.get(quiz['id'], [])
+    quizzes = group(quizzes, 'course_id')
+
+    lines = []
+    for course in courses:
+        course['created_at'] = course['created_at'].isoformat()
+        course['texts'] = texts.get(course['id'], [])
+        course['quizzes'] = quizzes.get(course['id'], [])
+        lines.append(json.dumps(course, sort_keys=True) + '\n')
+    return ''.join(lines)
+
+
+def export_task(arguments):
+    return export_range(*arguments)
+
+
+def close_connections():
+    # forked workers must not share the parent's database connections
+    connections.close_all()
+
+
+def export_courses(out, queryset=None, batch_size=100, workers=1,
+                   published_only=False):
+    '''Writes courses to the file object out, returns how many.
+
+    With several workers the batches are serialized in a process pool and
+    still written in pk order.
+    '''
+    if queryset is None:
+        queryset = models.Course.objects.all()
+    if published_only:
+        queryset = queryset.filter(published=True)
+    # querysets pickle without their results, so the workers get them too
+    tasks = ((queryset, first, last)
+             for first, last in course_ranges(queryset, batch_size))
+    if workers > 1:
+        tasks = list(tasks)
+        close_connections()
+        with multiprocessing.Pool(workers, initializer=close_connections) as pool:
+            chunks = pool.imap(export_task, tasks)
+            return write_chunks(out, chunks)
+    return write_chunks(out, map(export_task, tasks))
+
+
+def write_chunks(out, chunks):
+    count = 0
+    for chunk in chunks:
+        out.write(chunk)
+        count += chunk.count('\n')
+    return count
+
+
+class CourseImporter:
+    '''Reads exported course trees and writes them with bulk.TreeWriter.
+
+    Courses are written batch_size at a time, one transaction per batch,
+    under new primary keys counted up from bulk.next_id(). Like the
+    catalog generator, it fills in the rendered HTML and step counts the
+    signals would have. Teachers are matched by username and created when
+    missing.
+    '''
+
+    def __init__(self, batch_size=100):
+        self.batch_size = batch_size
+        self.teachers = {}
+        self.writer = bulk.TreeWriter()
+
+    def import_lines(self, lines):
+        trees = (json.loads(line) for line in lines if line.strip())
+        while True:
+            batch = list(itertools.islice(trees, self.batch_size))
+            if not batch:
+                break
+            with transaction.atomic():
+                self.import_batch(batch)
+        return self.writer.finish()
+
+    def teacher_id(self, username):
+        if username not in self.teachers:
+            teacher, _ = User.objects.get_or_create(username=username)
+            self.teachers[username] = teacher.pk
+        return self.teachers[username]
+
+    def import_batch(self, batch):
+        writer = self.writer
+        writer.start_batch()
+        created_at = {}
+        for tree in batch:
+            course = models.Course(
+                id=writer.new_id(models.Course),
+                title=tree['title'],
+                description=tree['description'],
+                teacher_id=self.teacher_id(tree['teacher_username']),
+                subject=tree.get('subject', ''),
+                published=tree.get('published', False),
+                status=tree.get('status', 'i'),
+                text_count=len(tree['texts']),
+                quiz_count=len(tree['quizzes']),
+                total_steps=len(tree['texts']) + len(tree['quizzes']),
+            )
+            course.render_html()
+            writer.courses.append(course)
+            if tree.get('created_at'):
+                created_at[course.id] = parse_datetime(tree['created_at'])
+            for row in tree['texts']:
+                text = models.Text(
+                    id=writer.new_id(models.Text), course=course,
+                    title=row['title'], description=row['description'],
+                    order=row['order'], content=row.get('content', ''))
+                text.render_html()
+                writer.texts.append(text)
+            for row in tree['quizzes']:
+                quiz = models.Quiz(
+                    id=writer.new_id(models.Quiz), course=course,
+                    title=row['title'], description=row['description'],
+                    order=row['order'],
+                    total_questions=row.get('total_questions', 4))
+                quiz.render_html()
+                writer.quizzes.append(quiz)
+                for question_row in row['questions']:
+                    question = models.Question(
+                        id=writer.new_id(models.Question), quiz=quiz,
+                        prompt=question_row['prompt'],
+                        order=question_row['order'])
+                    writer.questions.append(question)
+                    if question_row['kind'] == 'tf':
+                        writer.true_false.append({'question_ptr_id': question.id})
+                    else:
+                        writer.multiple_choice.append({
+                            'question_ptr_id': question.id,
+                            'shuffle_answers': bool(
+                                question_row.get('shuffle_answers')),
+                        })
+                    for answer_row in question_row['answers']:
+                        writer.answers.append(models.Answer(
+                            id=writer.new_id(models.Answer), question=question,
+                            text=answer_row['text'], order=answer_row['order'],
+                            correct=answer_row['correct']))
+        writer.write_batch()
+        self.restore_created_at(created_at)
+
+    def restore_created_at(self, created_at):
+        # auto_now_add overwrote the exported dates, put them back with one
+        # UPDATE per chunk (staying under SQLite's limit of 999 parameters)
+        items = list(created_at.items())
+        for start in range(0, len(items), 300):
+            chunk = items[start:start + 300]
+            models.Course.objects.filter(pk__in=[pk for pk, _ in chunk]).update(
+                created_at=Case(
+                    *[When(pk=pk, then=Value(value, output_field=DateTimeField()))
+                      for pk, value in chunk],
+                    output_field=DateTimeField()))
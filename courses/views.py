@@ -1,36 +1,125 @@
-from itertools import chain
+import json
+from urllib.parse import urlparse
 
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.core.cache import cache
 from django.utils.decorators import method_decorator
-from django.db.models import Q, Count, Sum
-from django.http import HttpResponseRedirect, Http404
+from django.utils.functional import SimpleLazyObject
+from django.db import transaction
+from django.db.models import Sum
+from django.http import HttpResponseRedirect, Http404, JsonResponse
 from django.shortcuts import get_object_or_404, render
+from django.utils import timezone
+from django.middleware.csrf import CsrfViewMiddleware
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition, require_POST
 from django.views.generic import(View, ListView, DetailView,
                                  CreateView, UpdateView, DeleteView
                                  )
 
+from learning_site.routers import read_from_primary
 
+from . import attempts
+from . import caching
+from . import changes
+from . import counters
 from . import forms
+from . import grading
 from . import mixins
 from . import models
+from . import ordering
+from . import pagination
+from . import search
+from . import steps
+
+
+def conditional_page(last_modified_func):
+    '''Answers conditional GETs for a page from its last modification time.
+
+    last_modified_func should be a single cheap query; it runs once per
+    request and the view itself only runs when the client's copy is stale.
+    Signed in users see edit buttons, so they get their own ETag. Every
+    page shows the navigation menu, so its version counts as well.
+    '''
+    def page_modified(request, *args, **kwargs):
+        if not hasattr(request, '_page_modified'):
+            modified = last_modified_func(request, *args, **kwargs)
+            nav_modified = caching.version_time('nav')
+            if modified is not None and nav_modified is not None:
+                modified = max(modified, nav_modified)
+            request._page_modified = modified
+        return request._page_modified
+
+    def etag(request, *args, **kwargs):
+        modified = page_modified(request, *args, **kwargs)
+        if modified is None:
+            return None
+        return '{}-{}-{}'.format(modified.timestamp(), request.user.pk or 0,
+                                 caching.get_version('nav'))
+
+    def last_modified(request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return None
+        return page_modified(request, *args, **kwargs)
+
+    return method_decorator(condition(etag_func=etag,
+                                      last_modified_func=last_modified),
+                            name='dispatch')
+
+
+def course_modified(request, pk):
+    return models.Course.objects.filter(
+        pk=pk,
+        published=True
+    ).values_list('updated_at', flat=True).first()
+
+
+def step_modified(model):
+    def modified(request, course_pk, step_pk):
+        times = model.objects.filter(
+            pk=step_pk,
+            course_id=course_pk,
+            course__published=True
+        ).values_list('updated_at', 'course__updated_at').first()
+        return max(times) if times else None
+    return modified
 
 
-class CourseListView(mixins.PageTitleMixin, ListView):
+class CourseCatalogMixin(mixins.PageTitleMixin, mixins.KeysetPaginationMixin,
+                         mixins.StreamingListMixin):
+    model = models.Course
     context_object_name = "courses"
+    template_name = 'courses/course_list.html'
+    row_template_name = 'courses/course_card.html'
+    row_context_object_name = 'course'
+    total_key = 'published'
+
+    def get_total(self):
+        '''Total steps of every listed course, cached until the catalog changes'''
+        key = caching.versioned_key('catalog', 'total_steps', self.total_key)
+        return cache.get_or_set(key, self.count_total_steps, None)
+
+    def count_total_steps(self):
+        # cached under the catalog version, which a lagging replica's rows
+        # may not have caught up with yet
+        with read_from_primary():
+            return self.get_queryset().aggregate(total=Sum('total_steps'))['total'] or 0
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["total"] = {'total': self.get_total()}
+        return context
+
+
+class CourseListView(CourseCatalogMixin, ListView):
     queryset = models.Course.objects.filter(
         published=True
-    ).annotate(
-        total_steps=Count('text', distinct=True)+Count('quiz', distinct=True)
     )
     page_title = "Current Courses"
 
-    def get_context_data(self, *, object_list=None, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context["total"] = self.queryset.aggregate(total=Sum('total_steps'))
-        return context
-
 
 class CourseCreate(LoginRequiredMixin, mixins.PageTitleMixin, CreateView):
     fields = ("title", "description", "teacher", "subject", "status")
@@ -38,40 +127,46 @@ class CourseCreate(LoginRequiredMixin, mixins.PageTitleMixin, CreateView):
     page_title = "Create a new course"  # This page title can be set as static
 
 
+@conditional_page(course_modified)
 class CourseDetail(DetailView):
-    model = models.Course
     template_name = 'courses/course_detail.html'
+    queryset = models.Course.objects.filter(published=True)
+
+    steps_per_page = 50
+    steps_cursor_kwarg = 'steps'
 
     def get_context_data(self, **kwargs):
-        try:
-            course = models.Course.objects.prefetch_related(
-                'quiz_set',
-                'text_set',
-                'quiz_set__question_set'
-            ).get(
-                pk=self.kwargs.get('pk'),
-                published=True)
-        except models.Course.DoesNotExist:
-            raise Http404
-        else:
-            steps = sorted(chain(
-                course.text_set.all(),
-                course.quiz_set.all()
-            ), key=lambda step:step.order)
-        return {'course': course, 'steps': steps}
+        context = super().get_context_data(**kwargs)
+        # only loaded when the cached fragment has to be rendered again
+        context['steps'] = SimpleLazyObject(self.get_steps)
+        context['steps_cursor'] = self.request.GET.get(self.steps_cursor_kwarg, '')
+        # the static export renders every step on one page
+        context['steps_per_page'] = self.steps_per_page
+        return context
+
+    def get_steps(self):
+        '''A page of texts and quizzes in order, in one query'''
+        return steps.step_page(self.object.pk,
+                               self.request.GET.get(self.steps_cursor_kwarg),
+                               self.steps_per_page)
 
 
+@conditional_page(step_modified(models.Text))
 class TextDetail(DetailView):
     template_name = 'courses/text_detail.html'
     context_object_name = 'step'
 
     def get_object(self, queryset=None):
-        return get_object_or_404(models.Text,
+        # the content is only loaded when the cached fragment is missing
+        return get_object_or_404(models.Text.objects.select_related(
+                                     'course'
+                                 ).defer('content', 'content_html'),
                                  course_id=self.kwargs.get('course_pk'),
                                  pk=self.kwargs.get('step_pk'),
                                  course__published=True)
 
 
+@conditional_page(step_modified(models.Quiz))
 class QuizDetail(DetailView):
     template_name = 'courses/quiz_detail.html'
     context_object_name = 'step'
@@ -80,9 +175,6 @@ class QuizDetail(DetailView):
         try:
             step = models.Quiz.objects.select_related(
                 'course'
-            ).prefetch_related(
-                'question_set',
-                'question_set__answer_set'
             ).get(
                 course_id=self.kwargs.get('course_pk'),
                 pk=self.kwargs.get('step_pk'),
@@ -93,21 +185,93 @@ class QuizDetail(DetailView):
         else:
             return step
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # lazy, so a cached fragment skips these queries entirely
+        context['questions'] = self.object.question_set.select_related(
+            'multiplechoicequestion', 'truefalsequestion'
+        ).prefetch_related('answer_set')
+        return context
 
-class CoursesByTeacherView(mixins.PageTitleMixin, ListView):
-    model = models.Course
-    template_name = 'courses/course_list.html'
 
-    def get_context_data(self, *, object_list=None, **kwargs):
-        context = super().get_context_data(**kwargs)
-        courses = self.model.objects.filter(
+def request_origin(request):
+    '''scheme://host of the page a POST came from, or None'''
+    origin = request.META.get('HTTP_ORIGIN')
+    if origin and origin != 'null':
+        return origin
+    referer = urlparse(request.META.get('HTTP_REFERER', ''))
+    if referer.scheme and referer.netloc:
+        return '{}://{}'.format(referer.scheme, referer.netloc)
+    return None
+
+
+def from_exported_page(request):
+    '''True for anonymous posts from the site itself or an origin in
+    STATIC_EXPORT_ORIGINS.
+
+    Browsers send the Origin (or at least the Referer) of cross-site
+    posts, so another site can't pass for these. Signed in users' attempts
+    are recorded under their name, so theirs always need the token.
+    '''
+    if request.user.is_authenticated:
+        return False
+    origin = request_origin(request)
+    own_origin = '{}://{}'.format(request.scheme, request.get_host())
+    return origin is not None and (
+        origin == own_origin
+        or origin in getattr(settings, 'STATIC_EXPORT_ORIGINS', ()))
+
+
+@csrf_exempt
+@require_POST
+def quiz_submit(request, course_pk, step_pk):
+    '''Grades a submitted quiz against its cached answer key.
+
+    Grading runs no queries while the key is cached. The attempt is saved
+    by attempts.record_attempt in a fixed number of statements, and
+    counted in memory for Quiz.times_taken (see counters.AttemptCounter).
+
+    The quiz pages of the static export (courses.static_export) can't
+    carry a CSRF token, so anonymous readers may post without one from
+    those pages, see from_exported_page. Everyone else needs the token.
+    '''
+    if not from_exported_page(request):
+        rejected = CsrfViewMiddleware().process_view(request, None, (), {})
+        if rejected is not None:
+            return rejected
+    answer_key = grading.get_answer_key(step_pk)
+    if (answer_key is None or answer_key.course_id != course_pk
+            or not answer_key.published):
+        raise Http404
+    result = answer_key.grade(grading.parse_responses(request.POST))
+    attempts.record_attempt(result, request.user)
+    counters.quiz_attempts.record(answer_key.quiz_id)
+    return render(request, 'courses/quiz_result.html', {
+        'answer_key': answer_key,
+        'result': result,
+        'passed': attempts.has_passed(result),
+    })
+
+
+class CoursesByTeacherView(CourseCatalogMixin, ListView):
+
+    def get_queryset(self):
+        return self.model.objects.filter(
             teacher__username=self.kwargs.get('teacher'),
             published=True
-        ).annotate(
-            total_steps=Count('text', distinct=True) + Count('quiz', distinct=True)
         )
-        context["courses"] = courses
-        context["total"] = courses.aggregate(total=Sum('total_steps'))
+
+    @property
+    def total_key(self):
+        return 'teacher:{}'.format(self.kwargs.get('teacher'))
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # teachers see how their quizzes do, read from the precomputed stats
+        if (self.request.user.username == self.kwargs.get('teacher')
+                and not self.is_streaming()):
+            course_ids = [course.pk for course in context['object_list']]
+            context['quiz_stats'] = attempts.teacher_stats(course_ids)
         return context
 
     def get_page_title(self):
@@ -115,24 +279,33 @@ class CoursesByTeacherView(mixins.PageTitleMixin, ListView):
         return page_title
 
 
-class Search(mixins.PageTitleMixin, ListView):
-    model = models.Course
-    template_name = 'courses/course_list.html'
+class Search(CourseCatalogMixin, ListView):
 
+    def get_queryset(self):
+        # already ordered by relevance and bounded by search.RESULTS_LIMIT
+        ranked_ids = search.search(self.request.GET.get('q', ''),
+                                   published_only=True)
+        self.limited = len(ranked_ids) == search.RESULTS_LIMIT
+        # unpublished since the search, a row at most
+        found = self.model.objects.filter(
+            pk__in=ranked_ids,
+            published=True
+        ).in_bulk()
+        return [found[pk] for pk in ranked_ids if pk in found]
 
-    def get_context_data(self, *, object_list=None, **kwargs):
+    def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        term = self.request.GET.get('q')
-        courses = self.model.objects.filter(
-            Q(title__icontains=term)|Q(description__icontains=term),
-            published=True
-        ).annotate(
-            total_steps=Count('text', distinct=True) + Count('quiz', distinct=True)
-        )
-        context["courses"] = courses
-        context["total"] = courses.aggregate(total=Sum('total_steps'))
+        context['results_limit'] = search.RESULTS_LIMIT if self.limited else None
         return context
 
+    def paginate_queryset(self, queryset, page_size):
+        cursor = self.request.GET.get(self.cursor_kwarg)
+        page = pagination.list_page(queryset, cursor, page_size)
+        return None, page, page.object_list, page.has_next()
+
+    def get_total(self):
+        return sum(course.total_steps for course in self.object_list)
+
     def get_page_title(self):
         page_title = 'Courses containing "{}"'.format(self.request.GET.get('q'))
         return page_title
@@ -172,6 +345,47 @@ def quiz_edit(request, course_pk, quiz_pk):
     return render(request, 'courses/quiz_form.html', {'form': form, 'course': quiz.course})
 
 
+def save_answers(question, formset):
+    '''Saves a valid answer formset with at most one INSERT and one
+    UPDATE, whatever the number of answers. Deleted answers go through
+    queryset.delete(), so their statistics and signals are taken care of.
+
+    Reordering answers (courses/js/order.js) only changes their order
+    fields, so it is saved by the single UPDATE.
+    '''
+    new, changed, deleted_ids = [], [], []
+    deleted_forms = formset.deleted_forms if formset.can_delete else []
+    for form in formset.initial_forms:
+        if form in deleted_forms:
+            deleted_ids.append(form.instance.pk)
+        elif form.has_changed():
+            changed.append(form.instance)
+    for form in formset.extra_forms:
+        if form.has_changed() and form not in deleted_forms:
+            new.append(form.instance)
+
+    with transaction.atomic():
+        if deleted_ids:
+            # the cascade to the answers' statistics takes a DELETE of its
+            # own, and Answer's post_delete receivers get the deleted rows
+            models.Answer.objects.filter(question=question,
+                                         pk__in=deleted_ids).delete()
+        for answer in changed + new:
+            answer.question = question
+        if changed:
+            models.Answer.objects.bulk_update(changed,
+                                              ['order', 'text', 'correct'])
+        if new:
+            models.Answer.objects.bulk_create(new)
+        # the bulk queries skip the Answer signals
+        if changed or new:
+            caching.quiz_changed(question.quiz_id)
+            # bulk_create() doesn't return the new pks on SQLite, so log
+            # all the question's answers
+            changes.log_changes(changes.ANSWERS, list(
+                question.answer_set.values_list('pk', flat=True)))
+
+
 @login_required
 def create_question(request, quiz_pk, question_type):
     quiz = get_object_or_404(models.Quiz,
@@ -190,19 +404,16 @@ def create_question(request, quiz_pk, question_type):
         form = form_class(request.POST)
         answer_forms = forms.AnswerInlineFormSet(
             request.POST,
-            queryset=models.Answer.objects.none,
+            queryset=models.Answer.objects.none(),
         )
 
         if form.is_valid() and answer_forms.is_valid():
-            # create and save question
-            question = form.save(commit=False)
-            question.quiz = quiz
-            question.save()
-
-            answers = answer_forms.save(commit=False)
-            for answer in answers:
-                answer.question = question
-                answer.save
+            with transaction.atomic():
+                # create and save question
+                question = form.save(commit=False)
+                question.quiz = quiz
+                question.save()
+                save_answers(question, answer_forms)
             messages.success(request, "Added question")
             return HttpResponseRedirect(quiz.get_absolute_url())
     return render(request, 'courses/question_form.html', {
@@ -235,13 +446,10 @@ def edit_question(request, quiz_pk, question_pk):
         )
 
         if form.is_valid() and answer_forms.is_valid():
-            form.save()
-            answers = answer_forms.save(commit=False)
-            for answer in answers:
-                answer.question = question
-                answer.save()
-            for answer in answer_forms.deleted_objects:
-                answer.delete()
+            with transaction.atomic():
+                if form.has_changed():
+                    form.save()
+                save_answers(question, answer_forms)
             messages.success(request, "Updated question")
             return HttpResponseRedirect(question.quiz.get_absolute_url())
     return render(request, 'courses/question_form.html', {
@@ -260,16 +468,97 @@ def answer_form(request, question_pk):
     if request.method == 'POST':
         formset = forms.AnswerFormSet(request.POST, queryset = question.answer_set.all())
 
-    if formset.is_valid():
-        answers = formset.save(commit=False)
-
-        for answer in answers:
-            answer.question = question
-            answer.save()
-        messages.success(request, "added answers")
-        return HttpResponseRedirect(question.quiz.get_absolute_url())
+        if formset.is_valid():
+            save_answers(question, formset)
+            messages.success(request, "added answers")
+            return HttpResponseRedirect(question.quiz.get_absolute_url())
 
     return render(request, "courses/answer_form.html", {
         'question': question,
         'formset': formset
     })
+
+
+def posted_keys(request, name):
+    '''The list posted as JSON under name, as strings, or None when it's
+    malformed'''
+    try:
+        keys = json.loads(request.body.decode('utf-8'))[name]
+    except (ValueError, KeyError, TypeError):
+        return None
+    if not isinstance(keys, list) or len(set(map(str, keys))) != len(keys):
+        return None
+    return [str(item) for item in keys]
+
+
+def bad_ordering(message):
+    return JsonResponse({'error': message}, status=400)
+
+
+@login_required
+@require_POST
+def reorder_steps(request, course_pk):
+    '''Saves a new order of a course's steps, posted as JSON.
+
+    The body is {"steps": ["t12", "q3", ...]} with every step of the
+    course, texts prefixed with t and quizzes with q like in their URLs.
+    Only steps that didn't keep their place relative to the others get a
+    new order value, see courses.ordering.
+    '''
+    course = get_object_or_404(models.Course, pk=course_pk)
+    keys = posted_keys(request, 'steps')
+    if keys is None:
+        return bad_ordering('Post {"steps": [...]} with every step once')
+    with transaction.atomic():
+        by_key = {}
+        for prefix, queryset in (('t', course.text_set), ('q', course.quiz_set)):
+            for step in queryset.select_for_update().only('id', 'order', 'course_id'):
+                by_key['{}{}'.format(prefix, step.pk)] = step
+        if set(keys) != set(by_key):
+            return bad_ordering('The steps must be exactly the course\'s steps')
+        changed = ordering.reorder([by_key[key] for key in keys])
+        for model in (models.Text, models.Quiz):
+            rows = [step for step in changed if isinstance(step, model)]
+            if rows:
+                model.objects.bulk_update(rows, ['order'])
+                changes.log_changes(changes.KINDS[model],
+                                    [step.pk for step in rows])
+        # bulk_update skips the signals
+        if changed:
+            caching.touch(models.Course, course.pk, timezone.now())
+    return JsonResponse({
+        'steps': [{'id': key, 'order': by_key[key].order} for key in keys],
+        'updated': len(changed),
+    })
+
+
+@login_required
+@require_POST
+def reorder_questions(request, quiz_pk):
+    '''Saves a new order of a quiz's questions, posted as JSON.
+
+    The body is {"questions": [pk, ...]} with every question of the quiz.
+    '''
+    quiz = get_object_or_404(models.Quiz, pk=quiz_pk)
+    keys = posted_keys(request, 'questions')
+    if keys is None:
+        return bad_ordering('Post {"questions": [...]} with every question once')
+    with transaction.atomic():
+        questions = {
+            str(question.pk): question
+            for question in quiz.question_set.select_for_update().only(
+                'id', 'order', 'quiz_id')
+        }
+        if set(keys) != set(questions):
+            return bad_ordering('The questions must be exactly the quiz\'s questions')
+        changed = ordering.reorder([questions[key] for key in keys])
+        if changed:
+            models.Question.objects.bulk_update(changed, ['order'])
+            changes.log_changes(changes.QUESTIONS,
+                                [question.pk for question in changed])
+            caching.quiz_changed(quiz.pk)
+    return JsonResponse({
+        'questions': [{'id': int(key), 'order': questions[key].order}
+                      for key in keys],
+        'updated': len(changed),
+    })
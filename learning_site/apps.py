@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class LearningSiteConfig(AppConfig):
+    name = 'learning_site'
+
+    def ready(self):
+        # connect the database signal handlers
+        from . import db  # noqa: F401
@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+def apply_pragmas(connection, pragmas):
+    # straight on the sqlite3 connection, so they aren't counted as the
+    # queries of whatever request happened to open the connection
+    for name, value in pragmas.items():
+        connection.connection.execute('PRAGMA {} = {}'.format(name, value))
+
+
+@receiver(connection_created)
+def set_sqlite_pragmas(sender, connection, **kwargs):
+    '''Applies SQLITE_PRAGMAS to every new SQLite connection'''
+    if connection.vendor == 'sqlite':
+        apply_pragmas(connection, getattr(settings, 'SQLITE_PRAGMAS', {}))
+
+
+def connection_works(connection):
+    # straight on the driver's connection like the pragmas. Django's own
+    # is_usable() is always True on SQLite.
+    try:
+        cursor = connection.connection.cursor()
+        try:
+            cursor.execute('SELECT 1')
+        finally:
+            cursor.close()
+    except connection.Database.Error:
+        return False
+    return True
+
+
+@receiver(request_started)
+def check_persistent_connections(sender, **kwargs):
+    '''Closes persistent connections that stopped working.
+
+    Django only tests a kept connection after it raised an error, so one
+    that broke while idle fails the next request that uses it. With
+    DATABASE_HEALTH_CHECKS each request runs a SELECT 1 on its connections
+    first, and a dead one is reopened on first use.
+    '''
+    if not getattr(settings, 'DATABASE_HEALTH_CHECKS', False):
+        return
+    for connection in connections.all():
+        if (connection.connection is not None
+                and not connection.in_atomic_block
+                and not connection_works(connection)):
+            connection.close()
@@ -0,0 +1,155 @@
+import json
+import logging
+import os
+import time
+import uuid
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+
+
+logger = logging.getLogger('learning_site.mail_queue')
+
+
+class MailQueue:
+    '''A spool directory of mail waiting to be sent.
+
+    Each message is one JSON file. It's written to tmp/ and renamed into
+    new/, so a reader never sees half a message. A worker claims a
+    message by renaming it into work/, sends it, and deletes it; on
+    failure it goes back to new/ with its next attempt delayed
+    exponentially, or into failed/ after MAIL_QUEUE_MAX_ATTEMPTS.
+    Renames are atomic, so several workers can drain the same queue.
+    '''
+    folders = ('tmp', 'new', 'work', 'failed')
+
+    def __init__(self, directory=None):
+        self.directory = directory or settings.MAIL_QUEUE_DIR
+
+    def path(self, folder, name=''):
+        return os.path.join(self.directory, folder, name)
+
+    def ensure_folders(self):
+        for folder in self.folders:
+            os.makedirs(self.path(folder), exist_ok=True)
+
+    def write(self, folder, name, message):
+        temporary = self.path('tmp', name)
+        with open(temporary, 'w', encoding='utf-8') as spool_file:
+            json.dump(message, spool_file)
+            spool_file.flush()
+            os.fsync(spool_file.fileno())
+        os.replace(temporary, self.path(folder, name))
+
+    def enqueue(self, subject, body, from_email, recipient_list):
+        '''Adds a message to the queue, returns its name'''
+        self.ensure_folders()
+        # names sort in the order messages were queued
+        name = '{:017.6f}-{}.json'.format(time.time(), uuid.uuid4().hex)
+        self.write('new', name, {
+            'subject': subject,
+            'body': body,
+            'from_email': from_email,
+            'to': list(recipient_list),
+            'attempts': 0,
+            'not_before': 0,
+        })
+        return name
+
+    def pending(self):
+        self.ensure_folders()
+        return sorted(os.listdir(self.path('new')))
+
+    def claim(self, name):
+        '''Moves a message to work/ and returns it, None if it's gone'''
+        try:
+            os.rename(self.path('new', name), self.path('work', name))
+        except FileNotFoundError:
+            return None  # another worker claimed it
+        # recover() goes by the time of the claim
+        os.utime(self.path('work', name))
+        with open(self.path('work', name), encoding='utf-8') as spool_file:
+            return json.load(spool_file)
+
+    def claim_batch(self, batch_size, now=None):
+        now = time.time() if now is None else now
+        batch = []
+        for name in self.pending():
+            if len(batch) >= batch_size:
+                break
+            message = self.claim(name)
+            if message is None:
+                continue
+            if message['not_before'] > now:
+                os.rename(self.path('work', name), self.path('new', name))
+                continue
+            batch.append((name, message))
+        return batch
+
+    def retry_delay(self, attempts):
+        base = getattr(settings, 'MAIL_QUEUE_RETRY_DELAY', 60)
+        return min(base * 2 ** (attempts - 1), 6 * 60 * 60)
+
+    def failed(self, name, message, error):
+        message['attempts'] += 1
+        message['last_error'] = str(error)
+        if message['attempts'] >= getattr(settings, 'MAIL_QUEUE_MAX_ATTEMPTS', 8):
+            logger.error('Giving up on %s: %s', name, error)
+            self.write('failed', name, message)
+        else:
+            message['not_before'] = time.time() + self.retry_delay(message['attempts'])
+            self.write('new', name, message)
+        os.remove(self.path('work', name))
+
+    def send_batch(self, batch_size=100, connection=None):
+        '''Sends up to batch_size due messages over one connection.
+
+        Returns (sent, failed) counts.
+        '''
+        batch = self.claim_batch(batch_size)
+        if not batch:
+            return 0, 0
+        connection = connection or get_connection()
+        sent = failed = 0
+        try:
+            connection.open()
+        except Exception as error:
+            for name, message in batch:
+                self.failed(name, message, error)
+            return 0, len(batch)
+        try:
+            for name, message in batch:
+                email = EmailMessage(message['subject'], message['body'],
+                                     message['from_email'], message['to'],
+                                     connection=connection)
+                try:
+                    email.send()
+                except Exception as error:
+                    self.failed(name, message, error)
+                    failed += 1
+                else:
+                    os.remove(self.path('work', name))
+                    sent += 1
+        finally:
+            connection.close()
+        return sent, failed
+
+    def recover(self, older_than=15 * 60):
+        '''Puts back messages left in work/ by a worker that died'''
+        self.ensure_folders()
+        recovered = 0
+        for name in os.listdir(self.path('work')):
+            path = self.path('work', name)
+            try:
+                if time.time() - os.path.getmtime(path) < older_than:
+                    continue
+                os.rename(path, self.path('new', name))
+            except FileNotFoundError:
+                continue
+            recovered += 1
+        return recovered
+
+
+def send_mail_later(subject, message, from_email, recipient_list):
+    '''Queues a message instead of sending it during the request'''
+    return MailQueue().enqueue(subject, message, from_email, recipient_list)
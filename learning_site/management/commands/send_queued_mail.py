@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from learning_site.mail_queue import MailQueue
+
+
+class Command(BaseCommand):
+    help = 'Sends the mail waiting in the queue, in batches over one connection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep polling the queue instead of exiting '
+                                 'once it is empty')
+        parser.add_argument('--interval', type=float, default=5,
+                            help='Seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        queue = MailQueue()
+        recovered = queue.recover()
+        if recovered:
+            self.stdout.write('Put back {} abandoned messages'.format(recovered))
+        total_sent = total_failed = 0
+        while True:
+            sent, failed = queue.send_batch(options['batch_size'])
+            total_sent += sent
+            total_failed += failed
+            if sent or failed:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write('Sent {} messages, {} failed and will be retried '
+                          'or were given up on'.format(total_sent, total_failed))
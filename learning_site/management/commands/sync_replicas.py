@@ -0,0 +1,34 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from learning_site.routers import PRIMARY
+
+
+class Command(BaseCommand):
+    help = ('Copies the primary SQLite database onto the replica files, '
+            'standing in for replication when developing locally')
+
+    def handle(self, *args, **options):
+        primary = settings.DATABASES[PRIMARY]
+        if not settings.REPLICA_DATABASES:
+            raise CommandError('No replicas, set LEARNING_SITE_REPLICAS')
+        for alias in [PRIMARY] + settings.REPLICA_DATABASES:
+            if connections[alias].vendor != 'sqlite':
+                raise CommandError('{} is not SQLite, use the database\'s own '
+                                   'replication'.format(alias))
+        source = sqlite3.connect(primary['NAME'])
+        try:
+            for alias in settings.REPLICA_DATABASES:
+                connections[alias].close()
+                target = sqlite3.connect(settings.DATABASES[alias]['NAME'])
+                try:
+                    # a consistent copy even while the site is writing
+                    source.backup(target)
+                finally:
+                    target.close()
+                self.stdout.write('Copied {} to {}'.format(PRIMARY, alias))
+        finally:
+            source.close()
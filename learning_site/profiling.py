@@ -0,0 +1,153 @@
+import json
+import logging
+import random
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db import connections
+from django.http import JsonResponse
+
+
+logger = logging.getLogger('learning_site.profiling')
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryRecorder:
+    '''Database execute wrapper counting and timing the queries of a request'''
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.time += time.perf_counter() - started
+            self.count += 1
+            self.statements[(sql, repr(params))] += 1
+
+    def duplicates(self):
+        return sum(count - 1 for count in self.statements.values() if count > 1)
+
+
+class ViewStats:
+    '''Rolling window of the latest requests of every view'''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.windows = defaultdict(self.new_window)
+
+    def new_window(self):
+        return deque(maxlen=getattr(settings, 'QUERY_PROFILING_WINDOW', 1000))
+
+    def add(self, view_name, profile):
+        with self.lock:
+            self.windows[view_name].append(profile)
+
+    def clear(self):
+        with self.lock:
+            self.windows.clear()
+
+    def report(self):
+        with self.lock:
+            windows = {name: list(window) for name, window in self.windows.items()}
+        return {name: summarize(profiles) for name, profiles in windows.items()}
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def summarize(profiles):
+    summary = {'requests': len(profiles)}
+    for field in ('duration_ms', 'sql_ms', 'queries', 'template_ms'):
+        values = [profile[field] for profile in profiles]
+        summary[field] = {
+            'p50': percentile(values, 0.50),
+            'p95': percentile(values, 0.95),
+            'p99': percentile(values, 0.99),
+        }
+    return summary
+
+
+view_stats = ViewStats()
+
+
+class QueryProfilingMiddleware:
+    '''Records query count, SQL time, duplicate queries and template time.
+
+    Every request goes into the rolling percentiles shown by
+    profiling_report; a QUERY_PROFILING_SAMPLE_RATE share of them is also
+    logged as one JSON line. Views named in QUERY_BUDGETS that run more
+    queries than allowed log a warning, or raise QueryBudgetExceeded when
+    QUERY_BUDGETS_STRICT is on (as in the tests).
+
+    Queries run while a streaming response is consumed aren't counted.
+    '''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        request._template_ms = 0.0
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        match = request.resolver_match
+        view_name = match.view_name if match else None
+        profile = {
+            'view': view_name,
+            'method': request.method,
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 3),
+            'queries': recorder.count,
+            'duplicate_queries': recorder.duplicates(),
+            'sql_ms': round(recorder.time * 1000, 3),
+            'template_ms': round(request._template_ms, 3),
+        }
+        view_stats.add(view_name, profile)
+        if random.random() < getattr(settings, 'QUERY_PROFILING_SAMPLE_RATE', 0):
+            logger.info(json.dumps(profile, sort_keys=True))
+        self.check_budget(view_name, profile)
+        return response
+
+    def process_template_response(self, request, response):
+        started = time.perf_counter()
+
+        def rendered(response):
+            request._template_ms += (time.perf_counter() - started) * 1000
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    def check_budget(self, view_name, profile):
+        budget = getattr(settings, 'QUERY_BUDGETS', {}).get(view_name)
+        if budget is None or profile['queries'] <= budget:
+            return
+        message = '{} ran {} queries, its budget is {}'.format(
+            view_name, profile['queries'], budget)
+        if getattr(settings, 'QUERY_BUDGETS_STRICT', False):
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+
+@staff_member_required
+def profiling_report(request):
+    '''Rolling percentiles of every view, for staff only'''
+    return JsonResponse(view_stats.report())
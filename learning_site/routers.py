@@ -0,0 +1,112 @@
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+
+PRIMARY = 'default'
+
+# Sessions decide whether a reader is sticky, so they never lag behind
+PRIMARY_ONLY_APPS = ('sessions',)
+
+STICKY_SESSION_KEY = '_primary_until'
+
+_state = threading.local()
+
+
+def replicas():
+    return list(getattr(settings, 'REPLICA_DATABASES', ()))
+
+
+@contextmanager
+def read_from(alias):
+    previous = getattr(_state, 'replica', None)
+    _state.replica = alias
+    try:
+        yield
+    finally:
+        _state.replica = previous
+
+
+def read_from_replicas():
+    '''Sends the reads made inside the block to one of the replicas'''
+    aliases = replicas()
+    return read_from(random.choice(aliases) if aliases else None)
+
+
+def read_from_primary():
+    '''Sends the reads made inside the block to the primary.
+
+    For data cached under versions that writes bump straight away: read
+    from a replica that doesn't have the write yet, the old rows would be
+    cached under the new version.
+    '''
+    return read_from(None)
+
+
+class ReplicaRouter:
+    '''Reads from the replica picked by read_from_replicas(), everything
+    else goes to the primary. Writes are remembered so that the request
+    can make its session sticky to the primary.
+
+    A request reads all its rows from the same replica, so a page never
+    mixes replicas that lag by different amounts.
+    '''
+
+    def db_for_read(self, model, **hints):
+        alias = getattr(_state, 'replica', None)
+        if alias and model._meta.app_label not in PRIMARY_ONLY_APPS:
+            return alias
+        return PRIMARY
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label not in PRIMARY_ONLY_APPS:
+            _state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {PRIMARY, *replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        # replicas are copies of the primary, see sync_replicas
+        return db not in replicas()
+
+
+class ReplicaRoutingMiddleware:
+    '''Routes the views named in REPLICA_VIEWS to the replicas on GET.
+
+    A request that writes keeps its session on the primary for
+    REPLICA_STICKY_SECONDS, so readers see their own changes before the
+    replicas catch up.
+    '''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _state.wrote = False
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.replica = None
+        if _state.wrote and replicas() and hasattr(request, 'session'):
+            request.session[STICKY_SESSION_KEY] = (
+                time.time() + getattr(settings, 'REPLICA_STICKY_SECONDS', 15))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method not in ('GET', 'HEAD') or not replicas():
+            return None
+        view_name = request.resolver_match.view_name
+        if view_name not in getattr(settings, 'REPLICA_VIEWS', ()):
+            return None
+        session = getattr(request, 'session', None)
+        if session is not None and session.get(STICKY_SESSION_KEY, 0) > time.time():
+            return None
+        _state.replica = random.choice(replicas())
+        return None
@@ -39,13 +39,16 @@ INSTALLED_APPS = (
     'django.contrib.staticfiles',
     'debug_toolbar',
     'courses',
+    'learning_site',
 )
 
 MIDDLEWARE = (  # this was changed from MIDDLEWARE_CLASSES
+    'learning_site.profiling.QueryProfilingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'learning_site.routers.ReplicaRoutingMiddleware',
     # 'django.contrib.auth.middleware.SessionAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
@@ -73,6 +76,8 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'learning_site.wsgi.application'
 
+TEST_RUNNER = 'learning_site.test_runner.TestRunner'
+
 
 # Database
 # https://docs.djangoproject.com/en/1.8/ref/settings/#databases
@@ -84,6 +89,74 @@ DATABASES = {
     }
 }
 
+# Read replicas for the public pages, see learning_site.routers. Locally,
+# LEARNING_SITE_REPLICAS=2 adds db.replica1.sqlite3 and db.replica2.sqlite3
+# as stand-ins, copied from the primary by the sync_replicas command.
+REPLICA_DATABASES = []
+for number in range(1, int(os.environ.get('LEARNING_SITE_REPLICAS', 0)) + 1):
+    alias = 'replica{}'.format(number)
+    DATABASES[alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db.{}.sqlite3'.format(alias)),
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICA_DATABASES.append(alias)
+
+DATABASE_ROUTERS = ['learning_site.routers.ReplicaRouter']
+
+# Views that read from the replicas on GET, and how long a session that
+# wrote something reads from the primary instead
+REPLICA_VIEWS = (
+    'home',
+    'courses:list',
+    'courses:detail',
+    'courses:text',
+    'courses:quiz',
+    'courses:search',
+    'courses:by_teacher',
+    'api_v1:courses',
+    'api_v1:course_batch',
+    'api_v1:course',
+    'api_v1:course_steps',
+    'api_v1:quiz',
+    'api_v1:question',
+)
+REPLICA_STICKY_SECONDS = 15
+
+# Pragmas run on every new SQLite connection, see learning_site.db. Running
+# with LEARNING_SITE_PROFILE=production switches to the write-ahead log,
+# so readers don't block the writer, and keeps connections open between
+# requests (checked before each request, see DATABASE_HEALTH_CHECKS).
+# Compare the two with the benchmark_concurrency command.
+SQLITE_PRAGMAS = {}
+SQLITE_PRODUCTION_PRAGMAS = {
+    'journal_mode': 'wal',
+    'busy_timeout': 5000,           # ms to wait for a lock before failing
+    'synchronous': 'normal',        # durable enough with WAL, fewer fsyncs
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64000,           # negative is KiB, so 64 MB per connection
+}
+DATABASE_HEALTH_CHECKS = False
+
+if os.environ.get('LEARNING_SITE_PROFILE') == 'production':
+    SQLITE_PRAGMAS = SQLITE_PRODUCTION_PRAGMAS
+    DATABASE_HEALTH_CHECKS = True
+    for database in DATABASES.values():
+        database['CONN_MAX_AGE'] = 600
+
+
+# Caches
+# https://docs.djangoproject.com/en/2.1/topics/cache/
+# Cached totals and fragments are invalidated through version keys in this
+# cache, so with several worker processes it has to be shared between them
+# (memcached, redis or the database cache)
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/1.8/topics/i18n/
@@ -111,4 +184,79 @@ STATICFILES_DIRS = (
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'suggestions')
 
+# Outgoing mail is spooled here and sent by the send_queued_mail command,
+# see learning_site.mail_queue. Failed messages are retried after
+# MAIL_QUEUE_RETRY_DELAY seconds, doubling each time.
+MAIL_QUEUE_DIR = os.path.join(BASE_DIR, 'mail_queue')
+MAIL_QUEUE_RETRY_DELAY = 60
+MAIL_QUEUE_MAX_ATTEMPTS = 8
+
 INTERNAL_IPS = ['127.0.0.1', '::1', '0.0.0.0']
+
+# Rendered markdown is kept in a per-process LRU of this many entries. Set
+# MARKDOWN_CACHE_ALIAS to the name of an entry in CACHES to also share
+# renders between worker processes.
+MARKDOWN_CACHE_SIZE = 512
+MARKDOWN_CACHE_ALIAS = None
+
+# Per-request query profiling, see learning_site.profiling. Rolling
+# percentiles are served to staff at /__profiling__/.
+QUERY_PROFILING_SAMPLE_RATE = 0.01
+QUERY_PROFILING_WINDOW = 1000
+
+# Most queries each view may run, for a signed-in reader with nothing
+# cached yet: loading the session and user takes two queries and the
+# navigation menu one. quiz_submit includes the cold answer key, and the
+# session update that keeps a writer on the primary when there are
+# replicas. Going over logs a warning, or raises when QUERY_BUDGETS_STRICT
+# is set (as in the tests, see learning_site.test_runner).
+QUERY_BUDGETS = {
+    'home': 4,
+    'courses:list': 3,
+    'courses:by_teacher': 6,    # a teacher's own page adds their quiz stats
+    'courses:search': 3,
+    'courses:detail': 6,
+    'courses:text': 6,
+    'courses:quiz': 7,
+    'courses:quiz_submit': 17,
+    # one query for the rows and one per embedded level, at most
+    # steps, quizzes.questions.answers
+    'api_v1:courses': 5,
+    'api_v1:course_batch': 5,
+    'api_v1:course': 5,
+    'api_v1:course_steps': 2,
+    'api_v1:quiz': 3,
+    'api_v1:question': 2,
+}
+QUERY_BUDGETS_STRICT = False
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'learning_site.profiling': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+    },
+}
+
+# Quiz attempts are buffered in each worker and added to Quiz.times_taken
+# every this many seconds, by a background thread, see courses.counters
+QUIZ_ATTEMPTS_FLUSH_INTERVAL = 10
+
+# Share of questions (in percent) to get right for a quiz attempt to pass
+QUIZ_PASS_PERCENT = 70
+
+# The export_static command's quiz pages post their answers to this site,
+# e.g. 'https://courses.example.com'. Left empty, they post to the host
+# serving them, which then has to be this site. Anonymous posts without a
+# CSRF token are accepted from this site and STATIC_EXPORT_ORIGINS, the
+# scheme://host of wherever else the export is served.
+STATIC_EXPORT_SITE_URL = ''
+STATIC_EXPORT_ORIGINS = []
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+from courses.counters import quiz_attempts
+
+
+class TestRunner(DiscoverRunner):
+    '''The default runner, failing any request over its query budget and
+    not logging sampled request profiles.
+
+    It also keeps the thread flushing quiz attempts from starting, it would
+    write to the test database from outside the tests' transactions. The
+    tests flush their counters themselves.
+    '''
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.QUERY_BUDGETS_STRICT = True
+        settings.QUERY_PROFILING_SAMPLE_RATE = 0
+        quiz_attempts.autostart = False
@@ -0,0 +1,235 @@
+import os
+import shutil
+import tempfile
+import time
+from io import StringIO
+from unittest import mock
+
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.urls import reverse
+from django.utils import timezone
+
+from courses.models import Course, Quiz
+from . import db, routers
+from .mail_queue import MailQueue
+from .routers import ReplicaRouter, STICKY_SESSION_KEY, read_from_replicas
+
+
+class MailQueueTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        settings = override_settings(MAIL_QUEUE_DIR=self.directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.queue = MailQueue()
+
+    def enqueue(self, subject='Hello'):
+        return self.queue.enqueue(subject, 'Body', 'a@example.com',
+                                  ['b@example.com'])
+
+    def test_suggestion_is_queued_not_sent(self):
+        resp = self.client.post(reverse('suggestion'), {
+            'name': 'Ann', 'email': 'ann@example.com',
+            'verify_email': 'ann@example.com', 'suggestion': 'More quizzes',
+        })
+        self.assertRedirects(resp, reverse('suggestion'))
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(len(self.queue.pending()), 1)
+
+        call_command('send_queued_mail', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].subject, 'Suggestion from Ann')
+        self.assertEqual(self.queue.pending(), [])
+
+    def test_batch_shares_one_connection(self):
+        for number in range(3):
+            self.enqueue('Message {}'.format(number))
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.open') as open_:
+            self.assertEqual(self.queue.send_batch(batch_size=2), (2, 0))
+        open_.assert_called_once_with()
+        self.assertEqual([message.subject for message in mail.outbox],
+                         ['Message 0', 'Message 1'])
+
+    def test_failures_are_retried_later(self):
+        name = self.enqueue()
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages',
+                        side_effect=OSError('down')):
+            self.assertEqual(self.queue.send_batch(), (0, 1))
+        # not due yet
+        self.assertEqual(self.queue.send_batch(), (0, 0))
+        self.assertEqual(self.queue.pending(), [name])
+
+        an_hour_later = time.time() + 3600
+        with mock.patch('learning_site.mail_queue.time.time',
+                        return_value=an_hour_later):
+            self.assertEqual(self.queue.send_batch(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+
+    @override_settings(MAIL_QUEUE_RETRY_DELAY=0, MAIL_QUEUE_MAX_ATTEMPTS=2)
+    def test_gives_up_after_max_attempts(self):
+        name = self.enqueue()
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages',
+                        side_effect=OSError('down')):
+            self.queue.send_batch()
+            self.queue.send_batch()
+        self.assertEqual(self.queue.pending(), [])
+        self.assertTrue(os.path.exists(self.queue.path('failed', name)))
+
+    def test_abandoned_messages_are_recovered(self):
+        name = self.enqueue()
+        self.queue.claim(name)
+        self.assertEqual(self.queue.recover(), 0)
+        self.assertEqual(self.queue.recover(older_than=0), 1)
+        self.assertEqual(self.queue.pending(), [name])
+
+
+class ReplicaRouterTests(TestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+
+    @override_settings(REPLICA_DATABASES=[])
+    def test_without_replicas_everything_is_primary(self):
+        with read_from_replicas():
+            self.assertEqual(self.router.db_for_read(Course), 'default')
+
+    @override_settings(REPLICA_DATABASES=['replica1', 'replica2'])
+    def test_reads_go_to_replicas_inside_the_block(self):
+        self.assertEqual(self.router.db_for_read(Course), 'default')
+        with read_from_replicas():
+            self.assertIn(self.router.db_for_read(Course),
+                          ['replica1', 'replica2'])
+            self.assertEqual(self.router.db_for_read(Session), 'default')
+            self.assertEqual(self.router.db_for_write(Course), 'default')
+        self.assertFalse(self.router.allow_migrate('replica1', 'courses'))
+        self.assertTrue(self.router.allow_migrate('default', 'courses'))
+
+
+# the primary stands in for a replica, the router's choice is what's tested
+@override_settings(REPLICA_DATABASES=['default'])
+class ReplicaRoutingMiddlewareTests(TestCase):
+    def setUp(self):
+        course = Course.objects.create(
+            title="Routed", description="", published=True,
+            teacher=User.objects.create_user('teacher'))
+        self.quiz = Quiz.objects.create(title="Quiz", description="",
+                                        course=course)
+
+    def reads_from_replica(self, method='get', url=None, data=None):
+        url = url or reverse('courses:list')
+        with mock.patch('learning_site.routers.random.choice',
+                        return_value='default') as choice:
+            getattr(self.client, method)(url, data or {})
+        return choice.called
+
+    def test_public_pages_read_from_replicas(self):
+        self.assertTrue(self.reads_from_replica())
+        self.assertFalse(self.reads_from_replica(url=reverse('suggestion')))
+
+    def test_session_sticks_to_primary_after_writing(self):
+        self.assertTrue(self.reads_from_replica())
+        submit_url = reverse('courses:quiz_submit', kwargs={
+            'course_pk': self.quiz.course_id, 'step_pk': self.quiz.pk})
+        self.assertFalse(self.reads_from_replica('post', submit_url))
+        self.assertIn(STICKY_SESSION_KEY, self.client.session)
+        self.assertFalse(self.reads_from_replica())
+
+        with mock.patch('learning_site.routers.time.time',
+                        return_value=time.time() + 60):
+            self.assertTrue(self.reads_from_replica())
+
+    def test_lagging_replica_is_not_cached_under_the_new_stamp(self):
+        course = self.quiz.course
+        url = reverse('courses:detail', kwargs={'pk': course.pk})
+        self.client.get(url)
+        replica_row = Course.objects.values(
+            'description_html', 'updated_at').get(pk=course.pk)
+        # the teacher's write bumps the course's stamp...
+        course.description = 'Now with *regular expressions*'
+        course.save()
+        # ...but the replica doesn't have it yet
+        Course.objects.filter(pk=course.pk).update(**replica_row)
+        self.assertNotContains(Client().get(url), 'regular expressions')
+
+        # until it's synced
+        Course.objects.filter(pk=course.pk).update(
+            description_html='<p>Now with <em>regular expressions</em></p>',
+            updated_at=timezone.now())
+        self.assertContains(Client().get(url), '<em>regular expressions</em>')
+
+    def test_versioned_caches_are_filled_from_the_primary(self):
+        cache.clear()
+        reads = []
+
+        def record(execute, sql, params, many, context):
+            reads.append((sql, routers._state.replica))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(record):
+            Client().get(reverse('courses:list'))
+        from_primary = [sql for sql, replica in reads if replica is None]
+        self.assertEqual(len(from_primary), 2)
+        # the navigation menu and the total steps
+        self.assertIn('LIMIT 5', from_primary[0] + from_primary[1])
+        self.assertIn('SUM', from_primary[0] + from_primary[1])
+        # the page itself from the replica
+        self.assertIn('default', [replica for sql, replica in reads])
+
+
+class DatabaseSettingsTests(TestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA {}'.format(name))
+            return cursor.fetchone()[0]
+
+    def test_pragmas_applied_to_new_connections(self):
+        default = self.pragma('cache_size')
+        self.addCleanup(db.apply_pragmas, connection, {'cache_size': default})
+        with override_settings(SQLITE_PRAGMAS={'cache_size': -1234}):
+            db.set_sqlite_pragmas(sender=None, connection=connection)
+        self.assertEqual(self.pragma('cache_size'), -1234)
+
+    def health_check(self, broken, in_atomic_block=False):
+        '''A kept connection after a health check, broken underneath or not'''
+        kept = connection.copy()
+        # Django never closes an in-memory SQLite database, like the tests'
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        kept.settings_dict['NAME'] = os.path.join(directory, 'kept.sqlite3')
+        self.addCleanup(kept.close)
+        kept.ensure_connection()
+        if broken:
+            kept.connection.close()
+        kept.in_atomic_block = in_atomic_block
+        unopened = connection.copy()
+        with mock.patch.object(db, 'connections') as connections:
+            connections.all.return_value = [kept, unopened]
+            db.check_persistent_connections(sender=None)
+        self.assertIsNone(unopened.connection)
+        kept.in_atomic_block = False
+        return kept
+
+    @override_settings(DATABASE_HEALTH_CHECKS=True)
+    def test_broken_connection_replaced(self):
+        kept = self.health_check(broken=True)
+        self.assertIsNone(kept.connection)
+        # and the next query opens a new one
+        with kept.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            self.assertEqual(cursor.fetchone(), (1,))
+
+        working = self.health_check(broken=False)
+        self.assertIsNotNone(working.connection)
+        # not in the middle of a transaction
+        self.assertIsNotNone(
+            self.health_check(broken=True, in_atomic_block=True).connection)
+
+    @override_settings(DATABASE_HEALTH_CHECKS=False)
+    def test_health_checks_off(self):
+        self.assertIsNotNone(self.health_check(broken=True).connection)
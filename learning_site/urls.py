@@ -19,20 +19,25 @@ from django.urls import path, include
 from django.contrib import admin
 from django.contrib.staticfiles.urls import staticfiles_urlpatterns
 
+from . import profiling
 from . import views
 
+urlpatterns = []
+
 if settings.DEBUG:
     import debug_toolbar
-    urlpatterns = [
+    urlpatterns += [
         path('__debug__/', include(debug_toolbar.urls)),
     ]
 
 urlpatterns += [
     path('', views.HomeView.as_view(), name='home'),
     path('courses/',include(('courses.urls', 'courses'), namespace='courses')),
+    path('api/v1/', include(('courses.api_urls', 'api_v1'), namespace='api_v1')),
     path('suggest/', views.suggestion_view, name='suggestion'),
     path('admin/', admin.site.urls),
     path('hello/', views.HelloWorldView.as_view(), name='hello'),
+    path('__profiling__/', profiling.profiling_report, name='profiling'),
 ]
 
 urlpatterns += staticfiles_urlpatterns()
@@ -1,11 +1,11 @@
 from django.contrib import messages
-from django.core.mail import send_mail
 from django.urls import reverse
 from django.http import HttpResponseRedirect, HttpResponse
 from django.shortcuts import render
 from django.views.generic import View, TemplateView
 
 from . import forms
+from .mail_queue import send_mail_later
 from courses.models import Course
 
 
@@ -29,7 +29,8 @@ def suggestion_view(request):
     if request.method == 'POST':
         form = forms.SuggestionForm(request.POST)
         if form.is_valid():
-            send_mail(
+            # sent by the send_queued_mail command, the reader doesn't wait
+            send_mail_later(
                 'Suggestion from {}'.format(form.cleaned_data['name']),
                 form.cleaned_data['suggestion'],
                 '{name} <{email}>'.format(**form.cleaned_data),